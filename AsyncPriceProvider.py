@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timezone
+import logging
+import time
+
+from Market import Market
+from PriceProvider import PriceListener, PriceProvider
+
+
+class StalePriceError(Exception):
+    """Raised when there is no cached price that is recent enough"""
+
+
+class AsyncPriceProvider(PriceProvider):
+    """
+        Live price feed for ccxt.async_support exchanges.
+
+        All subscribed markets are polled with fetch_tickers every interval seconds, in batches of at most batch_size
+        symbols that are requested concurrently. getCurrentPrice is served from the cache of the last poll and never
+        touches the network, prices older than max_age seconds raise a StalePriceError.
+    """
+
+    def __init__(self, exchange, interval: float = 1.0, max_age: float = 10.0, batch_size: int = 100, clock=time.monotonic) -> None:
+        super().__init__(exchange)
+        if interval <= 0 or max_age <= 0 or batch_size <= 0:
+            raise ValueError("interval, max_age and batch_size must be positive")
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.clock = clock
+        self.markets: dict[str, Market] = {}
+        # symbol -> (price, local time of the poll, exchange timestamp)
+        self.prices: dict[str, tuple] = {}
+
+    def subscribe(self, market: Market) -> None:
+        """Adds a market to the polled markets"""
+        self.markets.setdefault(market.get_market(), market)
+
+    def addListener(self, listener: PriceListener, market: Market):
+        super().addListener(listener, market)
+        self.subscribe(market)
+
+    def getCurrentPrice(self, pair: Market) -> float:
+        symbol = pair.get_market()
+        cached = self.prices.get(symbol)
+        if cached is None:
+            self.subscribe(pair)
+            raise StalePriceError("No price for " + symbol)
+        if self.clock() - cached[1] > self.max_age:
+            raise StalePriceError(str.format("Price for {} is older than {} s", symbol, self.max_age))
+        return cached[0]
+
+    async def _fetch_batch(self, symbols: list[str]) -> dict:
+        try:
+            return await self.exchange.fetch_tickers(symbols)
+        except Exception as e:
+            # keep polling the other batches, their cached prices stay valid until max_age
+            logging.warning(str.format("fetch_tickers failed for {}: {}", symbols, e))
+            return {}
+
+    async def poll(self) -> None:
+        """Fetches the tickers of all subscribed markets once, updates the cache and notifies the listeners"""
+        symbols = list(self.markets)
+        if len(symbols) == 0:
+            return
+        batches = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
+        results = await asyncio.gather(*[self._fetch_batch(batch) for batch in batches])
+
+        listeners: dict[str, list] = {}
+        for market, market_listeners in self.listeners.items():
+            listeners.setdefault(market.get_market(), []).append((market, market_listeners))
+
+        now = self.clock()
+        for tickers in results:
+            for symbol, ticker in tickers.items():
+                if symbol not in self.markets or ticker.get("last") is None:
+                    continue
+                timestamp = ticker.get("timestamp")
+                if timestamp is not None:
+                    timestamp = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
+                price = float(ticker["last"])
+                self.prices[symbol] = (price, now, timestamp)
+
+                for market, market_listeners in listeners.get(symbol, []):
+                    for listener in market_listeners:
+                        listener.onPriceChanged(market, price, timestamp)
+
+    async def run(self, iterations: int = None) -> None:
+        """Polls every interval seconds, forever or for the given number of polls"""
+        count = 0
+        while iterations is None or count < iterations:
+            started = self.clock()
+            await self.poll()
+            count += 1
+            if iterations is None or count < iterations:
+                await asyncio.sleep(max(0, self.interval - (self.clock() - started)))
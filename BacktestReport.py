@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy
+
+from Equity import Equity
+from Order import Order
+from OrderJournal import RECORD_DTYPE
+
+
+class BacktestReport:
+    """
+        Headless result of a backtest: the trade ledger, matched buy/sell profits, the equity curve and summary stats.
+
+        Everything is computed with numpy from the columnar fill records of an OrderJournal or OrderStore, no GUI
+        library is imported. A sell order is matched to the buy order it closes (Order.closes) when that order was
+        filled as well, its profit is the sell value minus the value of the matched buy.
+    """
+
+    LEDGER_COLUMNS = list(RECORD_DTYPE.names) + ["matched", "profit", "cumulative_profit"]
+
+    def __init__(self, fills: numpy.ndarray, equity_samples: numpy.ndarray = None, equity_stats: dict = None) -> None:
+        """fills are records with RECORD_DTYPE, equity_samples is an (n, 2+) array with columns time (ms) and equity"""
+        fills = numpy.asarray(fills)
+        # ledger in order of the fill time, fills at the same time in order of creation
+        order = numpy.lexsort((fills["id"], fills["filled"]))
+        self.ledger: dict[str, numpy.ndarray] = {name: numpy.array(fills[name][order]) for name in RECORD_DTYPE.names}
+        self._match_orders()
+
+        if equity_samples is None:
+            equity_samples = numpy.empty((0, 2))
+        self.equity = {
+            "time": equity_samples[:, 0].astype(numpy.int64),
+            "equity": numpy.array(equity_samples[:, 1], dtype=numpy.float64),
+        }
+        self.stats = self._create_stats(equity_stats)
+
+    @staticmethod
+    def from_backtest(journal, equity: Equity = None) -> "BacktestReport":
+        """Creates the report from an OrderJournal or OrderStore and the Equity of a backtest"""
+        if equity is None:
+            return BacktestReport(journal.read())
+        return BacktestReport(journal.read(), equity.candle_samples(), equity.stats())
+
+    def _match_orders(self) -> None:
+        ledger = self.ledger
+        value = ledger["qty"] * ledger["fill_price"]
+
+        # row of the closed order, -1 if the closed order is not in the ledger
+        ids = ledger["id"]
+        by_id = numpy.argsort(ids, kind="stable")
+        pos = numpy.clip(numpy.searchsorted(ids, ledger["closes"], sorter=by_id), 0, max(0, len(ids) - 1))
+        matched = numpy.full(len(ids), -1, dtype=numpy.int64)
+        if len(ids) > 0:
+            closes_row = by_id[pos]
+            found = (ledger["closes"] >= 0) & (ids[closes_row] == ledger["closes"]) & (ledger["side"] == Order.Side.SELL.value)
+            matched[found] = closes_row[found]
+
+        profit = numpy.zeros(len(ids))
+        has_match = matched >= 0
+        profit[has_match] = value[has_match] - value[matched[has_match]]
+
+        ledger["matched"] = matched
+        ledger["profit"] = profit
+        ledger["cumulative_profit"] = numpy.cumsum(profit)
+
+    def _create_stats(self, equity_stats: dict) -> dict:
+        ledger = self.ledger
+        side = ledger["side"]
+        round_trips = ledger["matched"] >= 0
+        profits = ledger["profit"][round_trips]
+        equity = self.equity["equity"]
+
+        stats = {
+            "fills": int(len(side)),
+            "buys": int(numpy.count_nonzero(side == Order.Side.BUY.value)),
+            "sells": int(numpy.count_nonzero(side == Order.Side.SELL.value)),
+            "fees": float(ledger["fee"].sum()),
+            "round_trips": int(len(profits)),
+            "profit": float(profits.sum()),
+            "average_profit": float(profits.mean()) if len(profits) > 0 else 0.0,
+            "win_rate": float(numpy.count_nonzero(profits > 0) / len(profits)) if len(profits) > 0 else 0.0,
+            "start_equity": float(equity[0]) if len(equity) > 0 else None,
+            "end_equity": float(equity[-1]) if len(equity) > 0 else None,
+        }
+        if equity_stats is not None:
+            stats.update({key: value for key, value in equity_stats.items() if key not in ("equity", "fills")})
+        return stats
+
+    def profit_curve(self) -> dict:
+        """Cumulative matched profit at the time of every round trip"""
+        round_trips = self.ledger["matched"] >= 0
+        return {"time": self.ledger["filled"][round_trips], "cumulative_profit": numpy.cumsum(self.ledger["profit"][round_trips])}
+
+    @staticmethod
+    def _write_csv(path: str, columns: dict) -> None:
+        names = list(columns)
+        data = numpy.column_stack([columns[name] for name in names]) if len(names) > 0 else numpy.empty((0, 0))
+        formats = ["%d" if columns[name].dtype.kind in "iu" else "%.17g" for name in names]
+        numpy.savetxt(path, data, fmt=formats, delimiter=",", header=",".join(names), comments="")
+
+    def write(self, directory: str) -> None:
+        """Writes ledger.csv, equity.csv, stats.json and all columns as report.npz to directory"""
+        os.makedirs(directory, exist_ok=True)
+        BacktestReport._write_csv(os.path.join(directory, "ledger.csv"), {name: self.ledger[name] for name in BacktestReport.LEDGER_COLUMNS})
+        BacktestReport._write_csv(os.path.join(directory, "equity.csv"), self.equity)
+        with open(os.path.join(directory, "stats.json"), "w") as f:
+            json.dump(self.stats, f, indent=4)
+        numpy.savez(os.path.join(directory, "report.npz"),
+                    **{"ledger_" + name: values for name, values in self.ledger.items()},
+                    **{"equity_" + name: values for name, values in self.equity.items()})
+
+    @staticmethod
+    def load(directory: str) -> "BacktestReport":
+        """Loads a report written by write()"""
+        report = BacktestReport.__new__(BacktestReport)
+        with numpy.load(os.path.join(directory, "report.npz")) as data:
+            report.ledger = {name[len("ledger_"):]: data[name] for name in data.files if name.startswith("ledger_")}
+            report.equity = {name[len("equity_"):]: data[name] for name in data.files if name.startswith("equity_")}
+        with open(os.path.join(directory, "stats.json")) as f:
+            report.stats = json.load(f)
+        return report
@@ -1,29 +1,60 @@
-from asyncio.log import logger
-from datetime import datetime
-from sqlite3 import Timestamp
+from datetime import datetime, timezone
+import logging
 import string
 import time
 
-import pandas
+import numpy
+
+from CandleDownloader import CandleDownloader
+from CandleStore import COLUMNS, CandleStore, candle_start, timeframe_to_ms
 from Market import Market
 from Order import Order
 from PriceProvider import PriceProvider
+from PriceTape import PriceTape
 from SimulatedBroker import SimulatedBroker
 
+logger = logging.getLogger(__name__)
+
 class BacktestingPriceProvider(PriceProvider):
 
-    def __init__(self, exchange, market: Market, broker: SimulatedBroker, timeframe: string, start_date: datetime, end_date: datetime) -> None:
+    def __init__(self, exchange, market: Market, broker: SimulatedBroker, timeframe: string, start_date: datetime, end_date: datetime, candle_store: CandleStore = None, exchange_id: string = None, candles: dict = None, intrabar_timeframe: string = None, intrabar_candles: dict = None, chunk_size: int = 100000) -> None:
+        """
+            With intrabar_timeframe set, the price events are simulated from the candles of that lower timeframe, either
+            preloaded as intrabar_candles or streamed from the candle store in chunks of chunk_size candles. Candle
+            listeners are still notified once per candle of timeframe, the candles of timeframe are not kept.
+        """
         super().__init__(exchange)
         self.timeframe=timeframe
         self.start_date = start_date
         self.end_date = end_date
         self.market = market
         self.broker = broker
+        self.candle_store = candle_store
+        self.exchange_id = exchange_id
+        # preloaded candle columns, in the layout of the candle store
+        self.candles = candles
+        self._historic_candles = None
+        self.intrabar_timeframe = intrabar_timeframe
+        self.intrabar_candles = intrabar_candles
+        self.chunk_size = chunk_size
 
         # initialise current price
         self.current_price = 0
         self.current_time = start_date
-        candles = exchange.fetch_ohlcv (market.get_market(), self.timeframe, since=start_date.timestamp()*1000, limit=1 )
+        if intrabar_timeframe is not None:
+            # the first intrabar candle, the candles of timeframe are built from the intrabar candles by run()
+            candles = []
+            for chunk in self._intrabar_chunks(1):
+                candles = [[chunk["date"][0], chunk["open"][0]]]
+                break
+        else:
+            if self.candles is None and candle_store is not None:
+                # load the whole backtesting range from the candle store, only missing candles are downloaded
+                self.candles = candle_store.get_candles(exchange, market, timeframe, int(start_date.timestamp() * 1000), int(end_date.timestamp() * 1000), exchange_id)
+            if self.candles is not None:
+                candles = [[self.candles["date"][0], self.candles["open"][0]]] if len(self.candles["date"]) > 0 else []
+            else:
+                candles = exchange.fetch_ohlcv (market.get_market(), self.timeframe, since=start_date.timestamp()*1000, limit=1 )
         for candle in candles:
             self.current_price = candle[1]
             self.current_time = datetime.utcfromtimestamp(candle[0] / 1000)
@@ -33,91 +64,168 @@ class BacktestingPriceProvider(PriceProvider):
 
     def updatePriceListenersWithBacktestingData(self, price, timestamp):
         self.current_price = price
-        for pair, l in self.listeners.items():
-            if pair == self.market:
-                for cl in l:
-                    cl.onPriceChanged(self.market, price, timestamp)
-
-    def run(self):
-        current_time = self.start_date.timestamp()*1000
-        stop_time = self.end_date.timestamp() * 1000
-        
-        logger.info("Backtesting started")
-        logger.info("Downloading candles")
-
-        candles_df = pandas.DataFrame(columns=["date", "open", "high", "low", "close", "volume"]).set_index("date")
-
-        while current_time < stop_time:
-            logger.info("Backtesting from " + self.start_date.strftime("%Y %m %d") + " to " + self.end_date.strftime("%Y %m %d") + ", progress " + datetime.utcfromtimestamp(current_time / 1000).strftime("%Y %m %d"))
-            candles = self.exchange.fetch_ohlcv (self.market.get_market(), self.timeframe, since=current_time)
-
-            # convert lists to dataframe
-            df = pandas.DataFrame(candles, columns=["date", "open", "high", "low", "close", "volume"])
-
-            # convert timestamp to datetime
-            df['date'] = pandas.to_datetime(df['date'], unit='ms', utc=True, infer_datetime_format=True)
+        for cl in self.listeners.get(self.market, []):
+            cl.onPriceChanged(self.market, price, timestamp)
 
-            # convert price values to float
-            df = df.astype(dtype={'open': 'float', 'high': 'float', 'low': 'float', 'close': 'float',
-                                    'volume': 'float'})
+    def _download_candles(self):
+        import pandas
 
-            df.set_index("date", inplace=True)
-
-            candles_df = pandas.concat([candles_df, df], ignore_index=False)
-            
-            # remove duplicate candles
-            candles_df = candles_df[~candles_df.index.duplicated(keep='last')]
-
-            # update last downloaded candle timestamp
-            last_candle_date = df.index[-1]
-            current_time = int(last_candle_date.timestamp() * 1000)
+        logger.info("Downloading candles")
+        start = int(self.start_date.timestamp() * 1000)
+        end = int(self.end_date.timestamp() * 1000)
+        candles = CandleDownloader(self.exchange).download(self.market, self.timeframe, start, end)
 
-        # filter out candles after end_date
-        candles_df = candles_df[(candles_df.index <= self.end_date)]
+        candles_df = pandas.DataFrame({column: candles[column] for column in COLUMNS})
+        candles_df['date'] = pandas.to_datetime(candles_df['date'], unit='ms', utc=True)
+        candles_df.set_index("date", inplace=True)
 
         logger.info(str.format("Downloaded {} candles", len(candles_df.index)))
+        return candles_df
+
+    def load_candles(self):
+        """Returns the candles of the backtesting range as dataframe indexed by date, from the candle store if available"""
+        if self.candles is None:
+            return self._download_candles()
+
+        import pandas
+        df = pandas.DataFrame({column: self.candles[column] for column in COLUMNS})
+        df['date'] = pandas.to_datetime(df['date'], unit='ms', utc=True)
+        df.set_index("date", inplace=True)
+        return df
+
+    @property
+    def historic_candles(self):
+        """The backtested candles as dataframe indexed by date, created on first access when the candles were preloaded"""
+        if self._historic_candles is None and self.candles is not None:
+            self._historic_candles = self.load_candles()
+        return self._historic_candles
 
-        # go through all rows and simulate price movement
-        for index, row in candles_df.iterrows():
-            if row["close"] > row["open"]:
-                # green candle, price plays open->low->high->close
-                self.simulate_price_movement(row["open"], row["low"], index)
-                self.simulate_price_movement(row["low"], row["high"], index)
-                self.simulate_price_movement(row["high"], row["close"], index)
-            else:
-                # red candle, price plays open->high->low->close
-                self.simulate_price_movement(row["open"], row["high"], index)
-                self.simulate_price_movement(row["high"], row["low"], index)
-                self.simulate_price_movement(row["low"], row["close"], index)
+    def run(self):
+        logger.info("Backtesting started")
+
+        # replay the precomputed price path of all candles
+        if self.intrabar_timeframe is not None:
+            self.replay_intrabar()
+        elif self.candles is not None:
+            c = self.candles
+            self.replay(PriceTape(c["date"], c["open"], c["high"], c["low"], c["close"]))
+        else:
+            self._historic_candles = self._download_candles()
+            self.replay(PriceTape.from_candles(self._historic_candles))
 
-        self.historic_candles = candles_df
         logger.info("Backtesting complete")
 
+    def replay(self, tape: PriceTape) -> None:
+        """Simulates the price movement along the path of every candle of the price tape"""
+        prices = tape.prices.ravel().tolist()
+        simulate_price_movement = self.simulate_price_movement
+        candle_listeners = self.candle_listeners
+        i = 0
+        for timestamp in tape.datetimes():
+            simulate_price_movement(prices[i], prices[i + 1], timestamp)
+            simulate_price_movement(prices[i + 1], prices[i + 2], timestamp)
+            simulate_price_movement(prices[i + 2], prices[i + 3], timestamp)
+            if candle_listeners:
+                # low and high are the two middle points of the path, in either order
+                low, high = min(prices[i + 1], prices[i + 2]), max(prices[i + 1], prices[i + 2])
+                for listener in candle_listeners:
+                    listener.onCandle(self.market, timestamp, prices[i], high, low, prices[i + 3])
+            i += PriceTape.POINTS_PER_CANDLE
+
     def simulate_price_movement(self, a: float, b: float, timestamp) -> None:
         """Simulates price moving from a to b"""
-        # 1. get orders that will be filled if price moves from a to b
-        # 2. simulate a price event at the limit price of each order, in correct order
-        #    market orders can be ignored, they will be filled at the next price event anyway
-
-        logger.debug(str.format("Simulate price point {}", a))
+        # simulate a price event at a, then one at the limit price of each order that is filled on the way to b, in
+        # correct order. The next fill is looked up in the order book after every event, so orders that are created
+        # by listeners during the walk are filled as well.
         self.updatePriceListenersWithBacktestingData(a, timestamp)
 
-        last_simulated_price = a
-        orders = self.broker.get_open_orders(last_simulated_price, b)
-        while len(orders) > 0:
-            if a > b:
-                # sort orders by limit price descending
-                orders.sort(key=lambda o: o.limit_price, reverse=True)
-            else:
-                # sort orders by limit price ascending
-                orders.sort(key=lambda o: o.limit_price)
-            
-            # simulate a price change on the limit price of the next order that would be filled
-            for order in orders:
-                if order.type == Order.Type.LIMIT and order.limit_price > 0:
-                    self.updatePriceListenersWithBacktestingData(order.limit_price, timestamp)
-                    logger.debug(str.format("Simulate additonal price point {}", order.limit_price))
-                    last_simulated_price = order.limit_price
-                    break
-            orders = self.broker.get_open_orders(last_simulated_price, b)
-        
\ No newline at end of file
+        next_fill_price = self.broker.next_fill_price
+        price = next_fill_price(self.market, a, b)
+        while price is not None:
+            self.updatePriceListenersWithBacktestingData(price, timestamp)
+            price = next_fill_price(self.market, price, b)
+
+    def _intrabar_chunks(self, chunk_size: int):
+        """Yields the intrabar candles of the backtesting range as dicts of column arrays with at most chunk_size candles"""
+        if self.intrabar_candles is not None:
+            num_candles = len(self.intrabar_candles["date"])
+            for start in range(0, num_candles, chunk_size):
+                yield {column: values[start:start + chunk_size] for column, values in self.intrabar_candles.items()}
+            return
+
+        if self.candle_store is None:
+            raise ValueError("Intrabar simulation requires intrabar_candles or a candle store")
+        exchange_id = self.exchange_id if self.exchange_id is not None else self.exchange.id
+        start = int(self.start_date.timestamp() * 1000)
+        end = int(self.end_date.timestamp() * 1000)
+        self.candle_store.download_missing(self.exchange, exchange_id, self.market, self.intrabar_timeframe, start, end)
+        yield from self.candle_store.iter_chunks(exchange_id, self.market, self.intrabar_timeframe, start, end, chunk_size)
+
+    def replay_intrabar(self) -> None:
+        """
+            Simulates the price movement along the path of every intrabar candle, chunk by chunk. The candles of timeframe
+            are built from the intrabar candles and sent to the candle listeners when they are complete, only the open
+            candle is kept in memory.
+            When the broker is the only price listener, intrabar candles that can not fill any order only update the
+            current price, the result is the same as replaying them.
+        """
+        timeframe_ms = timeframe_to_ms(self.timeframe)
+        listeners = self.listeners.get(self.market, [])
+        skip_idle = len(listeners) == 1 and listeners[0] is self.broker
+        simulate_price_movement = self.simulate_price_movement
+
+        # the open candle of timeframe, intrabar candles up to next_start belong to it
+        candle_start_ms = None
+        next_start = None
+        open = high = low = close = None
+
+        def close_candle():
+            time = datetime.fromtimestamp(candle_start_ms / 1000, timezone.utc)
+            for listener in self.candle_listeners:
+                listener.onCandle(self.market, time, open, high, low, close)
+
+        for chunk in self._intrabar_chunks(self.chunk_size):
+            tape = PriceTape(chunk["date"], chunk["open"], chunk["high"], chunk["low"], chunk["close"])
+            timestamps = tape.timestamps.tolist()
+            points = tape.prices.tolist()
+            lows = numpy.minimum(tape.prices[:, 1], tape.prices[:, 2]).tolist()
+            highs = numpy.maximum(tape.prices[:, 1], tape.prices[:, 2]).tolist()
+
+            buy_price, sell_price = self._idle_range()
+            for i, timestamp in enumerate(timestamps):
+                if next_start is None or timestamp >= next_start:
+                    if candle_start_ms is not None:
+                        close_candle()
+                    candle_start_ms = candle_start(timestamp, self.timeframe)
+                    next_start = candle_start_ms + timeframe_ms
+                    open, high, low = points[i][0], highs[i], lows[i]
+                else:
+                    high = max(high, highs[i])
+                    low = min(low, lows[i])
+                close = points[i][3]
+
+                p0, p1, p2, p3 = points[i]
+                if skip_idle and buy_price < lows[i] and highs[i] < sell_price:
+                    # no order is crossed, the last price event of the path would be at p2
+                    self.current_price = p2
+                    continue
+
+                time = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
+                simulate_price_movement(p0, p1, time)
+                simulate_price_movement(p1, p2, time)
+                simulate_price_movement(p2, p3, time)
+                buy_price, sell_price = self._idle_range()
+
+        if candle_start_ms is not None:
+            close_candle()
+
+    def _idle_range(self) -> tuple[float, float]:
+        """Returns the open price range (buy, sell) in which no order of the market is filled"""
+        book = self.broker.books.get(self.market)
+        if book is None:
+            return float("-inf"), float("inf")
+        if book.has_market_orders():
+            return float("inf"), float("-inf")
+        buy_price = book.best_buy_price()
+        sell_price = book.best_sell_price()
+        return float("-inf") if buy_price is None else buy_price, float("inf") if sell_price is None else sell_price
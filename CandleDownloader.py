@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+import numpy
+
+from CandleStore import COLUMNS, timeframe_to_ms
+from Market import Market
+from RateLimiter import RateLimiter
+
+
+class CandleDownloader:
+    """
+        Downloads a range of OHLCV candles with concurrent requests.
+
+        The range is split into windows of page_size candles that are fetched on a thread pool, every request first
+        takes a token from the rate limiter. Failed requests are retried with exponential backoff. The pages are
+        assembled once at the end, sorted by time and without duplicates.
+    """
+
+    def __init__(self, exchange, rate_limiter: RateLimiter = None, max_workers: int = 4, page_size: int = 500, retries: int = 3, retry_delay: float = 1.0) -> None:
+        """Without rate_limiter, the rate limit of the exchange (ccxt rateLimit) is used"""
+        self.exchange = exchange
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter.for_exchange(exchange, max_workers)
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def _fetch(self, symbol: str, timeframe: str, since: int) -> list:
+        for attempt in range(self.retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=self.page_size)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logging.warning(str.format("fetch_ohlcv {} {} since {} failed ({}), retrying in {} s", symbol, timeframe, since, e, delay))
+                time.sleep(delay)
+
+    def _download_window(self, symbol: str, timeframe: str, start: int, end: int) -> list:
+        """Returns the candles within [start, end], continues with more requests if the exchange returns smaller pages"""
+        timeframe_ms = timeframe_to_ms(timeframe)
+        rows = []
+        since = start
+        while since <= end:
+            candles = self._fetch(symbol, timeframe, since)
+            if len(candles) == 0:
+                break
+            rows.extend(candle for candle in candles if since <= candle[0] <= end)
+
+            last_candle_time = int(candles[-1][0])
+            if last_candle_time < since:
+                break
+            since = last_candle_time + timeframe_ms
+        return rows
+
+    def windows(self, timeframe: str, start: int, end: int) -> list[tuple[int, int]]:
+        """Splits [start, end] (ms, inclusive) into windows of page_size candles"""
+        window_ms = self.page_size * timeframe_to_ms(timeframe)
+        return [(window_start, min(window_start + window_ms - 1, end)) for window_start in range(start, end + 1, window_ms)]
+
+    def download(self, market: Market, timeframe: str, start: int, end: int) -> dict[str, numpy.ndarray]:
+        """Returns the candles within [start, end] (ms, inclusive) as a dict of column arrays, sorted by time"""
+        symbol = market.get_market()
+        windows = self.windows(timeframe, start, end)
+        with ThreadPoolExecutor(max(1, min(self.max_workers, len(windows)))) as executor:
+            pages = list(executor.map(lambda window: self._download_window(symbol, timeframe, *window), windows))
+
+        rows = [row for page in pages for row in page]
+        data = numpy.array(rows, dtype=numpy.float64).reshape(-1, len(COLUMNS))
+        dates = data[:, 0].astype(numpy.int64)
+        order = numpy.argsort(dates, kind="stable")
+        dates = dates[order]
+        keep = numpy.append(dates[1:] != dates[:-1], True) if len(dates) > 0 else numpy.zeros(0, dtype=bool)
+
+        result = {"date": dates[keep]}
+        for i, column in enumerate(COLUMNS[1:], 1):
+            result[column] = data[order, i][keep]
+        return result
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import time
+
+import numpy
+from Market import Market
+
+# column layout of the stored candles, same order as returned by ccxt fetch_ohlcv
+COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+_TIMEFRAME_UNITS_MS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000,
+}
+
+
+_WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Returns the length of a ccxt style timeframe (e.g. "1m", "4h", "1d") in milliseconds"""
+    unit = timeframe[-1]
+    if unit not in _TIMEFRAME_UNITS_MS or not timeframe[:-1].isdigit():
+        raise ValueError("Unsupported timeframe: " + timeframe)
+    return int(timeframe[:-1]) * _TIMEFRAME_UNITS_MS[unit]
+
+
+def candle_start(timestamp: int, timeframe: str) -> int:
+    """Returns the start (ms) of the candle of timeframe containing timestamp, weekly candles start on Mondays"""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    # the epoch was a Thursday, exchanges start weekly candles on Mondays
+    offset = _WEEK_OFFSET_MS if timeframe[-1] == "w" else 0
+    return timestamp - (timestamp - offset) % timeframe_ms
+
+
+class CandleStore:
+    """
+        Local on-disk cache for OHLCV candles.
+
+        Candles are stored per (exchange, market, timeframe) in a directory holding one .npy file per column
+        and a ranges.json file listing the time ranges that have already been downloaded. Only the gaps
+        between those ranges are fetched from the exchange, cached ranges are served without any network access.
+
+        The date column is sorted int64, all other columns are float64, so the column files are opened as memory maps
+        and a time range is located by binary search on the dates. Loaded candles are read-only views into the
+        memory maps: nothing is read or copied until it is used, and processes reading the same store share the
+        page cache. Updates replace the column files, views that were loaded before keep the previous data.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _path(self, exchange_id: str, market: Market, timeframe: str) -> str:
+        market_name = market.get_market().replace("/", "-").replace(":", "-")
+        return os.path.join(self.directory, exchange_id, market_name, timeframe)
+
+    def covered_ranges(self, exchange_id: str, market: Market, timeframe: str) -> list[list[int]]:
+        """Returns the sorted list of [start, end] candle timestamp ranges (ms, inclusive) that are stored locally"""
+        ranges_file = os.path.join(self._path(exchange_id, market, timeframe), "ranges.json")
+        if not os.path.exists(ranges_file):
+            return []
+        with open(ranges_file) as f:
+            return json.load(f)
+
+    def missing_ranges(self, exchange_id: str, market: Market, timeframe: str, start: int, end: int) -> list[list[int]]:
+        """Returns the parts of [start, end] (ms, inclusive) that are not covered by the local store"""
+        result = []
+        current = start
+        for covered_start, covered_end in self.covered_ranges(exchange_id, market, timeframe):
+            if covered_end < current:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > current:
+                result.append([current, covered_start - 1])
+            current = max(current, covered_end + 1)
+        if current <= end:
+            result.append([current, end])
+        return result
+
+    def load(self, exchange_id: str, market: Market, timeframe: str, start: int = None, end: int = None) -> dict[str, numpy.ndarray]:
+        """
+            Returns the stored candles with timestamps within [start, end] (ms, inclusive) as a dict of column arrays.
+            The arrays are read-only views of the memory mapped column files.
+        """
+        columns = self._open_columns(exchange_id, market, timeframe)
+        if columns is None:
+            return {
+                column: numpy.empty(0, dtype=numpy.int64 if column == "date" else numpy.float64) for column in COLUMNS
+            }
+
+        first, last = CandleStore._find_range(columns["date"], start, end)
+        return {column: values[first:last] for column, values in columns.items()}
+
+    def _open_columns(self, exchange_id: str, market: Market, timeframe: str) -> dict[str, numpy.ndarray]:
+        """Returns all stored columns as read-only memory maps, None if nothing is stored"""
+        path = self._path(exchange_id, market, timeframe)
+        if not os.path.exists(os.path.join(path, "date.npy")):
+            return None
+        return {column: numpy.load(os.path.join(path, column + ".npy"), mmap_mode="r") for column in COLUMNS}
+
+    @staticmethod
+    def _find_range(dates: numpy.ndarray, start: int = None, end: int = None) -> tuple[int, int]:
+        """Returns the index range [first, last) of the sorted dates within [start, end] (ms, inclusive)"""
+        first = 0 if start is None else int(numpy.searchsorted(dates, start, side="left"))
+        last = len(dates) if end is None else int(numpy.searchsorted(dates, end, side="right"))
+        return first, max(first, last)
+
+    def get_candles(self, exchange, market: Market, timeframe: str, start: int, end: int, exchange_id: str = None) -> dict[str, numpy.ndarray]:
+        """
+            Returns all candles with timestamps within [start, end] (ms, inclusive).
+            Missing ranges are downloaded from the exchange and added to the store first. If exchange is None,
+            only the locally stored candles are returned, exchange_id is required then.
+        """
+        if exchange_id is None:
+            if exchange is None:
+                raise ValueError("exchange_id is required to read stored candles without an exchange")
+            exchange_id = exchange.id
+
+        self.download_missing(exchange, exchange_id, market, timeframe, start, end)
+        return self.load(exchange_id, market, timeframe, start, end)
+
+    def download_missing(self, exchange, exchange_id: str, market: Market, timeframe: str, start: int, end: int) -> None:
+        """Downloads the parts of [start, end] (ms, inclusive) that are not stored yet, does nothing if exchange is None"""
+        if exchange is None:
+            return
+        for gap_start, gap_end in self.missing_ranges(exchange_id, market, timeframe, start, end):
+            self.update(exchange, exchange_id, market, timeframe, gap_start, gap_end)
+
+    def iter_chunks(self, exchange_id: str, market: Market, timeframe: str, start: int, end: int, chunk_size: int):
+        """
+            Yields the stored candles within [start, end] (ms, inclusive) as dicts of column arrays with at most chunk_size
+            candles each. The column files are memory mapped, so only the current chunk is read into memory.
+        """
+        columns = self._open_columns(exchange_id, market, timeframe)
+        if columns is None:
+            return
+
+        first, last = CandleStore._find_range(columns["date"], start, end)
+        for chunk_start in range(first, last, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, last)
+            yield {column: numpy.array(values[chunk_start:chunk_end]) for column, values in columns.items()}
+
+    def update(self, exchange, exchange_id: str, market: Market, timeframe: str, start: int, end: int) -> None:
+        """Downloads the candles within [start, end] (ms, inclusive) and merges them into the store"""
+        # CandleDownloader uses the column layout of this module
+        from CandleDownloader import CandleDownloader
+
+        timeframe_ms = timeframe_to_ms(timeframe)
+        logging.info(str.format("Downloading {} {} candles for {} from {} to {}", exchange_id, timeframe, market, start, end))
+
+        candles = CandleDownloader(exchange).download(market, timeframe, start, end)
+        rows = numpy.column_stack([candles[column] for column in COLUMNS])
+
+        # never mark candles as downloaded that are not complete yet
+        last_complete_candle = (int(time.time() * 1000) // timeframe_ms - 1) * timeframe_ms
+        covered_end = min(end, last_complete_candle)
+
+        self._merge(exchange_id, market, timeframe, rows, start, covered_end)
+
+    def _merge(self, exchange_id: str, market: Market, timeframe: str, rows: list, start: int, end: int) -> None:
+        path = self._path(exchange_id, market, timeframe)
+        os.makedirs(path, exist_ok=True)
+
+        # merge new candles into the existing ones, newly downloaded candles replace stored ones
+        candles = self.load(exchange_id, market, timeframe)
+        if len(rows) > 0:
+            new_candles = numpy.array(rows, dtype=numpy.float64).reshape(-1, len(COLUMNS))
+            for i, column in enumerate(COLUMNS):
+                values = new_candles[:, i].astype(numpy.int64) if column == "date" else new_candles[:, i]
+                candles[column] = numpy.concatenate([candles[column], values])
+
+            order = numpy.argsort(candles["date"], kind="stable")
+            dates = candles["date"][order]
+            keep = numpy.append(dates[1:] != dates[:-1], True)
+            for column in COLUMNS:
+                values = candles[column][order][keep]
+                tmp_file = os.path.join(path, column + ".tmp.npy")
+                numpy.save(tmp_file, values)
+                os.replace(tmp_file, os.path.join(path, column + ".npy"))
+
+        # update covered ranges
+        if end >= start:
+            ranges = self.covered_ranges(exchange_id, market, timeframe) + [[start, end]]
+            ranges.sort()
+            merged = [ranges[0]]
+            for range_start, range_end in ranges[1:]:
+                if range_start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], range_end)
+                else:
+                    merged.append([range_start, range_end])
+
+            tmp_file = os.path.join(path, "ranges.tmp.json")
+            with open(tmp_file, "w") as f:
+                json.dump(merged, f)
+            os.replace(tmp_file, os.path.join(path, "ranges.json"))
@@ -0,0 +1,287 @@
+from datetime import datetime, timezone
+import logging
+import math
+import time
+
+from Broker import Broker
+from Market import Market
+from Order import Order
+from OrderFill import OrderFill
+from RateLimiter import RateLimiter
+from Wallet import Wallet
+
+logger = logging.getLogger(__name__)
+
+
+class CcxtBroker(Broker):
+    """
+        Live broker on a ccxt exchange.
+
+        createOrder, cancelOrder and cancel_all_orders only queue the operation and return immediately, flush() sends
+        the queue. Orders are created and canceled in batches where the exchange supports it (createOrders,
+        cancelOrders, cancelAllOrders), an order that is canceled before it was sent is never sent. All requests use
+        the one exchange instance and its HTTP session, every request takes a token from the rate limiter first.
+        poll() detects fills in bulk, with one fetch_open_orders and one fetch_my_trades request per market. Fills
+        update the wallet, completely filled limit orders are reported to the listeners like SimulatedBroker does.
+        An order that is no longer open is kept until it is reconciled: exchanges often report trades later than the
+        closed order, so it is only forgotten when its trades filled it completely or fetch_closed_orders (bulk,
+        where supported) confirms the filled quantity that was applied.
+    """
+
+    next_id: int = 1
+
+    def __init__(self, exchange, wallet: Wallet, rate_limiter: RateLimiter = None, batch_size: int = 10, trade_limit: int = 100, max_reconcile_polls: int = 100, disable_exchange_rate_limit: bool = False) -> None:
+        """
+            Without rate_limiter, the rate limit of the exchange (ccxt rateLimit) is used. The exchange is not
+            modified: its own throttling (ccxt enableRateLimit) stays as it is unless disable_exchange_rate_limit is
+            set, which turns it off so requests are only throttled once. A closed order that can not be confirmed
+            with fetch_closed_orders is given up with a warning after max_reconcile_polls polls without its trades.
+        """
+        super().__init__()
+        self.exchange = exchange
+        self.wallet = wallet
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter.for_exchange(exchange)
+        if disable_exchange_rate_limit and self.rate_limiter is not None:
+            # requests are throttled by the rate limiter, not a second time by ccxt
+            exchange.enableRateLimit = False
+        self.batch_size = batch_size
+        self.trade_limit = trade_limit
+        self.max_reconcile_polls = max_reconcile_polls
+
+        # open orders by id, including queued orders that were not sent yet
+        self.orders: dict[int, Order] = {}
+        self.filled_orders: list[Order] = []
+        self.rejected_orders: list[Order] = []
+        self.requests = 0
+
+        # queued operations
+        self._creates: dict[int, Order] = {}
+        self._cancels: list[int] = []
+        self._cancel_all: list[Market] = []
+
+        # sent orders by exchange order id and exchange ids by order id, until they are filled or closed
+        self._sent: dict[str, Order] = {}
+        self._exchange_ids: dict[int, str] = {}
+        # orders that are no longer open on the exchange by exchange order id, with the number of polls since
+        self._closed: dict[str, list] = {}
+        # time of the last trade and ids of the trades at that time, per symbol
+        self._since: dict[str, int] = {}
+        self._seen_trades: dict[str, set] = {}
+
+    @property
+    def open_orders(self) -> list[Order]:
+        """All open orders, sorted by id"""
+        return sorted(self.orders.values(), key=lambda order: order.id)
+
+    def _request(self, method, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        self.requests += 1
+        return method(*args, **kwargs)
+
+    def _has(self, feature: str) -> bool:
+        return bool(getattr(self.exchange, "has", {}).get(feature))
+
+    @staticmethod
+    def _batches(items: list, size: int):
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
+
+    # queued operations
+
+    def createOrder(self, market: Market, qty: float, side: Order.Side = Order.Side.BUY, type: Order.Type = Order.Type.MARKET, limit_price: float = 0, timestamp = None, closes: Order = None) -> Order:
+        result = Order(market, qty, side, type, limit_price, timestamp, closes)
+        result.id = CcxtBroker.next_id
+        CcxtBroker.next_id += 1
+
+        self.orders[result.id] = result
+        self._creates[result.id] = result
+        return result
+
+    def cancelOrder(self, order_id: int):
+        if self._creates.pop(order_id, None) is not None:
+            # never sent
+            del self.orders[order_id]
+        elif order_id in self._exchange_ids and order_id not in self._cancels:
+            self._cancels.append(order_id)
+        else:
+            logger.warning("cancelOrder: Order not found: %s", order_id)
+
+    def cancel_all_orders(self, market: Market):
+        for order_id, order in list(self._creates.items()):
+            if order.market is market:
+                del self._creates[order_id]
+                del self.orders[order_id]
+
+        if self._has("cancelAllOrders"):
+            if market not in self._cancel_all:
+                self._cancel_all.append(market)
+        else:
+            for order in self.orders.values():
+                if order.market is market and order.id not in self._cancels:
+                    self._cancels.append(order.id)
+
+    # requests
+
+    def flush(self) -> None:
+        """Sends the queued operations, cancels first"""
+        cancel_all, self._cancel_all = self._cancel_all, []
+        for market in cancel_all:
+            try:
+                self._request(self.exchange.cancel_all_orders, market.get_market())
+            except Exception as e:
+                logger.warning("cancel_all_orders %s failed: %s", market, e)
+                continue
+            for order in [order for order in self.orders.values() if order.market is market]:
+                self._canceled(order)
+
+        cancels, self._cancels = [self.orders[order_id] for order_id in self._cancels if order_id in self.orders], []
+        by_symbol: dict[str, list[Order]] = {}
+        for order in cancels:
+            by_symbol.setdefault(order.market.get_market(), []).append(order)
+        for symbol, orders in by_symbol.items():
+            if self._has("cancelOrders"):
+                for batch in CcxtBroker._batches(orders, self.batch_size):
+                    self._cancel(batch, lambda: self._request(self.exchange.cancel_orders, [self._exchange_ids[order.id] for order in batch], symbol))
+            else:
+                for order in orders:
+                    self._cancel([order], lambda: self._request(self.exchange.cancel_order, self._exchange_ids[order.id], symbol))
+
+        creates, self._creates = list(self._creates.values()), {}
+        if self._has("createOrders"):
+            for batch in CcxtBroker._batches(creates, self.batch_size):
+                self._create(batch, lambda: self._request(self.exchange.create_orders, [CcxtBroker._order_request(order) for order in batch]))
+        else:
+            for order in creates:
+                self._create([order], lambda: [self._request(self.exchange.create_order, **CcxtBroker._order_request(order))])
+
+    @staticmethod
+    def _order_request(order: Order) -> dict:
+        return {
+            "symbol": order.market.get_market(),
+            "type": "limit" if order.type == Order.Type.LIMIT else "market",
+            "side": "buy" if order.side == Order.Side.BUY else "sell",
+            "amount": order.qty,
+            "price": order.limit_price if order.type == Order.Type.LIMIT else None,
+        }
+
+    def _create(self, orders: list[Order], send) -> None:
+        try:
+            results = send()
+        except Exception as e:
+            logger.error("Creating %s orders failed: %s", len(orders), e)
+            results = [None] * len(orders)
+        for order, result in zip(orders, results):
+            if result is None or result.get("id") is None:
+                self.orders.pop(order.id, None)
+                self.rejected_orders.append(order)
+                continue
+            self._sent[result["id"]] = order
+            self._exchange_ids[order.id] = result["id"]
+
+    def _cancel(self, orders: list[Order], send) -> None:
+        try:
+            send()
+        except Exception as e:
+            # the order may have been filled in the meantime, poll() finds out
+            logger.warning("Canceling %s orders failed: %s", len(orders), e)
+            return
+        for order in orders:
+            self._canceled(order)
+
+    def _canceled(self, order: Order) -> None:
+        # trades of the order until it was canceled are still applied by the next poll
+        self.orders.pop(order.id, None)
+
+    def poll(self) -> None:
+        """Detects fills of the sent orders and orders that were closed without being filled"""
+        symbols = {order.market.get_market() for order in self._sent.values()}
+        symbols.update(order.market.get_market() for order, polls in self._closed.values())
+        for symbol in sorted(symbols):
+            # open orders first, an order that is filled after this request is still found by its trades
+            open_ids = {o["id"] for o in self._request(self.exchange.fetch_open_orders, symbol)}
+            self._fetch_trades(symbol)
+
+            for exchange_id, order in list(self._sent.items()):
+                if order.market.get_market() == symbol and exchange_id not in open_ids:
+                    # filled with trades that are not visible yet, or canceled by us or outside of the bot
+                    del self._sent[exchange_id]
+                    del self._exchange_ids[order.id]
+                    self.orders.pop(order.id, None)
+                    self._closed[exchange_id] = [order, 0]
+            self._reconcile(symbol)
+
+    def _reconcile(self, symbol: str) -> None:
+        """Forgets the closed orders of a market whose filled quantity is confirmed by the exchange"""
+        pending = {exchange_id: entry for exchange_id, entry in self._closed.items() if entry[0].market.get_market() == symbol}
+        if not pending:
+            return
+
+        closed_orders = {}
+        if self._has("fetchClosedOrders"):
+            closed_orders = {o["id"]: o for o in self._request(self.exchange.fetch_closed_orders, symbol)}
+        for exchange_id, entry in pending.items():
+            order = entry[0]
+            closed_order = closed_orders.get(exchange_id)
+            if closed_order is not None and closed_order.get("filled") is not None and (order.qty_filled() >= closed_order["filled"] or math.isclose(order.qty_filled(), closed_order["filled"])):
+                # all trades of the order were applied
+                del self._closed[exchange_id]
+                continue
+            entry[1] += 1
+            if entry[1] >= self.max_reconcile_polls:
+                logger.warning("Closed order %s was not reconciled after %s polls, filled %s of %s", order.id, entry[1], order.qty_filled(), order.qty)
+                del self._closed[exchange_id]
+
+    def _fetch_trades(self, symbol: str) -> None:
+        while True:
+            trades = self._request(self.exchange.fetch_my_trades, symbol, since=self._since.get(symbol), limit=self.trade_limit)
+            new_trades = 0
+            for trade in trades:
+                seen = self._seen_trades.setdefault(symbol, set())
+                if trade["id"] in seen:
+                    continue
+                if trade["timestamp"] != self._since.get(symbol):
+                    self._since[symbol] = trade["timestamp"]
+                    seen.clear()
+                seen.add(trade["id"])
+                new_trades += 1
+                self._apply_trade(trade)
+            if len(trades) < self.trade_limit or new_trades == 0:
+                break
+
+    def _apply_trade(self, trade: dict) -> None:
+        order = self._sent.get(trade["order"])
+        if order is None:
+            closed = self._closed.get(trade["order"])
+            if closed is None:
+                return
+            order = closed[0]
+
+        fee = trade.get("fee") or {}
+        fill = OrderFill(trade["amount"], trade["price"], fee.get("cost") or 0, datetime.fromtimestamp(trade["timestamp"] / 1000, timezone.utc))
+
+        # modify wallet like SimulatedBroker does
+        qty = fill.qty if order.side == Order.Side.BUY else -fill.qty
+        self.wallet.apply_fill(order.market.base_currency, order.market.quote_currency, qty, fill.price)
+        if fill.fee and fee.get("currency"):
+            self.wallet.setBalance(fee["currency"], self.wallet.getBalance(fee["currency"]) - fill.fee)
+
+        order.add_fill(fill)
+        if order.is_filled():
+            if self._sent.pop(trade["order"], None) is not None:
+                del self._exchange_ids[order.id]
+            self._closed.pop(trade["order"], None)
+            self.orders.pop(order.id, None)
+            self.filled_orders.append(order)
+            if order.type == Order.Type.LIMIT:
+                self.notifyOrderFilled(order, fill)
+
+    def run(self, interval: float = 1.0, iterations: int = None) -> None:
+        """Sends the queued operations and polls fills every interval seconds, forever if iterations is None"""
+        i = 0
+        while iterations is None or i < iterations:
+            self.flush()
+            self.poll()
+            i += 1
+            if iterations is None or i < iterations:
+                time.sleep(interval)
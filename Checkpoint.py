@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+import io
+import pickle
+
+from CandleStore import timeframe_to_ms
+from Market import Market
+from PriceProvider import CandleListener, PriceProvider
+from SimulatedBroker import SimulatedBroker
+
+
+def _markets(price_provider: PriceProvider) -> list[Market]:
+    """Returns the markets of a price provider"""
+    result = list(getattr(price_provider, "markets", []))
+    if hasattr(price_provider, "market"):
+        result.append(price_provider.market)
+    result += [market for market in price_provider.listeners if market not in result]
+    return result
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles references to the price provider and to markets instead of the objects"""
+
+    def __init__(self, file, price_provider: PriceProvider) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.price_provider = price_provider
+
+    def persistent_id(self, obj):
+        if obj is self.price_provider:
+            return "price_provider"
+        if isinstance(obj, Market):
+            return "market", obj.get_market()
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    """Resolves the references to the price provider and to markets to the price provider of the resumed run"""
+
+    def __init__(self, file, price_provider: PriceProvider) -> None:
+        super().__init__(file)
+        self.price_provider = price_provider
+        self.markets = {market.get_market(): market for market in _markets(price_provider)}
+
+    def persistent_load(self, pid):
+        if pid == "price_provider":
+            return self.price_provider
+        name = pid[1]
+        market = self.markets.get(name)
+        if market is None:
+            parts = name.split("/")
+            market = Market(parts[0], parts[1] if len(parts) > 1 else None)
+            self.markets[name] = market
+        return market
+
+
+class Checkpoint:
+    """
+        Snapshot of a simulation.
+
+        Contains the wallet, the broker with its open and filled orders and the order id counter, the strategy and the
+        equity statistics. They are pickled as one object graph when the checkpoint is captured, so all references
+        between them (e.g. the closes link of an order) are kept. The price provider and the markets are not part of
+        the snapshot, references to them are resolved to the price provider and markets of the resumed run.
+        Candles from timestamp on have not been replayed, resuming on them gives the same results as a run that was
+        never interrupted.
+    """
+
+    def __init__(self, timestamp: datetime, data: bytes) -> None:
+        self.timestamp = timestamp
+        self.data = data
+
+    @staticmethod
+    def capture(price_provider: PriceProvider, broker: SimulatedBroker, strategy=None, equity=None, timestamp: datetime = None) -> "Checkpoint":
+        """Takes a snapshot, call between two candles. timestamp is the time of the first candle that was not replayed"""
+        objects = [broker, strategy, equity]
+
+        def captured(listeners: list) -> list:
+            # listeners that are not part of the snapshot (e.g. instrumentation) are not restored
+            return [listener for listener in listeners if any(listener is o for o in objects)]
+
+        state = {
+            "broker": broker,
+            "wallet": broker.wallet,
+            "strategy": strategy,
+            "equity": equity,
+            "next_order_id": SimulatedBroker.next_id,
+            "current_prices": {market: price_provider.getCurrentPrice(market) for market in _markets(price_provider)},
+            "listeners": {market: captured(listeners) for market, listeners in price_provider.listeners.items()},
+            "candle_listeners": captured(price_provider.candle_listeners),
+        }
+        data = io.BytesIO()
+        _Pickler(data, price_provider).dump(state)
+        return Checkpoint(timestamp, data.getvalue())
+
+    def restore(self, price_provider: PriceProvider, journal_path: str = None) -> dict:
+        """
+            Restores the snapshot on the price provider of the resumed run, which replays the candles from timestamp
+            on. The listeners of the snapshot are registered at the price provider and the broker is assigned to it.
+            The journal of the broker continues in a copy at journal_path, the journal of the checkpointed run is
+            never modified (without journal_path the copy is created next to it on the first write).
+            Returns the restored objects by name: wallet, broker, strategy and equity.
+        """
+        state = _Unpickler(io.BytesIO(self.data), price_provider).load()
+        SimulatedBroker.next_id = state["next_order_id"]
+        journal = getattr(state["broker"], "journal", None)
+        if journal_path is not None and journal is not None:
+            journal.resume(journal_path)
+
+        if hasattr(price_provider, "broker"):
+            price_provider.broker = state["broker"]
+        for market, listeners in state["listeners"].items():
+            for listener in listeners:
+                price_provider.addListener(listener, market)
+        for listener in state["candle_listeners"]:
+            price_provider.addCandleListener(listener)
+
+        current_prices = state["current_prices"]
+        if hasattr(price_provider, "current_prices"):
+            price_provider.current_prices.update(current_prices)
+        elif hasattr(price_provider, "market") and price_provider.market in current_prices:
+            price_provider.current_price = current_prices[price_provider.market]
+
+        return {name: state[name] for name in ("wallet", "broker", "strategy", "equity")}
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "Checkpoint":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+class Checkpointer(CandleListener):
+    """
+        Captures a checkpoint after the first candle at or after each of the given times. Register it as the last
+        candle listener, so the snapshot includes the candle's equity sample.
+    """
+
+    def __init__(self, price_provider: PriceProvider, broker: SimulatedBroker, strategy=None, equity=None, times: list[datetime] = ()) -> None:
+        self.price_provider = price_provider
+        self.broker = broker
+        self.strategy = strategy
+        self.equity = equity
+        self.times = sorted(times)
+        self.checkpoints: list[Checkpoint] = []
+
+    def onCandle(self, pair: Market, timestamp, open: float, high: float, low: float, close: float):
+        if len(self.checkpoints) < len(self.times) and timestamp >= self.times[len(self.checkpoints)]:
+            # resume with the next candle
+            resume_time = timestamp + timedelta(milliseconds=timeframe_to_ms(self.price_provider.timeframe))
+            checkpoint = Checkpoint.capture(self.price_provider, self.broker, self.strategy, self.equity, resume_time)
+            while len(self.checkpoints) < len(self.times) and timestamp >= self.times[len(self.checkpoints)]:
+                self.checkpoints.append(checkpoint)
@@ -1,23 +1,156 @@
+from datetime import datetime
+import math
+
+import numpy
+
 from Broker import BrokerListener
 from Market import Market
 from Order import Order
 from OrderFill import OrderFill
-from PriceProvider import PriceListener, PriceProvider
+from PriceProvider import CandleListener, PriceListener, PriceProvider
 from Wallet import Wallet
 
 
-class Equity(BrokerListener):
+def _to_ms(timestamp) -> int:
+    if isinstance(timestamp, datetime):
+        return int(round(timestamp.timestamp() * 1000))
+    return -1 if timestamp is None else int(timestamp)
+
 
-    def __init__(self, market: Market, wallet: Wallet, price_provider: PriceProvider) -> None:
+class Equity(BrokerListener, CandleListener):
+    """
+        Streaming equity statistics.
+
+        The equity is sampled after every order fill and, when registered as candle listener of the price provider,
+        at the close of every candle. Samples are stored in preallocated numpy buffers and all statistics are updated
+        incrementally with every sample, so they are available at any time without a pass over the samples.
+        Returns, volatility, Sharpe and Sortino ratio and exposure are based on the candle samples only, the
+        drawdown is based on all samples.
+    """
+
+    def __init__(self, market: Market, wallet: Wallet, price_provider: PriceProvider, capacity: int = 1024, periods_per_year: float = 1) -> None:
+        """periods_per_year is the number of candles per year, used to annualise volatility, Sharpe and Sortino ratio"""
         super().__init__()
         self._wallet = wallet
         self._price_provider = price_provider
         self._market = market
-        self.equity = []
+        self.periods_per_year = periods_per_year
+
+        # sample buffers, columns time (ms) and equity, plus exposure for candle samples
+        self._fills = numpy.empty((max(1, capacity), 2), dtype=numpy.float64)
+        self._num_fills = 0
+        self._candles = numpy.empty((max(1, capacity), 3), dtype=numpy.float64)
+        self._num_candles = 0
+
+        # drawdown over all samples
+        self.peak = -math.inf
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+
+        # running moments of the candle returns (Welford) and of the downside returns
+        self._num_returns = 0
+        self._mean_return = 0.0
+        self._m2_return = 0.0
+        self._downside_sum_sq = 0.0
+        self._exposure_sum = 0.0
 
     def calculate_equity(self) -> float:
         return self._wallet.getBalance(self._market.quote_currency) + self._wallet.getBalance(self._market.base_currency) * self._price_provider.getCurrentPrice(self._market)
 
+    @staticmethod
+    def _append(buffer: numpy.ndarray, size: int, row: tuple) -> numpy.ndarray:
+        if size == len(buffer):
+            buffer = numpy.concatenate([buffer, numpy.empty_like(buffer)])
+        buffer[size] = row
+        return buffer
+
+    def _update_drawdown(self, equity: float) -> None:
+        if equity > self.peak:
+            self.peak = equity
+        self.drawdown = (self.peak - equity) / self.peak if self.peak > 0 else 0.0
+        if self.drawdown > self.max_drawdown:
+            self.max_drawdown = self.drawdown
+
     # calculate equity on every order fill
     def onOrderFilled(self, order: Order, fill: OrderFill) -> None:
-        self.equity.append({ "time": fill.timestamp, "equity": self.calculate_equity()})
+        equity = self.calculate_equity()
+        self._fills = Equity._append(self._fills, self._num_fills, (_to_ms(fill.timestamp), equity))
+        self._num_fills += 1
+        self._update_drawdown(equity)
+
+    # sample equity and exposure at every candle close
+    def onCandle(self, pair: Market, timestamp, open: float, high: float, low: float, close: float):
+        if pair is not self._market:
+            return
+        base_value = self._wallet.getBalance(self._market.base_currency) * close
+        equity = self._wallet.getBalance(self._market.quote_currency) + base_value
+        exposure = base_value / equity if equity != 0 else 0.0
+
+        if self._num_candles > 0:
+            previous = self._candles[self._num_candles - 1, 1]
+            if previous != 0:
+                r = equity / previous - 1
+                self._num_returns += 1
+                delta = r - self._mean_return
+                self._mean_return += delta / self._num_returns
+                self._m2_return += delta * (r - self._mean_return)
+                if r < 0:
+                    self._downside_sum_sq += r * r
+
+        self._candles = Equity._append(self._candles, self._num_candles, (_to_ms(timestamp), equity, exposure))
+        self._num_candles += 1
+        self._exposure_sum += exposure
+        self._update_drawdown(equity)
+
+    @property
+    def equity(self) -> list[dict]:
+        """Equity after every order fill as list of {time, equity}"""
+        return [{"time": int(t), "equity": e} for t, e in self._fills[:self._num_fills].tolist()]
+
+    def fill_samples(self) -> numpy.ndarray:
+        """Returns a (n, 2) view of the fill samples, columns time (ms) and equity"""
+        return self._fills[:self._num_fills]
+
+    def candle_samples(self) -> numpy.ndarray:
+        """Returns a (n, 3) view of the candle samples, columns time (ms), equity and exposure"""
+        return self._candles[:self._num_candles]
+
+    def volatility(self) -> float:
+        """Standard deviation of the candle returns"""
+        if self._num_returns < 2:
+            return 0.0
+        return math.sqrt(self._m2_return / (self._num_returns - 1) * self.periods_per_year)
+
+    def sharpe_ratio(self) -> float:
+        volatility = self.volatility()
+        if volatility == 0:
+            return 0.0
+        return self._mean_return * self.periods_per_year / volatility
+
+    def sortino_ratio(self) -> float:
+        if self._num_returns == 0 or self._downside_sum_sq == 0:
+            return 0.0
+        downside_deviation = math.sqrt(self._downside_sum_sq / self._num_returns * self.periods_per_year)
+        return self._mean_return * self.periods_per_year / downside_deviation
+
+    def exposure(self) -> float:
+        """Average share of the equity held in the base currency at candle closes"""
+        return self._exposure_sum / self._num_candles if self._num_candles > 0 else 0.0
+
+    def stats(self) -> dict:
+        last_equity = None
+        if self._num_candles > 0:
+            last_equity = float(self._candles[self._num_candles - 1, 1])
+        elif self._num_fills > 0:
+            last_equity = float(self._fills[self._num_fills - 1, 1])
+        return {
+            "equity": last_equity,
+            "drawdown": self.drawdown,
+            "max_drawdown": self.max_drawdown,
+            "volatility": self.volatility(),
+            "sharpe_ratio": self.sharpe_ratio(),
+            "sortino_ratio": self.sortino_ratio(),
+            "exposure": self.exposure(),
+            "fills": self._num_fills,
+            "candles": self._num_candles,
+        }
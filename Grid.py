@@ -1,29 +1,67 @@
+import bisect
 import logging
 import math
-from multiprocessing.sharedctypes import Value
+
+import numpy
 
 
 class Grid:
+    """
+        Price levels of a grid strategy.
+
+        The levels are kept as sorted numpy array (levels, ascending) and as list from the highest to the lowest level
+        (grid_lines). Every level is computed directly from its index, so there is no rounding drift over many
+        levels, and all lookups are binary searches that work for any spacing. Besides the arithmetic grid of the
+        constructor there are geometric grids (Grid.geometric) and grids of arbitrary levels (Grid.from_levels).
+    """
 
-    def __init__(self, upper_price:float, lower_price:float, price_step: float) -> None:
+    def __init__(self, upper_price:float, lower_price:float, price_step: float, levels = None) -> None:
+        """Grid lines every price_step from upper_price down to lower_price, or the given levels if price_step is None"""
 
         self.upper_price = upper_price
         self.lower_price = lower_price
         self.price_step = price_step
-        self.grid_lines = []
 
         # make sure upper price is greater than lower price
         if upper_price < lower_price:
             raise ValueError()
 
         # initialise grid lines
-        price = upper_price
-        while (price >= lower_price):
-            self.grid_lines.append(price)
-            price -= price_step
+        if levels is None:
+            if price_step <= 0:
+                raise ValueError("price_step must be positive")
+            num_levels = math.floor((upper_price - lower_price) / price_step) + 1
+            # correct the rounding of the division, the lowest level is the last one >= lower_price
+            while upper_price - num_levels * price_step >= lower_price:
+                num_levels += 1
+            while num_levels > 1 and upper_price - (num_levels - 1) * price_step < lower_price:
+                num_levels -= 1
+            levels = upper_price - numpy.arange(num_levels - 1, -1, -1, dtype=numpy.float64) * price_step
+        self.levels: numpy.ndarray = numpy.asarray(levels, dtype=numpy.float64)
+        self.grid_lines: list[float] = self.levels[::-1].tolist()
+        self._ascending: list[float] = self.levels.tolist()
+
         logging.info("Generated " + str(len(self.grid_lines)) + " price levels from " + str(self.upper_price) + " to " + str(self.lower_price) + " every " + str(self.price_step))
         logging.debug(self.grid_lines)
 
+    @staticmethod
+    def geometric(upper_price: float, lower_price: float, ratio: float) -> "Grid":
+        """Grid lines from upper_price down to lower_price, every line is ratio (e.g. 0.01 for 1 %) above the next lower line"""
+        if upper_price < lower_price or lower_price <= 0 or ratio <= 0:
+            raise ValueError()
+        exponents = numpy.arange(math.floor(math.log(upper_price / lower_price) / math.log1p(ratio)) + 2, dtype=numpy.float64)
+        levels = upper_price / (1 + ratio) ** exponents
+        # a level within rounding error of lower_price is kept
+        return Grid(upper_price, lower_price, None, numpy.sort(levels[levels >= lower_price * (1 - 1e-12)]))
+
+    @staticmethod
+    def from_levels(levels) -> "Grid":
+        """Grid with arbitrary price levels, duplicates are removed"""
+        levels = numpy.unique(numpy.asarray(levels, dtype=numpy.float64))
+        if len(levels) == 0:
+            raise ValueError("A grid needs at least one level")
+        return Grid(float(levels[-1]), float(levels[0]), None, levels)
+
     def num_gridlines_below(self, price: float) -> int:
         """Returns the number of grid lines that are lower or equal than the given price"""
         if price <= self.lower_price:
@@ -31,7 +69,7 @@ class Grid:
         elif price >= self.upper_price:
             return len(self.grid_lines)
         else:
-            return math.floor((price - self.lower_price) / self.price_step) + 1
+            return bisect.bisect_right(self._ascending, price)
 
 
     def num_gridlines_above(self, price: float) -> int:
@@ -41,37 +79,32 @@ class Grid:
         elif price >= self.upper_price:
             return 0
         else:
-            return math.floor((self.upper_price - price) / self.price_step) + 1
+            return len(self._ascending) - bisect.bisect_left(self._ascending, price)
 
     def price_below(self, price: float) -> float:
         """Returns the next grid line below or equal the given price"""
-        if price < self.lower_price:
-            raise ValueError()
-        elif price >= self.upper_price:
+        if price >= self.upper_price:
             return self.upper_price
-        else:
-            return math.floor(price / self.price_step) * self.price_step
+        idx = bisect.bisect_right(self._ascending, price) - 1
+        if idx < 0:
+            raise ValueError()
+        return self._ascending[idx]
 
     def price_above(self, price: float) -> float:
         """Returns the next grid line above or equal the given price"""
-        if price <= self.lower_price:
-            return self.lower_price
-        elif price > self.upper_price:
+        if price > self.upper_price:
             raise ValueError()
-        else:
-            return math.ceil(price / self.price_step) * self.price_step
+        return self._ascending[bisect.bisect_left(self._ascending, price)]
 
     def get_grid_index(self, price: float):
-        
-        # find nearest price in terms of price_step
-        nearest_grid_price = round(price / self.price_step) * self.price_step
-        idx = round((nearest_grid_price - self.lower_price) / self.price_step)
-        
-        # since prices are sorted high to low, the idx is actually from the end of the grid and needs to be reverted
-        idx = len(self.grid_lines) - idx - 1
-        
+        """Returns the index in grid_lines of the grid line nearest to the given price"""
+        # grid lines are sorted high to low starting at upper_price, levels low to high
+        idx = bisect.bisect_left(self._ascending, price)
+
         # clamp to grid range
-        idx = min(idx, len(self.grid_lines)-1)
-        idx = max(idx, 0)
+        if idx == len(self._ascending):
+            idx -= 1
+        elif idx > 0 and price - self._ascending[idx - 1] < self._ascending[idx] - price:
+            idx -= 1
 
-        return idx
+        return len(self._ascending) - 1 - idx
@@ -1,3 +1,4 @@
+from itertools import zip_longest
 import logging
 import math
 import string
@@ -13,12 +14,22 @@ from Wallet import Wallet
 
 class GridStrategy(Strategy, BrokerListener):
 
-    def __init__(self, pair: Market, wallet: Wallet, broker: Broker, price_provider: PriceProvider) -> None:
+    def __init__(self, pair: Market, wallet: Wallet, broker: Broker, price_provider: PriceProvider, resting_orders: int = None) -> None:
+        """
+            By default all orders are canceled on every fill and one buy and one sell order are created next to the
+            filled grid line. With resting_orders set, that many orders are kept on each side of the last fill and a
+            fill only cancels and creates the orders that differ from the resting orders.
+        """
         super().__init__()
         self.pair = pair
         self.wallet = wallet
         self.broker = broker
         self.price_provider = price_provider
+        if resting_orders is not None and resting_orders < 1:
+            raise ValueError("resting_orders must be at least 1")
+        self.resting_orders = resting_orders
+        # open limit orders of the strategy by (grid line index, side), only used with resting_orders
+        self.orders: dict[tuple[int, Order.Side], Order] = {}
 
     def initialiseOrders(self) -> None:
         market_price = self.price_provider.getCurrentPrice(self.pair)
@@ -44,6 +55,7 @@ class GridStrategy(Strategy, BrokerListener):
             self.broker.createOrder(self.pair, base_qty)
         
         # create buy order below
+        buy_order = None
         if market_price > self.grid.lower_price:
             buy_price = self.grid.price_below(market_price)
             buy_qty = size_per_grid / buy_price
@@ -61,16 +73,31 @@ class GridStrategy(Strategy, BrokerListener):
             
             sell_qty = size_per_grid / buy_price
 
-            self.broker.createOrder(self.pair, sell_qty, Order.Side.SELL, Order.Type.LIMIT, sell_price, closes=buy_order)
+            sell_order = self.broker.createOrder(self.pair, sell_qty, Order.Side.SELL, Order.Type.LIMIT, sell_price, closes=buy_order)
 
+        if self.resting_orders is not None:
+            # track the first orders and add the other resting orders beyond them
+            first_buy, first_sell = len(self.grid.grid_lines), -1
+            if buy_order is not None:
+                first_buy = self.grid.get_grid_index(buy_order.limit_price)
+                self.orders[(first_buy, Order.Side.BUY)] = buy_order
+            if market_price < self.grid.upper_price:
+                first_sell = self.grid.get_grid_index(sell_order.limit_price)
+                self.orders[(first_sell, Order.Side.SELL)] = sell_order
+            self.update_orders(first_buy, first_sell, size_per_grid)
 
     def initialise(self, upper_price: float, lower_price: float, price_step: float) -> None:
-        self.grid = Grid(upper_price, lower_price, price_step)
+        self.initialise_grid(Grid(upper_price, lower_price, price_step))
+
+    def initialise_grid(self, grid: Grid) -> None:
+        """Initialises the strategy with any grid, e.g. a geometric grid or one with custom levels"""
+        self.grid = grid
         self.initialiseOrders()
 
     def onOrderFilled(self, order: Order, fill: OrderFill):
         if (order.type == Order.Type.LIMIT) and (order.market == self.pair):
-            self.broker.cancel_all_orders(self.pair)
+            if self.resting_orders is None:
+                self.broker.cancel_all_orders(self.pair)
             idx = self.grid.get_grid_index(order.limit_price)
             if idx >= 0:
                 market_price = order.limit_price
@@ -79,6 +106,15 @@ class GridStrategy(Strategy, BrokerListener):
                 value_quote = self.wallet.getBalance(self.pair.quote_currency)
 
                 size_per_grid = (value_base + value_quote) / len(self.grid.grid_lines)
+
+                # if the fill closed a buy order, assign the sell order one level above to it for profit calculation purposes
+                closes_order = None
+                if order.is_filled() and order.side == Order.Side.BUY:
+                    closes_order = order
+
+                if self.resting_orders is not None:
+                    self.update_orders(idx + 1, idx - 1, size_per_grid, closes_order)
+                    return
                 
                 # create buy order one grid level below
                 below_idx = idx + 1
@@ -93,12 +129,38 @@ class GridStrategy(Strategy, BrokerListener):
                     sell_price = self.grid.grid_lines[sell_idx]
                     # sell the qty that was bought on current level
                     sell_qty = size_per_grid / self.grid.grid_lines[idx]
-                   
-                    # if the fill closed a buy order, assign the sell order one level above to it for profit calculation purposes
-                    closes_order = None
-                    if order.is_filled() and order.side == Order.Side.BUY:
-                        closes_order = order
                     self.broker.createOrder(self.pair, sell_qty, Order.Side.SELL, Order.Type.LIMIT, sell_price, closes=closes_order)
         else:
             logging.info("Order ignored: " + str(order))
 
+    def update_orders(self, first_buy: int, first_sell: int, size_per_grid: float, closes_order: Order = None) -> None:
+        """
+            Keeps resting_orders buy orders on the grid lines from index first_buy down and as many sell orders from
+            index first_sell up. Only orders that are not resting yet are created and only resting orders that are not
+            wanted anymore are canceled. The sell order at first_sell closes closes_order.
+        """
+        lines = self.grid.grid_lines
+        buys = [(i, Order.Side.BUY) for i in range(first_buy, min(first_buy + self.resting_orders, len(lines)))]
+        sells = [(i, Order.Side.SELL) for i in range(first_sell, max(first_sell - self.resting_orders, -1), -1)]
+        wanted = set(buys + sells)
+
+        # forget filled orders, cancel the orders that are too far away or on the wrong side
+        for key, order in list(self.orders.items()):
+            if order.is_filled():
+                del self.orders[key]
+            elif key not in wanted:
+                self.broker.cancelOrder(order.id)
+                del self.orders[key]
+
+        # create the missing orders, the nearest ones first
+        for key in [key for pair in zip_longest(buys, sells) for key in pair if key is not None]:
+            if key in self.orders:
+                continue
+            i, side = key
+            if side == Order.Side.BUY:
+                order = self.broker.createOrder(self.pair, size_per_grid / lines[i], Order.Side.BUY, Order.Type.LIMIT, lines[i])
+            else:
+                # sell the qty that is bought one level below
+                qty = size_per_grid / lines[min(i + 1, len(lines) - 1)]
+                order = self.broker.createOrder(self.pair, qty, Order.Side.SELL, Order.Type.LIMIT, lines[i], closes=closes_order if i == first_sell else None)
+            self.orders[key] = order
@@ -0,0 +1,216 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import itertools
+import logging
+import math
+from multiprocessing import shared_memory
+import os
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from CandleStore import COLUMNS, timeframe_to_ms
+from Equity import Equity
+from Grid import Grid
+from GridStrategy import GridStrategy
+from Market import Market
+from Order import Order
+from PriceTape import PriceTape
+from SimulatedBroker import SimulatedBroker
+from VectorizedGridBacktest import VectorizedGridBacktest
+from Wallet import Wallet
+
+YEAR_MS = 365 * 24 * 3600 * 1000
+
+RESULT_COLUMNS = ["upper_price", "lower_price", "price_step", "final_equity", "profit", "fills", "max_drawdown", "sharpe_ratio"]
+
+
+def max_drawdown(equity: numpy.ndarray) -> float:
+    """Returns the largest relative drop of the equity from a previous peak, drops from peaks of 0 or less count as 0"""
+    if len(equity) == 0:
+        return 0.0
+    peaks = numpy.maximum.accumulate(equity)
+    positive = peaks > 0
+    drawdowns = numpy.divide(peaks - equity, peaks, out=numpy.zeros(len(equity)), where=positive)
+    return float(numpy.max(drawdowns))
+
+
+def sharpe_ratio(equity: numpy.ndarray, periods_per_year: float) -> float:
+    """Annualised Sharpe ratio of the returns of equity samples at candle closes, same as Equity.sharpe_ratio"""
+    previous = equity[:-1]
+    returns = equity[1:][previous != 0] / previous[previous != 0] - 1
+    if len(returns) < 2:
+        return 0.0
+    volatility = math.sqrt(numpy.var(returns, ddof=1) * periods_per_year)
+    if volatility == 0:
+        return 0.0
+    return float(numpy.mean(returns) * periods_per_year / volatility)
+
+
+def run_vectorized_grid_backtest(market: Market, timeframe: str, candles: dict, balances: dict, upper_price: float, lower_price: float, price_step: float) -> dict:
+    """Same as run_grid_backtest, computed by VectorizedGridBacktest"""
+    wallet = Wallet()
+    for token, amount in balances.items():
+        wallet.setBalance(token, amount)
+
+    tape = PriceTape(candles["date"], candles["open"], candles["high"], candles["low"], candles["close"])
+    initial_equity = wallet.getBalance(market.quote_currency) + wallet.getBalance(market.base_currency) * tape.prices[0, 0]
+
+    initial_base = wallet.getBalance(market.base_currency)
+    initial_quote = wallet.getBalance(market.quote_currency)
+    backtest = VectorizedGridBacktest(market, wallet, Grid(upper_price, lower_price, price_step))
+    backtest.run(tape)
+
+    # balances after the fills of every candle, all fills of a candle happen before its close
+    fills = backtest.fills
+    signed_qty = numpy.where(fills["side"] == Order.Side.BUY.value, fills["qty"], -fills["qty"])
+    base = numpy.concatenate([[initial_base], initial_base + numpy.cumsum(signed_qty)])
+    quote = numpy.concatenate([[initial_quote], initial_quote - numpy.cumsum(signed_qty * fills["price"])])
+    num_fills = numpy.searchsorted(fills["date"], tape.timestamps, side="right")
+    candle_equity = quote[num_fills] + base[num_fills] * tape.prices[:, 3]
+
+    final_equity = wallet.getBalance(market.quote_currency) + wallet.getBalance(market.base_currency) * backtest.current_price
+    equity_values = numpy.concatenate([[initial_equity], backtest.equity["equity"], [final_equity]])
+
+    return {
+        "upper_price": upper_price,
+        "lower_price": lower_price,
+        "price_step": price_step,
+        "final_equity": final_equity,
+        "profit": float(backtest.fills["profit"].sum()),
+        "fills": len(backtest.fills["qty"]),
+        "max_drawdown": max_drawdown(equity_values),
+        "sharpe_ratio": sharpe_ratio(candle_equity, YEAR_MS / timeframe_to_ms(timeframe)),
+    }
+
+
+def run_grid_backtest(market: Market, timeframe: str, candles: dict, balances: dict, upper_price: float, lower_price: float, price_step: float, vectorized: bool = False) -> dict:
+    """Runs a single GridStrategy backtest over preloaded candle columns and returns its result row"""
+    if vectorized:
+        return run_vectorized_grid_backtest(market, timeframe, candles, balances, upper_price, lower_price, price_step)
+
+    wallet = Wallet()
+    for token, amount in balances.items():
+        wallet.setBalance(token, amount)
+    broker = SimulatedBroker(wallet)
+
+    start_date = datetime.fromtimestamp(candles["date"][0] / 1000, timezone.utc)
+    end_date = datetime.fromtimestamp(candles["date"][-1] / 1000, timezone.utc)
+    price_provider = BacktestingPriceProvider(None, market, broker, timeframe, start_date, end_date, candles=candles)
+
+    equity = Equity(market, wallet, price_provider, periods_per_year=YEAR_MS / timeframe_to_ms(timeframe))
+    initial_equity = equity.calculate_equity()
+
+    strategy = GridStrategy(market, wallet, broker, price_provider)
+    strategy.initialise(upper_price, lower_price, price_step)
+    broker.addListener(strategy)
+    price_provider.addListener(broker, market)
+    broker.addListener(equity)
+    price_provider.addCandleListener(equity)
+
+    price_provider.run()
+
+    final_equity = equity.calculate_equity()
+
+    # profit of all sell orders that closed a filled buy order, like BacktestReport
+    profit = 0
+    for order in broker.filled_orders:
+        if order.closes is not None and order.closes.is_filled() and order.side == Order.Side.SELL:
+            profit += order.qty * order.fill_price() - order.closes.qty * order.closes.fill_price()
+
+    equity_values = numpy.concatenate([[initial_equity], equity.fill_samples()[:, 1], [final_equity]])
+
+    return {
+        "upper_price": upper_price,
+        "lower_price": lower_price,
+        "price_step": price_step,
+        "final_equity": final_equity,
+        "profit": profit,
+        "fills": len(broker.filled_orders),
+        "max_drawdown": max_drawdown(equity_values),
+        "sharpe_ratio": equity.sharpe_ratio(),
+    }
+
+
+# candles and settings of a sweep worker process, attached once per worker by _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name: str, num_candles: int, market: Market, timeframe: str, balances: dict, vectorized: bool) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = numpy.ndarray((len(COLUMNS), num_candles), dtype=numpy.float64, buffer=shm.buf)
+    candles = {column: data[i] for i, column in enumerate(COLUMNS)}
+    candles["date"] = candles["date"].astype(numpy.int64)
+
+    _worker["shm"] = shm
+    _worker["args"] = (market, timeframe, candles, balances)
+    _worker["vectorized"] = vectorized
+
+
+def _run_worker(params: tuple) -> dict:
+    return run_grid_backtest(*_worker["args"], *params, vectorized=_worker["vectorized"])
+
+
+class GridSweep:
+    """
+        Runs GridStrategy backtests for every combination of grid parameters on a process pool.
+
+        The candles are copied once into shared memory, worker processes attach to it when they start,
+        so only the grid parameters are sent with each task.
+        With vectorized=True the backtests are computed by VectorizedGridBacktest, for fast screening of large sweeps.
+    """
+
+    def __init__(self, market: Market, timeframe: str, candles: dict, balances: dict, max_workers: int = None, vectorized: bool = False) -> None:
+        self.market = market
+        self.vectorized = vectorized
+        self.timeframe = timeframe
+        self.candles = candles
+        self.balances = balances
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+
+    @staticmethod
+    def parameter_sets(upper_prices, lower_prices, price_steps) -> list[tuple]:
+        """Returns all valid (upper_price, lower_price, price_step) combinations"""
+        return [p for p in itertools.product(upper_prices, lower_prices, price_steps) if p[0] > p[1] and p[2] > 0]
+
+    def run(self, upper_prices, lower_prices, price_steps, results_writer=None):
+        """
+            Runs a backtest for every parameter combination, returns a dataframe with one result row per combination.
+            With a ResultsWriter every result row is queued for the results store as soon as it arrives. Sweep runs
+            are stored with their metrics only, without fills and equity samples: workers only send back result rows.
+            Backtest a parameter set on its own to store its fills and equity.
+        """
+        import pandas
+
+        params = GridSweep.parameter_sets(upper_prices, lower_prices, price_steps)
+        logging.info(str.format("Sweeping {} parameter sets on {} processes", len(params), self.max_workers))
+
+        num_candles = len(self.candles["date"])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(COLUMNS) * num_candles * 8))
+        try:
+            data = numpy.ndarray((len(COLUMNS), num_candles), dtype=numpy.float64, buffer=shm.buf)
+            for i, column in enumerate(COLUMNS):
+                data[i] = self.candles[column]
+
+            chunksize = max(1, len(params) // (self.max_workers * 4))
+            with ProcessPoolExecutor(self.max_workers, initializer=_init_worker,
+                                     initargs=(shm.name, num_candles, self.market, self.timeframe, self.balances, self.vectorized)) as executor:
+                rows = []
+                for row in executor.map(_run_worker, params, chunksize=chunksize):
+                    rows.append(row)
+                    if results_writer is not None:
+                        results_writer.submit(self._create_run(row))
+            del data
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return pandas.DataFrame(rows, columns=RESULT_COLUMNS)
+
+    def _create_run(self, row: dict) -> dict:
+        """Returns the run of a result row for the results store, metrics only"""
+        from ResultsStore import create_run
+        dates = self.candles["date"]
+        parameters = {"balances": self.balances, "vectorized": self.vectorized}
+        return create_run(self.market.get_market(), self.timeframe, int(dates[0]) if len(dates) > 0 else None, int(dates[-1]) if len(dates) > 0 else None,
+                          row["upper_price"], row["lower_price"], row["price_step"], row, parameters)
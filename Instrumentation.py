@@ -0,0 +1,172 @@
+from datetime import datetime
+import json
+import time
+
+import numpy
+
+from Market import Market
+from PriceProvider import CandleListener, PriceProvider
+
+
+# latency histogram: exact below 16 ns, above 8 buckets per power of two, each at most 12.5% wide
+_SUB_BUCKET_BITS = 3
+_NUM_BUCKETS = 64 << _SUB_BUCKET_BITS
+
+
+def _bucket(duration: int) -> int:
+    shift = duration.bit_length() - _SUB_BUCKET_BITS - 1
+    return duration if shift <= 0 else (shift << _SUB_BUCKET_BITS) + (duration >> shift)
+
+
+def _bucket_bounds(index: int) -> tuple[int, int]:
+    """Returns the smallest and the largest duration (ns) of a bucket"""
+    shift = (index >> _SUB_BUCKET_BITS) - 1
+    if shift <= 0:
+        return index, index
+    lower = (index & ((1 << _SUB_BUCKET_BITS) - 1) | (1 << _SUB_BUCKET_BITS)) << shift
+    return lower, lower + (1 << shift) - 1
+
+
+class _Timer:
+    """
+        Call count and latencies (ns) of one listener method.
+
+        Latencies are counted in a fixed-size histogram of log buckets, memory does not grow with the number of calls.
+        Percentiles are the middle of their bucket, within 6.25% of the exact value.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.counts = [0] * _NUM_BUCKETS
+
+    def wrap(self, method):
+        counts = self.counts
+        perf_counter_ns = time.perf_counter_ns
+        timer = self
+
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                duration = perf_counter_ns() - start
+                counts[_bucket(duration)] += 1
+                timer.calls += 1
+                timer.total_ns += duration
+                if duration > timer.max_ns:
+                    timer.max_ns = duration
+        return timed
+
+    def percentile(self, q: float) -> float:
+        """Returns the q-th percentile of the latencies in ns"""
+        if self.calls == 0:
+            return 0.0
+        cumulative = numpy.cumsum(self.counts)
+        index = numpy.searchsorted(cumulative, max(1, int(numpy.ceil(q / 100 * self.calls))))
+        lower, upper = _bucket_bounds(int(index))
+        return min(float(lower + upper) / 2, float(self.max_ns))
+
+    def stats(self, elapsed: float) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": self.total_ns / 1e6,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max_ns / 1e3,
+            "calls_per_second": self.calls / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class InstrumentedListener:
+    """Proxy of a listener that times the instrumented methods and forwards everything else"""
+
+    def __init__(self, listener, timers: dict) -> None:
+        self._listener = listener
+        self._timers = timers
+        for name, timer in timers.items():
+            setattr(self, name, timer.wrap(getattr(listener, name)))
+
+    def __getattr__(self, name):
+        return getattr(self._listener, name)
+
+
+class Instrumentation(CandleListener):
+    """
+        Opt-in profiling of the listener callbacks of a simulation.
+
+        install() replaces the listeners of a price provider and a broker by proxies that record the latency of every
+        onPriceChanged, onOrderFilled and onCandle call, per listener class and event. Latencies include the nested
+        callbacks, e.g. the time of SimulatedBroker.onPriceChanged includes the strategy reacting to the fills.
+        At every candle the number of open orders and price events is sampled. Nothing is wrapped unless install()
+        is called, so an uninstrumented run has no overhead.
+    """
+
+    def __init__(self) -> None:
+        self.timers: dict[str, _Timer] = {}
+        self.started = time.perf_counter()
+        self._broker = None
+        # per candle samples of (time in ms, open orders, price events since the previous candle)
+        self.samples: list[tuple] = []
+        self._price_events = None
+        self._last_price_events = 0
+
+    def _timer(self, key: str) -> _Timer:
+        timer = self.timers.get(key)
+        if timer is None:
+            timer = _Timer()
+            self.timers[key] = timer
+        return timer
+
+    def wrap(self, listener, *events: str) -> InstrumentedListener:
+        """Returns a proxy of listener that times the given methods"""
+        return InstrumentedListener(listener, {event: self._timer(type(listener).__name__ + "." + event) for event in events})
+
+    def _wrap_listeners(self, listeners: list, event: str) -> None:
+        for i, listener in enumerate(listeners):
+            if listener is not self and not isinstance(listener, InstrumentedListener):
+                listeners[i] = self.wrap(listener, event)
+
+    def install(self, price_provider: PriceProvider, broker=None) -> None:
+        """Instruments all listeners registered at the price provider and the broker, call after wiring the simulation"""
+        for listeners in price_provider.listeners.values():
+            self._wrap_listeners(listeners, "onPriceChanged")
+        self._wrap_listeners(price_provider.candle_listeners, "onCandle")
+        if broker is not None:
+            self._wrap_listeners(broker.listeners, "onOrderFilled")
+            self._broker = broker
+
+        # count every price event once, by the calls of its first listener
+        for listeners in price_provider.listeners.values():
+            if len(listeners) > 0 and self._price_events is None:
+                self._price_events = listeners[0]._timers["onPriceChanged"]
+        price_provider.addCandleListener(self)
+        self.started = time.perf_counter()
+
+    def onCandle(self, pair: Market, timestamp, open: float, high: float, low: float, close: float):
+        open_orders = sum(len(book) for book in self._broker.books.values()) if self._broker is not None else 0
+        price_events = self._price_events.calls if self._price_events is not None else 0
+        if isinstance(timestamp, datetime):
+            timestamp = int(round(timestamp.timestamp() * 1000))
+        self.samples.append((timestamp, open_orders, price_events - self._last_price_events))
+        self._last_price_events = price_events
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        price_events = self._price_events.calls if self._price_events is not None else 0
+        open_orders = [sample[1] for sample in self.samples]
+        return {
+            "elapsed_s": elapsed,
+            "price_events": price_events,
+            "price_events_per_second": price_events / elapsed if elapsed > 0 else 0.0,
+            "max_open_orders": max(open_orders, default=0),
+            "mean_open_orders": float(numpy.mean(open_orders)) if len(open_orders) > 0 else 0.0,
+            "listeners": {key: timer.stats(elapsed) for key, timer in self.timers.items()},
+            "candles": [{"time": t, "open_orders": o, "price_events": e} for t, o, e in self.samples],
+        }
+
+    def dump(self, path: str) -> None:
+        """Writes the collected statistics as json"""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
@@ -0,0 +1,228 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+
+import numpy
+
+from CandleStore import timeframe_to_ms
+from GridSweep import RESULT_COLUMNS, YEAR_MS, run_grid_backtest
+from Market import Market
+
+
+class PathGenerator(ABC):
+    """
+        Generator of synthetic candle series (price paths).
+
+        Every path is computed on its own from the seed and its index, so any path can be generated in any process
+        and paths never have to be kept in memory, neither in the process that runs the simulations nor in the
+        workers. All paths start at start_price.
+    """
+
+    def __init__(self, timeframe: str, num_candles: int, start_price: float, seed: int = None, start_time: int = 0) -> None:
+        """Without seed a random seed is chosen, it is kept for all paths of the generator"""
+        self.timeframe = timeframe
+        self.num_candles = num_candles
+        self.start_price = start_price
+        self.seed = numpy.random.SeedSequence().entropy if seed is None else seed
+        self.start_time = start_time
+
+    def random(self, index: int) -> numpy.random.Generator:
+        """Returns the random number generator of a path"""
+        return numpy.random.default_rng([self.seed, index])
+
+    @abstractmethod
+    def candles(self, index: int) -> dict:
+        """Returns the candle columns (date, open, high, low, close, volume) of a path"""
+        pass
+
+    def paths(self, num_paths: int, first: int = 0):
+        """Yields the candles of num_paths paths, one path at a time"""
+        for index in range(first, first + num_paths):
+            yield self.candles(index)
+
+    def _create_candles(self, log_open: numpy.ndarray, log_high: numpy.ndarray, log_low: numpy.ndarray, log_close: numpy.ndarray, volume: numpy.ndarray) -> dict:
+        return {
+            "date": self.start_time + numpy.arange(len(log_open), dtype=numpy.int64) * timeframe_to_ms(self.timeframe),
+            "open": numpy.exp(log_open),
+            "high": numpy.exp(log_high),
+            "low": numpy.exp(log_low),
+            "close": numpy.exp(log_close),
+            "volume": volume,
+        }
+
+
+class BootstrapPaths(PathGenerator):
+    """
+        Block bootstrap of historical candles.
+
+        Every candle is described by its gap (open relative to the previous close) and its high, low and close
+        relative to its open. A path is a random sequence of blocks of block_size consecutive historical candles,
+        chained from start_price, so volatility clustering and the shape of candles within a block are preserved.
+    """
+
+    def __init__(self, candles: dict, timeframe: str, block_size: int = 24, num_candles: int = None, start_price: float = None, seed: int = None) -> None:
+        """Paths have as many candles as the history unless num_candles is given, and start at its first open"""
+        dates = numpy.asarray(candles["date"], dtype=numpy.int64)
+        if block_size < 1 or len(dates) < block_size:
+            raise ValueError("Need at least " + str(block_size) + " candles to bootstrap blocks of " + str(block_size))
+        open = numpy.asarray(candles["open"], dtype=numpy.float64)
+        close = numpy.asarray(candles["close"], dtype=numpy.float64)
+        super().__init__(timeframe, len(dates) if num_candles is None else num_candles, float(open[0]) if start_price is None else start_price, seed, int(dates[0]))
+
+        self.block_size = block_size
+        self.gaps = numpy.zeros(len(dates))
+        self.gaps[1:] = numpy.log(open[1:] / close[:-1])
+        self.highs = numpy.log(numpy.asarray(candles["high"], dtype=numpy.float64) / open)
+        self.lows = numpy.log(numpy.asarray(candles["low"], dtype=numpy.float64) / open)
+        self.closes = numpy.log(close / open)
+        self.volumes = numpy.asarray(candles["volume"], dtype=numpy.float64)
+
+    def candles(self, index: int) -> dict:
+        rng = self.random(index)
+        num_blocks = -(-self.num_candles // self.block_size)
+        starts = rng.integers(0, len(self.gaps) - self.block_size + 1, num_blocks)
+        idx = (starts[:, None] + numpy.arange(self.block_size)).ravel()[:self.num_candles]
+
+        # the first candle opens at start_price, its gap is ignored
+        log_close = numpy.log(self.start_price) - self.gaps[idx[0]] + numpy.cumsum(self.gaps[idx] + self.closes[idx])
+        log_open = log_close - self.closes[idx]
+        return self._create_candles(log_open, log_open + self.highs[idx], log_open + self.lows[idx], log_close, self.volumes[idx])
+
+
+class Regime:
+    """Market regime of RegimeSwitchingGBM, drift and volatility are annualised, duration is the mean length in candles"""
+
+    def __init__(self, drift: float, volatility: float, duration: float) -> None:
+        if volatility < 0 or duration < 1:
+            raise ValueError("volatility must not be negative and duration at least 1 candle")
+        self.drift = drift
+        self.volatility = volatility
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return "Regime(" + str(self.drift) + ", " + str(self.volatility) + ", " + str(self.duration) + ")"
+
+
+class RegimeSwitchingGBM(PathGenerator):
+    """
+        Geometric brownian motion with regime switching.
+
+        The path stays in a regime for a geometrically distributed number of candles with the mean duration of the
+        regime and then switches to one of the other regimes at random. Every candle is simulated in substeps,
+        high and low are the extremes of the substeps, every candle opens at the previous close.
+    """
+
+    def __init__(self, regimes: list[Regime], timeframe: str, num_candles: int, start_price: float, seed: int = None, substeps: int = 8, start_time: int = 0) -> None:
+        if len(regimes) == 0:
+            raise ValueError("At least one regime is required")
+        super().__init__(timeframe, num_candles, start_price, seed, start_time)
+        self.regimes = regimes
+        self.substeps = substeps
+
+    def regime_sequence(self, rng: numpy.random.Generator) -> numpy.ndarray:
+        """Returns the regime index of every candle"""
+        result = numpy.empty(self.num_candles, dtype=numpy.int64)
+        regime = int(rng.integers(len(self.regimes)))
+        position = 0
+        while position < self.num_candles:
+            duration = int(rng.geometric(1 / self.regimes[regime].duration))
+            result[position:position + duration] = regime
+            position += duration
+            if len(self.regimes) > 1:
+                regime = (regime + 1 + int(rng.integers(len(self.regimes) - 1))) % len(self.regimes)
+        return result
+
+    def candles(self, index: int) -> dict:
+        rng = self.random(index)
+        regimes = self.regime_sequence(rng)
+        drift = numpy.array([regime.drift for regime in self.regimes])[regimes]
+        volatility = numpy.array([regime.volatility for regime in self.regimes])[regimes]
+
+        dt = timeframe_to_ms(self.timeframe) / YEAR_MS / self.substeps
+        steps = rng.standard_normal((self.num_candles, self.substeps)) * (volatility * numpy.sqrt(dt))[:, None]
+        steps += ((drift - volatility ** 2 / 2) * dt)[:, None]
+        log_prices = numpy.log(self.start_price) + numpy.cumsum(steps.ravel()).reshape(steps.shape)
+
+        log_open = numpy.empty(self.num_candles)
+        log_open[0] = numpy.log(self.start_price)
+        log_open[1:] = log_prices[:-1, -1]
+        log_high = numpy.maximum(log_open, log_prices.max(axis=1))
+        log_low = numpy.minimum(log_open, log_prices.min(axis=1))
+        result = self._create_candles(log_open, log_high, log_low, log_prices[:, -1], numpy.zeros(self.num_candles))
+        # exactly the previous close, numpy.exp of the same value may differ in the last bit between array positions
+        result["open"][1:] = result["close"][:-1]
+        return result
+
+
+# path generator and settings of a worker process, set once per worker by _init_worker
+_worker = {}
+
+
+def _init_worker(generator: PathGenerator, market: Market, balances: dict, grid: tuple, vectorized: bool) -> None:
+    _worker["generator"] = generator
+    _worker["args"] = (market, generator.timeframe)
+    _worker["balances"] = balances
+    _worker["grid"] = grid
+    _worker["vectorized"] = vectorized
+
+
+def _run_worker(index: int) -> dict:
+    # the path only exists in this worker while it is simulated
+    candles = _worker["generator"].candles(index)
+    result = run_grid_backtest(*_worker["args"], candles, _worker["balances"], *_worker["grid"], vectorized=_worker["vectorized"])
+    result["path"] = index
+    return result
+
+
+class MonteCarlo:
+    """
+        Runs a GridStrategy backtest on every path of a path generator on a process pool.
+
+        Workers get the path generator once when they start and generate the paths themselves, only path indices are
+        sent with each task and only the result rows are sent back. With vectorized=True the backtests are computed
+        by VectorizedGridBacktest.
+    """
+
+    def __init__(self, generator: PathGenerator, market: Market, balances: dict, max_workers: int = None, vectorized: bool = False) -> None:
+        self.generator = generator
+        self.market = market
+        self.balances = balances
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.vectorized = vectorized
+
+    @property
+    def initial_equity(self) -> float:
+        """Equity of the initial balances at the start price of the paths"""
+        return self.balances.get(self.market.quote_currency, 0) + self.balances.get(self.market.base_currency, 0) * self.generator.start_price
+
+    def run(self, upper_price: float, lower_price: float, price_step: float, num_paths: int):
+        """Backtests the grid on num_paths paths, returns a dataframe with one result row per path"""
+        import pandas
+
+        logging.info(str.format("Simulating {} paths on {} processes", num_paths, self.max_workers))
+        chunksize = max(1, num_paths // (self.max_workers * 4))
+        with ProcessPoolExecutor(self.max_workers, initializer=_init_worker,
+                                 initargs=(self.generator, self.market, self.balances, (upper_price, lower_price, price_step), self.vectorized)) as executor:
+            rows = list(executor.map(_run_worker, range(num_paths), chunksize=chunksize))
+
+        return pandas.DataFrame(rows, columns=["path"] + RESULT_COLUMNS)
+
+    def summary(self, results, ruin_drawdown: float = 0.5, percentiles: tuple = (5, 25, 50, 75, 95)) -> dict:
+        """
+            Returns the distribution of the results: percentiles of final equity and max drawdown, the probability
+            of a loss and the probability of ruin, a drawdown of at least ruin_drawdown on the way.
+        """
+        final_equity = results["final_equity"].to_numpy()
+        drawdowns = results["max_drawdown"].to_numpy()
+        result = {"paths": len(results), "initial_equity": self.initial_equity}
+        if len(results) == 0:
+            return result
+        for p, value in zip(percentiles, numpy.percentile(final_equity, percentiles)):
+            result["final_equity_p" + str(p)] = float(value)
+        for p, value in zip(percentiles, numpy.percentile(drawdowns, percentiles)):
+            result["max_drawdown_p" + str(p)] = float(value)
+        result["mean_return"] = float(numpy.mean(final_equity) / self.initial_equity - 1)
+        result["probability_of_loss"] = float(numpy.mean(final_equity < self.initial_equity))
+        result["probability_of_ruin"] = float(numpy.mean(drawdowns >= ruin_drawdown))
+        return result
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+import heapq
+import logging
+import string
+
+from CandleStore import CandleStore
+from Market import Market
+from PriceProvider import PriceProvider
+from PriceTape import PriceTape
+from SimulatedBroker import SimulatedBroker
+
+logger = logging.getLogger(__name__)
+
+
+class MultiMarketBacktestingPriceProvider(PriceProvider):
+    """
+        Backtesting price provider for several markets that share one broker and wallet.
+
+        The candles of all markets are merged into one stream ordered by candle time with a k-way merge over the
+        per-market price tapes, candles with the same time are replayed in the order of the markets. Every candle is
+        replayed like BacktestingPriceProvider does, price events are sent to the listeners of the candle's market
+        and the broker fills the orders of that market's order book.
+    """
+
+    def __init__(self, exchange, markets: list[Market], broker: SimulatedBroker, timeframe: string, start_date: datetime, end_date: datetime, candle_store: CandleStore = None, exchange_id: string = None, candles: dict = None) -> None:
+        """candles optionally maps every market to its preloaded candle columns, otherwise they are loaded from candle_store"""
+        super().__init__(exchange)
+        self.markets = list(markets)
+        self.broker = broker
+        self.timeframe = timeframe
+        self.start_date = start_date
+        self.end_date = end_date
+
+        if candles is None:
+            if candle_store is None:
+                raise ValueError("Either candles or a candle store is required")
+            start = int(start_date.timestamp() * 1000)
+            end = int(end_date.timestamp() * 1000)
+            candles = {market: candle_store.get_candles(exchange, market, timeframe, start, end, exchange_id) for market in self.markets}
+        self.candles = candles
+
+        # initialise current prices with the first open of every market
+        self.current_prices: dict[Market, float] = {}
+        for market in self.markets:
+            market_candles = self.candles[market]
+            self.current_prices[market] = float(market_candles["open"][0]) if len(market_candles["date"]) > 0 else 0
+
+    def getCurrentPrice(self, pair: Market) -> float:
+        return float(self.current_prices[pair])
+
+    def updatePriceListenersWithBacktestingData(self, market: Market, price, timestamp):
+        self.current_prices[market] = price
+        for cl in self.listeners.get(market, []):
+            cl.onPriceChanged(market, price, timestamp)
+
+    @staticmethod
+    def _candle_times(market_index: int, tape: PriceTape):
+        for candle_index, timestamp in enumerate(tape.timestamps.tolist()):
+            yield timestamp, market_index, candle_index
+
+    def run(self):
+        logger.info("Backtesting started")
+        tapes = []
+        for market in self.markets:
+            c = self.candles[market]
+            tapes.append(PriceTape(c["date"], c["open"], c["high"], c["low"], c["close"]))
+
+        # lazily merge the candle times of all markets, ties are broken by market order
+        stream = heapq.merge(*[MultiMarketBacktestingPriceProvider._candle_times(i, tape) for i, tape in enumerate(tapes)])
+
+        simulate_price_movement = self.simulate_price_movement
+        candle_listeners = self.candle_listeners
+        for timestamp, market_index, candle_index in stream:
+            market = self.markets[market_index]
+            p0, p1, p2, p3 = tapes[market_index].prices[candle_index].tolist()
+            time = datetime.fromtimestamp(timestamp / 1000, timezone.utc)
+            simulate_price_movement(market, p0, p1, time)
+            simulate_price_movement(market, p1, p2, time)
+            simulate_price_movement(market, p2, p3, time)
+            for listener in candle_listeners:
+                listener.onCandle(market, time, p0, max(p1, p2), min(p1, p2), p3)
+
+        logger.info("Backtesting complete")
+
+    def simulate_price_movement(self, market: Market, a: float, b: float, timestamp) -> None:
+        """Simulates the price of market moving from a to b, same as BacktestingPriceProvider.simulate_price_movement"""
+        self.updatePriceListenersWithBacktestingData(market, a, timestamp)
+
+        next_fill_price = self.broker.next_fill_price
+        price = next_fill_price(market, a, b)
+        while price is not None:
+            self.updatePriceListenersWithBacktestingData(market, price, timestamp)
+            price = next_fill_price(market, price, b)
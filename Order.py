@@ -5,6 +5,9 @@ import math
 from Market import Market
 
 class Order:
+
+    __slots__ = ("id", "market", "qty", "side", "type", "limit_price", "closes", "creation_time", "fills",
+                 "_qty_filled", "_fill_price", "_fee", "_last_fill")
     
     class Side(Enum):
         BUY = 1
@@ -30,23 +33,38 @@ class Order:
         
         self.fills = []
 
+        # running totals of the fills
+        self._qty_filled: float = 0
+        self._fill_price: float = 0
+        self._fee: float = 0
+        self._last_fill = None
+
+    def add_fill(self, fill) -> None:
+        """Adds a fill to the order and updates the running totals"""
+        self.fills.append(fill)
+        self._qty_filled += fill.qty
+        self._fill_price += fill.qty / self.qty * fill.price
+        self._fee += fill.fee
+        if self._last_fill is None or self._last_fill.timestamp is None:
+            self._last_fill = fill
+        elif fill.timestamp is not None and fill.timestamp.timestamp() > self._last_fill.timestamp.timestamp():
+            self._last_fill = fill
+
     def qty_filled(self) -> float:
-        result: float = 0
-        for fill in self.fills:
-            result += fill.qty
-        return result
+        return self._qty_filled
     
     def is_filled(self) -> bool:
-        return math.isclose(self.qty, self.qty_filled())
+        return math.isclose(self.qty, self._qty_filled)
     
     def get_filled_timestamp(self):
-        return max(self.fills, key=lambda fill: fill.timestamp.timestamp()).timestamp
+        return self._last_fill.timestamp
 
     def fill_price(self):
-        result = 0
-        for fill in self.fills:
-            result += fill.qty / self.qty * fill.price
-        return result
+        """Volume weighted average price of the fills"""
+        return self._fill_price
+
+    def fee(self) -> float:
+        return self._fee
 
     def __str__(self) -> str:
         #return "[id: " + str(self.id) + ", market: " + str(self.market) + ", qty: " + str(self.qty) + ", side: " + str(self.side) + ", type: " + str(self.type) + ", limit: " + str(self.limit_price) + "]"
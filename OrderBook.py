@@ -0,0 +1,129 @@
+import bisect
+
+from Order import Order
+
+
+class OrderBook:
+    """
+        Open orders of a single market.
+
+        Buy limit orders are kept sorted by descending limit price and sell limit orders by ascending limit price,
+        so the orders crossed by a price are always a prefix of one of the two sides. All orders are also indexed by id.
+    """
+
+    def __init__(self) -> None:
+        self.orders: dict[int, Order] = {}
+        self._market_orders: list[Order] = []
+        # sort keys (-limit_price, id) for buy orders and (limit_price, id) for sell orders
+        self._buy_keys: list[tuple[float, int]] = []
+        self._sell_keys: list[tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(self.orders.values())
+
+    def add(self, order: Order) -> None:
+        self.orders[order.id] = order
+        if order.type == Order.Type.MARKET:
+            self._market_orders.append(order)
+        elif order.type == Order.Type.LIMIT:
+            if order.side == Order.Side.BUY:
+                bisect.insort(self._buy_keys, (-order.limit_price, order.id))
+            else:
+                bisect.insort(self._sell_keys, (order.limit_price, order.id))
+
+    def remove(self, order_id: int) -> Order:
+        """Removes an order from the book, returns None if the order is not in the book"""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+
+        if order.type == Order.Type.MARKET:
+            self._market_orders.remove(order)
+        elif order.type == Order.Type.LIMIT:
+            if order.side == Order.Side.BUY:
+                keys, key = self._buy_keys, (-order.limit_price, order.id)
+            else:
+                keys, key = self._sell_keys, (order.limit_price, order.id)
+            del keys[bisect.bisect_left(keys, key)]
+        return order
+
+    def best_buy_price(self) -> float:
+        """Returns the highest buy limit price, None if there are no buy limit orders"""
+        return -self._buy_keys[0][0] if self._buy_keys else None
+
+    def best_sell_price(self) -> float:
+        """Returns the lowest sell limit price, None if there are no sell limit orders"""
+        return self._sell_keys[0][0] if self._sell_keys else None
+
+    def has_market_orders(self) -> bool:
+        return len(self._market_orders) > 0
+
+    def _num_buys_crossed(self, price: float) -> int:
+        # buy orders with limit price >= price
+        return bisect.bisect_right(self._buy_keys, (-price, float("inf")))
+
+    def _num_sells_crossed(self, price: float) -> int:
+        # sell orders with limit price <= price
+        return bisect.bisect_right(self._sell_keys, (price, float("inf")))
+
+    def next_fill_price(self, price: float, target: float) -> float:
+        """
+            Returns the price of the next fill when the price moves from price towards target, None if no order is filled.
+            That is the nearest limit price crossed on the way to target, or the limit price of an order that is already
+            crossed at the current price. Open market orders are filled at the current price.
+        """
+        candidates = []
+        if target < price:
+            # falling price crosses buy orders, the highest one first
+            num_buys = self._num_buys_crossed(target)
+            if num_buys > 0:
+                candidates.append(-self._buy_keys[0][0])
+            num_sells = self._num_sells_crossed(price)
+            if num_sells > 0:
+                candidates.append(self._sell_keys[num_sells - 1][0])
+            result = max(candidates) if candidates else None
+        else:
+            # rising price crosses sell orders, the lowest one first
+            num_sells = self._num_sells_crossed(target)
+            if num_sells > 0:
+                candidates.append(self._sell_keys[0][0])
+            num_buys = self._num_buys_crossed(price)
+            if num_buys > 0:
+                candidates.append(-self._buy_keys[num_buys - 1][0])
+            result = min(candidates) if candidates else None
+
+        if result is None and self._market_orders:
+            result = price
+        return result
+
+    def crossing(self, min_price: float, max_price: float) -> list[Order]:
+        """Returns all orders that would be filled when the price moves within [min_price, max_price], sorted by id"""
+        ids = [key[1] for key in self._buy_keys[:self._num_buys_crossed(min_price)]]
+        ids += [key[1] for key in self._sell_keys[:self._num_sells_crossed(max_price)]]
+        result = self._market_orders + [self.orders[order_id] for order_id in ids]
+        result.sort(key=lambda order: order.id)
+        return result
+
+    def pop_crossing(self, price: float) -> list[Order]:
+        """Removes and returns all orders that are filled at the given price, sorted by id"""
+        num_buys = self._num_buys_crossed(price)
+        num_sells = self._num_sells_crossed(price)
+        if num_buys == 0 and num_sells == 0 and not self._market_orders:
+            return []
+
+        ids = [key[1] for key in self._buy_keys[:num_buys]]
+        ids += [key[1] for key in self._sell_keys[:num_sells]]
+        del self._buy_keys[:num_buys]
+        del self._sell_keys[:num_sells]
+
+        result = self._market_orders
+        self._market_orders = []
+        for order in result:
+            del self.orders[order.id]
+        for order_id in ids:
+            result.append(self.orders.pop(order_id))
+        result.sort(key=lambda order: order.id)
+        return result
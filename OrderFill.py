@@ -4,6 +4,8 @@ from Order import Order
 
 class OrderFill:
 
+    __slots__ = ("qty", "price", "fee", "timestamp")
+
     def __init__(self, qty, price, fee: float, timestamp: datetime) -> None:
         self.qty = qty
         self.price = price
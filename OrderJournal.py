@@ -0,0 +1,191 @@
+from datetime import datetime
+import json
+import os
+
+import numpy
+
+from Market import Market
+from Order import Order
+
+# one fixed size record per filled order
+RECORD_DTYPE = numpy.dtype([
+    ("id", numpy.int64),
+    ("market", numpy.uint16),       # index into the markets sidecar file
+    ("side", numpy.uint8),          # Order.Side value
+    ("type", numpy.uint8),          # Order.Type value
+    ("qty", numpy.float64),
+    ("limit_price", numpy.float64),
+    ("fill_price", numpy.float64),
+    ("fee", numpy.float64),
+    ("created", numpy.int64),       # ms, -1 if unknown
+    ("filled", numpy.int64),        # ms of the last fill, -1 if unknown
+    ("closes", numpy.int64),        # id of the closed order, -1 if none
+    ("closes_value", numpy.float64),  # qty * fill price of the closed order when this order was filled
+])
+
+
+def _to_ms(timestamp) -> int:
+    if timestamp is None:
+        return -1
+    if isinstance(timestamp, datetime):
+        return int(round(timestamp.timestamp() * 1000))
+    return int(timestamp)
+
+
+def record_values(order: Order, market_index: int) -> tuple:
+    """Returns the RECORD_DTYPE field values of a filled order"""
+    if order.closes is None:
+        closes, closes_value = -1, 0
+    else:
+        closes, closes_value = order.closes.id, order.closes.qty * order.closes.fill_price()
+    filled = _to_ms(order.get_filled_timestamp()) if order.fills else -1
+    return (order.id, market_index, order.side.value, order.type.value, order.qty, order.limit_price, order.fill_price(),
+            order.fee(), _to_ms(order.creation_time), filled, closes, closes_value)
+
+
+class OrderJournal:
+    """
+        Append-only on-disk journal of filled orders.
+
+        Every filled order is written as one fixed size binary record (RECORD_DTYPE), the markets are
+        stored in a small json sidecar file next to the journal. Records are buffered in memory and written
+        in blocks, read() maps the file into memory so the journal can be read back without loading it.
+    """
+
+    def __init__(self, path: str, mode: str = "w", buffer_size: int = 4096) -> None:
+        """mode "w" starts a new journal, "a" appends to an existing one and "r" opens it read only"""
+        if mode not in ("w", "a", "r"):
+            raise ValueError("Unsupported journal mode: " + mode)
+
+        self.path = path
+        self.mode = mode
+        self._markets_path = path + ".markets.json"
+        self._buffer = numpy.zeros(buffer_size, dtype=RECORD_DTYPE)
+        self._buffered = 0
+        # set on unpickled journals: the records are still in the journal of the pickled run, which is never modified
+        self._copy_on_write = False
+
+        if mode == "w":
+            open(self.path, "wb").close()
+            self._markets: list[str] = []
+            self._write_markets()
+        else:
+            if not os.path.exists(self.path):
+                if mode == "r":
+                    raise FileNotFoundError(self.path)
+                open(self.path, "wb").close()
+            self._markets = []
+            if os.path.exists(self._markets_path):
+                with open(self._markets_path) as f:
+                    self._markets = json.load(f)
+        self._market_index = {name: i for i, name in enumerate(self._markets)}
+        self._written = os.path.getsize(self.path) // RECORD_DTYPE.itemsize
+
+    def __len__(self) -> int:
+        return self._written + self._buffered
+
+    def __getstate__(self) -> dict:
+        # buffered records are written first, the pickled journal refers to the records on disk
+        self.flush()
+        state = dict(self.__dict__)
+        state["_buffer"] = len(self._buffer)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._buffer = numpy.zeros(state["_buffer"], dtype=RECORD_DTYPE)
+        # the first _written records of path are the records of the pickled journal, they are copied to a new journal
+        # before anything is written (resume), path itself is left as it is
+        self._copy_on_write = self.mode != "r"
+
+    def resume(self, path: str) -> None:
+        """Continues an unpickled journal in a new journal at path, starting with a copy of the pickled records"""
+        if not self._copy_on_write:
+            raise ValueError("Only an unpickled journal can be resumed: " + self.path)
+        if os.path.abspath(path) == os.path.abspath(self.path):
+            raise ValueError("Resuming would overwrite the journal of the checkpointed run: " + path)
+
+        tmp_file = path + ".tmp"
+        with open(self.path, "rb") as source, open(tmp_file, "wb") as target:
+            remaining = self._written * RECORD_DTYPE.itemsize
+            while remaining > 0:
+                data = source.read(min(remaining, 1 << 20))
+                if not data:
+                    raise ValueError("Journal is shorter than when it was pickled: " + self.path)
+                target.write(data)
+                remaining -= len(data)
+        os.replace(tmp_file, path)
+
+        self.path = path
+        self._markets_path = path + ".markets.json"
+        self._copy_on_write = False
+        self._write_markets()
+
+    def _default_resume_path(self) -> str:
+        i = 1
+        while os.path.exists(self.path + ".resumed" + str(i)):
+            i += 1
+        return self.path + ".resumed" + str(i)
+
+    def __enter__(self) -> "OrderJournal":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _write_markets(self) -> None:
+        if self._copy_on_write:
+            self.resume(self._default_resume_path())
+        tmp_file = self._markets_path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self._markets, f)
+        os.replace(tmp_file, self._markets_path)
+
+    def _get_market_index(self, market: Market) -> int:
+        name = market.get_market()
+        index = self._market_index.get(name)
+        if index is None:
+            index = len(self._markets)
+            self._markets.append(name)
+            self._market_index[name] = index
+            self._write_markets()
+        return index
+
+    def append(self, order: Order) -> None:
+        """Adds a filled order to the journal"""
+        if self.mode == "r":
+            raise ValueError("Journal is opened read only: " + self.path)
+
+        self._buffer[self._buffered] = record_values(order, self._get_market_index(order.market))
+        self._buffered += 1
+        if self._buffered == len(self._buffer):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all buffered records to disk"""
+        if self._buffered == 0:
+            return
+        if self._copy_on_write:
+            self.resume(self._default_resume_path())
+        with open(self.path, "ab") as f:
+            f.write(self._buffer[:self._buffered].tobytes())
+        self._written += self._buffered
+        self._buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+
+    def markets(self) -> list[Market]:
+        """Returns the markets of the journal, the market field of a record is an index into this list"""
+        result = []
+        for name in self._markets:
+            parts = name.split("/")
+            result.append(Market(parts[0], parts[1] if len(parts) > 1 else None))
+        return result
+
+    def read(self) -> numpy.ndarray:
+        """Returns all records as a read only memory mapped structured array"""
+        self.flush()
+        if self._written == 0:
+            return numpy.zeros(0, dtype=RECORD_DTYPE)
+        return numpy.memmap(self.path, dtype=RECORD_DTYPE, mode="r", shape=(self._written,))
@@ -0,0 +1,73 @@
+import numpy
+
+from Market import Market
+from Order import Order
+from OrderJournal import RECORD_DTYPE, record_values
+
+
+class OrderStore:
+    """
+        In-memory struct-of-arrays store of filled orders.
+
+        Every field of RECORD_DTYPE is kept in its own numpy array, one row per order, which needs a fraction of the
+        memory of Order objects. The store has the same append/read interface as OrderJournal, so it can be passed to
+        SimulatedBroker as journal, together with a small max_filled_orders window.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.columns: dict[str, numpy.ndarray] = {
+            name: numpy.zeros(max(1, capacity), dtype=RECORD_DTYPE.fields[name][0]) for name in RECORD_DTYPE.names
+        }
+        self._size = 0
+        self._markets: list[Market] = []
+        self._market_index: dict[str, int] = {}
+        self._rows: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self) -> None:
+        for name, values in self.columns.items():
+            self.columns[name] = numpy.concatenate([values, numpy.zeros_like(values)])
+
+    def _get_market_index(self, market: Market) -> int:
+        name = market.get_market()
+        index = self._market_index.get(name)
+        if index is None:
+            index = len(self._markets)
+            self._markets.append(market)
+            self._market_index[name] = index
+        return index
+
+    def append(self, order: Order) -> None:
+        """Adds a filled order to the store"""
+        if self._size == len(self.columns["id"]):
+            self._grow()
+
+        row = self._size
+        for name, value in zip(RECORD_DTYPE.names, record_values(order, self._get_market_index(order.market))):
+            self.columns[name][row] = value
+        self._rows[order.id] = row
+        self._size += 1
+
+    def column(self, name: str) -> numpy.ndarray:
+        """Returns a view of one field of all stored orders"""
+        return self.columns[name][:self._size]
+
+    def row(self, order_id: int) -> int:
+        """Returns the row of an order, None if the order is not in the store"""
+        return self._rows.get(order_id)
+
+    def markets(self) -> list[Market]:
+        """Returns the markets of the store, the market field of a row is an index into this list"""
+        return list(self._markets)
+
+    def read(self) -> numpy.ndarray:
+        """Returns all orders as a structured array with the same layout as OrderJournal.read()"""
+        result = numpy.zeros(self._size, dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            result[name] = self.column(name)
+        return result
+
+    def close(self) -> None:
+        pass
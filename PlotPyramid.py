@@ -0,0 +1,150 @@
+import numpy
+
+from Order import Order
+
+# aggregation of a column over the rows of a bucket, min and max ignore NaN
+_AGGREGATIONS = {
+    "min": numpy.fmin.reduceat,
+    "max": numpy.fmax.reduceat,
+    "sum": numpy.add.reduceat,
+}
+
+CANDLE_AGGREGATIONS = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+ENVELOPE_AGGREGATIONS = {"min": "min", "max": "max", "last": "last"}
+FILL_AGGREGATIONS = {"buy_price": "min", "sell_price": "max", "buys": "sum", "sells": "sum", "cumulative_profit": "last"}
+
+
+class Pyramid:
+    """
+        Multi-resolution aggregates of a time series, for plotting.
+
+        Level 0 is the series itself, the column arrays are kept as given (e.g. memory mapped candles) and never
+        copied. Level k > 0 aggregates the rows of level k - 1 in time buckets of bucket_ms * factor^(k - 1),
+        aligned to the epoch, so the buckets of all pyramids with the same bucket_ms and factor line up. Every
+        level is a fraction 1/factor of the level below, all levels together are smaller than the series.
+        query() returns the rows of one level within a time range as views.
+    """
+
+    def __init__(self, columns: dict, aggregations: dict, bucket_ms: int, factor: int = 4, min_rows: int = 1000, num_levels: int = None, time_column: str = "time") -> None:
+        """
+            aggregations maps every column except time_column to first, last, min, max or sum. Levels are added until
+            a level has at most min_rows rows, or until there are num_levels levels if given.
+        """
+        if factor < 2 or bucket_ms <= 0:
+            raise ValueError("factor must be at least 2 and bucket_ms positive")
+        self.aggregations = aggregations
+        self.bucket_ms = bucket_ms
+        self.factor = factor
+        self.time_column = time_column
+        self.levels: list[dict] = [columns]
+        while (len(self.levels) < num_levels) if num_levels is not None else (len(self.levels[-1][time_column]) > min_rows):
+            self.levels.append(self._aggregate(self.levels[-1], self.bucket_width(len(self.levels))))
+
+    def bucket_width(self, level: int) -> int:
+        """Returns the bucket width of a level in ms, None for level 0"""
+        return None if level == 0 else self.bucket_ms * self.factor ** (level - 1)
+
+    def _aggregate(self, rows: dict, width: int) -> dict:
+        times = numpy.asarray(rows[self.time_column], dtype=numpy.int64)
+        buckets = times // width
+        starts = numpy.flatnonzero(numpy.diff(buckets, prepend=buckets[:1] - 1)) if len(times) > 0 else numpy.empty(0, dtype=numpy.int64)
+        ends = numpy.append(starts[1:], len(times)) - 1
+
+        result = {self.time_column: buckets[starts] * width}
+        for column, aggregation in self.aggregations.items():
+            values = numpy.asarray(rows[column])
+            if aggregation == "first":
+                result[column] = values[starts]
+            elif aggregation == "last":
+                result[column] = values[ends]
+            elif len(starts) == 0:
+                result[column] = values[:0].copy()
+            else:
+                result[column] = _AGGREGATIONS[aggregation](values, starts)
+        return result
+
+    def _range(self, level: int, start: int, end: int) -> tuple[int, int]:
+        # the bucket containing start and all buckets starting up to end
+        times = self.levels[level][self.time_column]
+        first = max(0, int(numpy.searchsorted(times, start, side="right")) - 1)
+        last = int(numpy.searchsorted(times, end, side="right"))
+        return first, max(first, last)
+
+    def count(self, level: int, start: int, end: int) -> int:
+        """Returns the number of rows of a level in the time range [start, end] (ms)"""
+        first, last = self._range(level, start, end)
+        return last - first
+
+    def level_for(self, start: int, end: int, max_rows: int) -> int:
+        """Returns the finest level with at most max_rows rows in [start, end], the coarsest level if there is none"""
+        for level in range(len(self.levels)):
+            if self.count(level, start, end) <= max_rows:
+                return level
+        return len(self.levels) - 1
+
+    def query(self, level: int, start: int, end: int) -> dict:
+        """Returns views of the rows of a level in the time range [start, end] (ms)"""
+        first, last = self._range(level, start, end)
+        return {column: values[first:last] for column, values in self.levels[level].items()}
+
+
+class ReportPyramid:
+    """
+        Candles, equity envelope and fill density of a backtest report at the resolution of a visible time range.
+
+        The candles, the equity samples and the fills each get a Pyramid with the same buckets, so the rows of a
+        level line up in time. Candles are aggregated to OHLCV, the equity to its min, max and last value per bucket,
+        fills to the number of buys and sells per bucket with the lowest buy and highest sell price. view() serves
+        the level with at most max_rows candles in the visible range, for the visible range and half of it on
+        either side, so panning does not need new data right away.
+    """
+
+    def __init__(self, candles: dict, equity: dict, ledger: dict, timeframe_ms: int = None, factor: int = 4, max_rows: int = 1000) -> None:
+        """candles are candle store columns, equity has the columns time and equity, ledger is a BacktestReport ledger"""
+        dates = candles["date"]
+        if timeframe_ms is None:
+            timeframe_ms = int(dates[1] - dates[0]) if len(dates) > 1 else 60000
+        self.max_rows = max_rows
+        self.start = int(dates[0]) if len(dates) > 0 else 0
+        self.end = int(dates[-1]) if len(dates) > 0 else 0
+
+        self.candles = Pyramid(candles, CANDLE_AGGREGATIONS, timeframe_ms * factor, factor, max_rows, time_column="date")
+        num_levels = len(self.candles.levels)
+
+        values = numpy.asarray(equity["equity"], dtype=numpy.float64)
+        self.equity = Pyramid({"time": equity["time"], "min": values, "max": values, "last": values}, ENVELOPE_AGGREGATIONS, timeframe_ms * factor, factor, num_levels=num_levels)
+
+        buys = ledger["side"] == Order.Side.BUY.value
+        fills = {
+            "time": ledger["filled"],
+            "buy_price": numpy.where(buys, ledger["limit_price"], numpy.nan),
+            "sell_price": numpy.where(buys, numpy.nan, ledger["limit_price"]),
+            "buys": buys.astype(numpy.int64),
+            "sells": (~buys).astype(numpy.int64),
+            "cumulative_profit": ledger["cumulative_profit"],
+        }
+        self.fills = Pyramid(fills, FILL_AGGREGATIONS, timeframe_ms * factor, factor, num_levels=num_levels)
+
+        # level and time range of the last view
+        self.level = None
+        self.window = None
+
+    def view(self, start: int, end: int) -> dict:
+        """
+            Returns the level and the candle, equity and fill rows for the visible range [start, end] (ms), None if the
+            last returned view has the right level and covers the range.
+        """
+        level = self.candles.level_for(start, end, self.max_rows)
+        if level == self.level and self.window[0] <= max(start, self.start) and min(end, self.end) <= self.window[1]:
+            return None
+
+        margin = (end - start) // 2
+        self.level = level
+        self.window = (start - margin, end + margin)
+        return {
+            "level": level,
+            "bucket_ms": self.candles.bucket_width(level),
+            "candles": self.candles.query(level, *self.window),
+            "equity": self.equity.query(level, *self.window),
+            "fills": self.fills.query(level, *self.window),
+        }
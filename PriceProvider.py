@@ -8,13 +8,24 @@ class PriceListener(ABC):
     def onPriceChanged(self, pair: Market, price: float, timestamp = None):
         pass
 
+class CandleListener(ABC):
+
+    @abstractmethod
+    def onCandle(self, pair: Market, timestamp, open: float, high: float, low: float, close: float):
+        """Called after all price events of a candle"""
+        pass
+
 class PriceProvider:
 
     def __init__(self, exchange) -> None:
         super().__init__()
         self.listeners = {}
+        self.candle_listeners: list[CandleListener] = []
         self.exchange = exchange
 
+    def addCandleListener(self, listener: CandleListener):
+        self.candle_listeners.append(listener)
+
     def addListener(self, listener: PriceListener, market: Market):
         if not market in self.listeners:
             self.listeners[market] = [listener]
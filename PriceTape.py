@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+import numpy
+
+
+class PriceTape:
+    """
+        Precomputed price path of a candle series for backtesting.
+
+        Every candle is replayed as four price points: open->low->high->close for green candles and
+        open->high->low->close for red candles. The points are computed once for the whole series and
+        stored as a flat array, so replaying does not need to touch any pandas objects.
+    """
+
+    POINTS_PER_CANDLE = 4
+
+    def __init__(self, timestamps: numpy.ndarray, open: numpy.ndarray, high: numpy.ndarray, low: numpy.ndarray, close: numpy.ndarray) -> None:
+        """timestamps are the candle open times in ms, the price arrays hold one value per candle"""
+        green = close > open
+        self.timestamps = numpy.asarray(timestamps, dtype=numpy.int64)
+        self.prices = numpy.empty((len(self.timestamps), PriceTape.POINTS_PER_CANDLE), dtype=numpy.float64)
+        self.prices[:, 0] = open
+        self.prices[:, 1] = numpy.where(green, low, high)
+        self.prices[:, 2] = numpy.where(green, high, low)
+        self.prices[:, 3] = close
+
+    @staticmethod
+    def from_candles(candles) -> "PriceTape":
+        """Creates the price tape from a candle dataframe indexed by date"""
+        import pandas
+        timestamps = pandas.DatetimeIndex(candles.index).asi8 // 1000000
+        return PriceTape(timestamps, candles["open"].to_numpy(), candles["high"].to_numpy(), candles["low"].to_numpy(), candles["close"].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def datetimes(self) -> list[datetime]:
+        """Returns the candle open times as timezone aware datetimes"""
+        return [datetime.fromtimestamp(t / 1000, timezone.utc) for t in self.timestamps.tolist()]
@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+        Thread-safe token bucket.
+
+        Tokens are added at rate per second up to capacity, acquire() takes one token and blocks until it is
+        available. A bucket with capacity n allows bursts of n requests, on average requests never exceed rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, clock=time.monotonic, sleep=time.sleep) -> None:
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def for_exchange(exchange, capacity: float = 1) -> "RateLimiter":
+        """Returns a rate limiter for the rateLimit (ms between requests) of a ccxt exchange, None if it has no limit"""
+        rate_limit = getattr(exchange, "rateLimit", None)
+        if not rate_limit:
+            return None
+        return RateLimiter(1000 / rate_limit, capacity)
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available, returns False otherwise"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """Takes a token, waits until it is available"""
+        # the token is reserved immediately, the bucket goes negative and later callers queue behind this one
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            self.sleep(wait)
@@ -0,0 +1,86 @@
+import numpy
+import pandas
+
+from BacktestReport import BacktestReport
+from PlotPyramid import ReportPyramid
+
+
+def _times(ms: numpy.ndarray) -> pandas.Series:
+    return pandas.Series(pandas.to_datetime(numpy.asarray(ms), unit="ms", utc=True))
+
+
+def _frames(view: dict) -> dict:
+    """Dataframes of a ReportPyramid view in the column layout of finplot, first column is the time"""
+    candles, equity, fills = view["candles"], view["equity"], view["fills"]
+    buys = fills["buys"] > 0
+    sells = fills["sells"] > 0
+    return {
+        "candles": pandas.DataFrame({"time": _times(candles["date"]), "open": candles["open"], "close": candles["close"], "high": candles["high"], "low": candles["low"]}),
+        "equity_min": pandas.DataFrame({"time": _times(equity["time"]), "equity": equity["min"]}),
+        "equity_max": pandas.DataFrame({"time": _times(equity["time"]), "equity": equity["max"]}),
+        "buys": pandas.DataFrame({"time": _times(fills["time"][buys]), "price": fills["buy_price"][buys]}),
+        "sells": pandas.DataFrame({"time": _times(fills["time"][sells]), "price": fills["sell_price"][sells]}),
+        "profit": pandas.DataFrame({"time": _times(fills["time"]), "cumulative_profit": fills["cumulative_profit"]}),
+    }
+
+
+def plot_report(report: BacktestReport, candles: dict, title: str, grid_lines: list[float] = None, max_rows: int = 1000) -> None:
+    """
+        Shows the candles with grid lines and fills, the equity curve and the cumulative profit in a finplot window.
+
+        candles are candle store columns, e.g. memory mapped from the candle store. The window only ever holds the
+        data of a ReportPyramid view: at most about 2 * max_rows aggregated candles, the min/max envelope of the
+        equity and the fills per candle bucket. Zooming and panning replace it with the view of the new range.
+    """
+    # finplot needs a GUI toolkit, only import it when a window is requested
+    import finplot
+    import pyqtgraph
+
+    pyramid = ReportPyramid(candles, report.equity, report.ledger, max_rows=max_rows)
+    view = pyramid.view(pyramid.start, pyramid.end)
+    frames = _frames(view)
+    shown = {"times": view["candles"]["date"], "updating": False}
+
+    ax, ax2, ax3 = finplot.create_plot(title, rows=3)
+    items = {"candles": finplot.candlestick_ochl(frames["candles"], ax=ax)}
+
+    # grid lines do not depend on the x axis, they stay in place when the data is replaced
+    for gridline in grid_lines or []:
+        ax.addItem(pyqtgraph.InfiniteLine(pos=gridline, angle=0, pen="#080808"))
+
+    # fills, one marker per candle bucket with buys or sells
+    for name, style, color, legend in [("buys", ">", "#007700", "buy order filled"), ("sells", "<", "#770000", "sell order filled")]:
+        datasrc = finplot._create_datasrc(ax, frames[name])
+        datasrc.standalone = True
+        items[name] = finplot.plot(datasrc, style=style, width=2, color=color, legend=legend)
+
+    # equity envelope, both lines are the equity curve when a bucket is a single candle
+    items["equity_min"] = finplot.plot(frames["equity_min"], ax=ax2, legend="equity")
+    items["equity_max"] = finplot.plot(frames["equity_max"], ax=ax2)
+
+    # cumulative profit, last value per bucket
+    items["profit"] = finplot.plot(frames["profit"], ax=ax3, legend="cumulative profit")
+
+    def on_range_changed(viewbox, x_range) -> None:
+        if shown["updating"] or len(shown["times"]) == 0:
+            return
+        # the x axis is the index of the shown candles
+        times = shown["times"]
+        first = int(times[int(numpy.clip(numpy.floor(x_range[0]), 0, len(times) - 1))])
+        last = int(times[int(numpy.clip(numpy.ceil(x_range[1]), 0, len(times) - 1))])
+        view = pyramid.view(first, last)
+        if view is None:
+            return
+
+        shown["updating"] = True
+        try:
+            for name, frame in _frames(view).items():
+                items[name].update_data(frame)
+            shown["times"] = view["candles"]["date"]
+            # same visible time range on the new index
+            finplot.set_x_pos(pandas.Timestamp(first, unit="ms", tz="UTC"), pandas.Timestamp(last, unit="ms", tz="UTC"), ax=ax)
+        finally:
+            shown["updating"] = False
+
+    ax.vb.sigXRangeChanged.connect(on_range_changed)
+    finplot.show()
@@ -0,0 +1,229 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy
+
+from OrderJournal import RECORD_DTYPE
+
+# result metrics stored as columns of the runs table, they can be filtered and sorted on
+METRICS = ["final_equity", "start_equity", "profit", "fills", "round_trips", "win_rate", "max_drawdown", "volatility", "sharpe_ratio", "sortino_ratio", "exposure"]
+
+RUN_COLUMNS = ["id", "created", "market", "timeframe", "start_time", "end_time", "upper_price", "lower_price", "price_step"] + METRICS + ["parameters"]
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        created REAL NOT NULL,
+        market TEXT,
+        timeframe TEXT,
+        start_time INTEGER,
+        end_time INTEGER,
+        upper_price REAL,
+        lower_price REAL,
+        price_step REAL,
+        """ + ",\n        ".join(metric + " REAL" for metric in METRICS) + """,
+        parameters TEXT
+    );
+    CREATE INDEX IF NOT EXISTS runs_period ON runs (start_time, end_time);
+    CREATE INDEX IF NOT EXISTS runs_sharpe_ratio ON runs (sharpe_ratio);
+    CREATE INDEX IF NOT EXISTS runs_final_equity ON runs (final_equity);
+    CREATE TABLE IF NOT EXISTS fills (
+        run_id INTEGER NOT NULL REFERENCES runs (id),
+        """ + ",\n        ".join(name + (" REAL" if RECORD_DTYPE[name].kind == "f" else " INTEGER") for name in RECORD_DTYPE.names) + """
+    );
+    CREATE INDEX IF NOT EXISTS fills_run ON fills (run_id);
+    CREATE TABLE IF NOT EXISTS equity (
+        run_id INTEGER NOT NULL REFERENCES runs (id),
+        time INTEGER,
+        equity REAL
+    );
+    CREATE INDEX IF NOT EXISTS equity_run ON equity (run_id);
+"""
+
+
+def create_run(market: str, timeframe: str, start_time: int, end_time: int, upper_price: float, lower_price: float, price_step: float, stats: dict, parameters: dict = None, fills: numpy.ndarray = None, equity: dict = None) -> dict:
+    """
+        Returns a run for ResultsStore.add_runs. start_time and end_time are the backtested period in ms, stats holds
+        the result metrics (missing ones are stored as NULL), fills are records with RECORD_DTYPE and equity has the
+        columns time (ms) and equity.
+    """
+    return {
+        "market": market,
+        "timeframe": timeframe,
+        "start_time": start_time,
+        "end_time": end_time,
+        "upper_price": upper_price,
+        "lower_price": lower_price,
+        "price_step": price_step,
+        "stats": stats,
+        "parameters": parameters,
+        "fills": fills,
+        "equity": equity,
+    }
+
+
+class ResultsStore:
+    """
+        SQLite database of backtest results.
+
+        Every run is a row of the runs table with its market, period, grid parameters and result metrics, the fills
+        and equity samples of a run are stored in the fills and equity tables. Runs are added in batches, one
+        transaction per batch with bulk inserts for fills and equity samples. The database is in WAL mode, so it can
+        be queried while a ResultsWriter adds runs.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add_runs(self, runs: list[dict]) -> list[int]:
+        """Adds runs created by create_run in a single transaction, returns their ids"""
+        ids = []
+        with self.connection:
+            cursor = self.connection.cursor()
+            created = time.time()
+            for run in runs:
+                stats = run["stats"]
+                cursor.execute(
+                    "INSERT INTO runs (" + ", ".join(RUN_COLUMNS[1:]) + ") VALUES (" + ", ".join("?" * (len(RUN_COLUMNS) - 1)) + ")",
+                    [created, run["market"], run["timeframe"], run["start_time"], run["end_time"], run["upper_price"], run["lower_price"], run["price_step"]]
+                    + [None if stats.get(metric) is None else float(stats[metric]) for metric in METRICS]
+                    + [json.dumps(run["parameters"]) if run["parameters"] is not None else None])
+                run_id = cursor.lastrowid
+                ids.append(run_id)
+
+                fills = run["fills"]
+                if fills is not None and len(fills) > 0:
+                    columns = [numpy.asarray(fills[name]).tolist() for name in RECORD_DTYPE.names]
+                    cursor.executemany("INSERT INTO fills VALUES (?, " + ", ".join("?" * len(columns)) + ")",
+                                       zip([run_id] * len(columns[0]), *columns))
+                equity = run["equity"]
+                if equity is not None and len(equity["time"]) > 0:
+                    cursor.executemany("INSERT INTO equity VALUES (?, ?, ?)",
+                                       zip([run_id] * len(equity["time"]), numpy.asarray(equity["time"]).tolist(), numpy.asarray(equity["equity"]).tolist()))
+        return ids
+
+    def add_run(self, run: dict) -> int:
+        return self.add_runs([run])[0]
+
+    def query(self, sql: str, parameters: tuple = ()):
+        """Returns the result of a SQL query as dataframe"""
+        import pandas
+        return pandas.read_sql_query(sql, self.connection, params=parameters)
+
+    def top_runs(self, metric: str = "sharpe_ratio", limit: int = 20, start_time: int = None, end_time: int = None, market: str = None, ascending: bool = False):
+        """
+            Returns the best runs by metric as dataframe, optionally only runs of a market whose backtested period is
+            within [start_time, end_time] (ms). Runs without the metric are left out.
+        """
+        if metric not in METRICS:
+            raise ValueError("Unknown metric: " + metric)
+        conditions = [metric + " IS NOT NULL"]
+        parameters = []
+        if start_time is not None:
+            conditions.append("start_time >= ?")
+            parameters.append(start_time)
+        if end_time is not None:
+            conditions.append("end_time <= ?")
+            parameters.append(end_time)
+        if market is not None:
+            conditions.append("market = ?")
+            parameters.append(market)
+        sql = "SELECT * FROM runs WHERE " + " AND ".join(conditions) + " ORDER BY " + metric + (" ASC" if ascending else " DESC") + " LIMIT ?"
+        return self.query(sql, tuple(parameters) + (limit,))
+
+    def fills(self, run_id: int) -> numpy.ndarray:
+        """Returns the fills of a run as records with RECORD_DTYPE"""
+        rows = self.connection.execute("SELECT " + ", ".join(RECORD_DTYPE.names) + " FROM fills WHERE run_id = ? ORDER BY rowid", (run_id,)).fetchall()
+        return numpy.array(rows, dtype=RECORD_DTYPE) if rows else numpy.zeros(0, dtype=RECORD_DTYPE)
+
+    def equity(self, run_id: int) -> dict:
+        """Returns the equity samples of a run as columns time and equity"""
+        rows = self.connection.execute("SELECT time, equity FROM equity WHERE run_id = ? ORDER BY rowid", (run_id,)).fetchall()
+        return {
+            "time": numpy.array([row[0] for row in rows], dtype=numpy.int64),
+            "equity": numpy.array([row[1] for row in rows], dtype=numpy.float64),
+        }
+
+
+class ResultsWriter:
+    """
+        Single writer of a ResultsStore on a background thread.
+
+        submit() only puts a run on a queue and returns. The writer thread owns the database connection and adds
+        all runs that are waiting in the queue, up to batch_size, in one transaction. Producers, e.g. the process
+        collecting the results of sweep workers, never wait for the database.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, batch_size: int = 500) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.written = 0
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="ResultsWriter", daemon=True)
+        # the schema exists before the first submit, readers can open the database right away
+        ResultsStore(path).close()
+        self._thread.start()
+
+    def submit(self, run: dict) -> None:
+        """Queues a run created by create_run"""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(run)
+
+    def close(self) -> None:
+        """Writes all queued runs and stops the writer thread"""
+        self._queue.put(ResultsWriter._STOP)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        store = ResultsStore(self.path)
+        try:
+            stopped = False
+            while not stopped:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is ResultsWriter._STOP:
+                    batch.pop()
+                    stopped = True
+                if batch and self._error is None:
+                    try:
+                        store.add_runs(batch)
+                        self.written += len(batch)
+                    except Exception as e:
+                        # keep draining the queue, the error is raised by the next submit or close
+                        logging.error("Writing %s results failed: %s", len(batch), e)
+                        self._error = e
+        finally:
+            store.close()
@@ -1,11 +1,13 @@
+from collections import deque
 from datetime import datetime, timezone
-from distutils.log import WARN
 import logging
 from typing import overload
 from Market import Market
 from Order import Order
 from Broker import Broker
+from OrderBook import OrderBook
 from OrderFill import OrderFill
+from OrderJournal import OrderJournal
 from PriceProvider import PriceListener
 from Wallet import Wallet
 
@@ -13,13 +15,43 @@ class SimulatedBroker(Broker, PriceListener):
 
     next_id: int = 1
 
-    def __init__(self, wallet: Wallet) -> None:
+    def __init__(self, wallet: Wallet, journal: OrderJournal = None, max_filled_orders: int = None) -> None:
+        """
+            Filled orders are written to journal if one is given. With max_filled_orders set, filled_orders
+            only keeps the most recent filled orders, older orders are only available from the journal.
+        """
         super().__init__()
         self.wallet: Wallet = wallet
-        self.open_orders: list[Order] = []
-        self.filled_orders: list[Order] = []
+        self.books: dict[Market, OrderBook] = {}
+        self.journal = journal
+        self.filled_orders: list[Order] = [] if max_filled_orders is None else deque(maxlen=max_filled_orders)
+        self.logger = logging.Logger("SimulatedBroker", level = logging.WARN)
+
+    def __getstate__(self) -> dict:
+        # the logger can not be pickled, it is created again when the broker is unpickled
+        state = dict(self.__dict__)
+        del state["logger"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
         self.logger = logging.Logger("SimulatedBroker", level = logging.WARN)
 
+    @property
+    def open_orders(self) -> list[Order]:
+        """All open orders of all markets, sorted by id"""
+        result = [order for book in self.books.values() for order in book]
+        result.sort(key=lambda order: order.id)
+        return result
+
+    def get_book(self, market: Market) -> OrderBook:
+        """Returns the order book of a market"""
+        book = self.books.get(market)
+        if book is None:
+            book = OrderBook()
+            self.books[market] = book
+        return book
+
     def createOrder(self, market: Market, qty: float, side: Order.Side = Order.Side.BUY, type: Order.Type = Order.Type.MARKET, limit_price: float = 0, timestamp = None, closes: Order = None) -> Order:
         result = Order(market, qty, side, type, limit_price, timestamp, closes)
         
@@ -27,18 +59,18 @@ class SimulatedBroker(Broker, PriceListener):
         result.id = SimulatedBroker.next_id
         SimulatedBroker.next_id += 1
 
-        self.open_orders.append(result)
+        self.get_book(market).add(result)
 
-        self.logger.info("Order created: " + str(result))
+        self.logger.info("Order created: %s", result)
 
         return result
 
     def cancelOrder(self, order_id: int):
-        if order_id in self.open_orders:
-            self.open_orders.remove(order_id)
-            self.logger.info("Order canceled: " + str(order_id))
-        else:
-            self.logger.warning("cancelOrder: Order not found: " + str(order_id))
+        for book in self.books.values():
+            if book.remove(order_id) is not None:
+                self.logger.info("Order canceled: %s", order_id)
+                return
+        self.logger.warning("cancelOrder: Order not found: %s", order_id)
     
     def _generate_complete_fill(self, order: Order, price: float, timestamp) -> OrderFill:
         fill = OrderFill(order.qty, price, 0, timestamp)
@@ -46,104 +78,63 @@ class SimulatedBroker(Broker, PriceListener):
 
     def _add_fill(self, order: Order, fill: OrderFill):
         
-        # modify wallet
-        if order.side == Order.Side.BUY:
-            # buy order increases base currency and decreases quote currency (+BTC -USD)
-            base = self.wallet.getBalance(order.market.base_currency)
-            self.wallet.setBalance(order.market.base_currency, base + fill.qty)
-
-            quote = self.wallet.getBalance(order.market.quote_currency)
-            self.wallet.setBalance(order.market.quote_currency, quote - fill.qty * fill.price)
-        else:
-            # sell order decreases base currency and increases quote currency (-BTC +USD)
-            base = self.wallet.getBalance(order.market.base_currency)
-            self.wallet.setBalance(order.market.base_currency, base - fill.qty)
-
-            quote = self.wallet.getBalance(order.market.quote_currency)
-            self.wallet.setBalance(order.market.quote_currency, quote + fill.qty * fill.price)
+        # modify wallet, buy orders increase base currency and decrease quote currency (+BTC -USD), sell orders the opposite
+        qty = fill.qty if order.side == Order.Side.BUY else -fill.qty
+        self.wallet.apply_fill(order.market.base_currency, order.market.quote_currency, qty, fill.price)
 
         # add fill to order
-        order.fills.append(fill)
+        order.add_fill(fill)
         if order.is_filled():
             self.filled_orders.append(order)
-            self.logger.info("Order filled: " + str(order))
+            if self.journal is not None:
+                self.journal.append(order)
+            self.logger.info("Order filled: %s", order)
         
-        self.logger.info(str(self.wallet))
+        self.logger.info("%s", self.wallet)
 
     def onPriceChanged(self, pair: Market, price: float, timestamp = None):
-        remaining_orders = []
+        book = self.books.get(pair)
+        if book is None:
+            return
+
+        # only orders crossed by the price are touched, they are filled in order of creation
         notifications = []
-        for order in self.open_orders:
-            if order.market == pair:
-                if order.type == Order.Type.MARKET:
-                    # execute any market order
-                    fill = self._generate_complete_fill(order, price, timestamp)
-                    self._add_fill(order, fill)
-                elif order.type == Order.Type.LIMIT:
-                    # check limit orders
-                    if order.side == Order.Side.BUY:
-                        # buy order is executed when the price is lower than the limit price
-                        if price <= order.limit_price:
-                            fill = self._generate_complete_fill(order, price, timestamp)
-                            self._add_fill(order, fill)
-                            notifications.append([order, fill])
-                        else:
-                            remaining_orders.append(order)
-                    else:
-                        # sell order is executed when price is greater than limit price
-                        if price >= order.limit_price:
-                            fill = self._generate_complete_fill(order, price, timestamp)
-                            self._add_fill(order, fill)
-                            notifications.append([order, fill])
-                        else:
-                            remaining_orders.append(order)
-                else:
-                    # unknown order type
-                    pass
-        self.open_orders = remaining_orders
+        for order in book.pop_crossing(price):
+            fill = self._generate_complete_fill(order, price, timestamp)
+            self._add_fill(order, fill)
+            if order.type == Order.Type.LIMIT:
+                notifications.append([order, fill])
 
         # do notifications
         for n in notifications:
             self.notifyOrderFilled(n[0], n[1])
 
-    def get_open_orders(self, a: float, b: float) -> list[Order]:
+    def next_fill_price(self, market: Market, price: float, target: float) -> float:
+        """Returns the price of the next fill when the price of market moves from price towards target, None if no order is filled"""
+        book = self.books.get(market)
+        if book is None:
+            return None
+        return book.next_fill_price(price, target)
+
+    def get_open_orders(self, a: float, b: float, market: Market = None) -> list[Order]:
         """
-            Retuns all orders that would be filled when price moves from a to b
+            Retuns all orders that would be filled when price moves from a to b, sorted by id
             TODO: Seems to work, but this method needs tests!
         """
+        if market is not None:
+            books = [self.books[market]] if market in self.books else []
+        else:
+            books = self.books.values()
+
         result: list[Order] = []
-        min_price = min(a, b)
-        max_price = max(a, b)
-        for order in self.open_orders:
-
-            # market order is always filled
-            if order.type == Order.Type.MARKET:
-                result.append(order)
-            
-            # check limit price for limit orders
-            elif order.type == Order.Type.LIMIT:
-                if order.side == Order.Side.BUY:
-                    # buy orders are executed when
-                    # - the limit price is greater than b for red candles
-                    # - the limit price is greater than a for green candles
-                    if order.limit_price >= min_price:
-                        result.append(order)
-                if order.side == Order.Side.SELL:
-                    # sell orders are executed when
-                    # - the limit price is less than a for red candles
-                    # - the limit price is less than b for green candles
-                    if order.limit_price <= max_price:
-                        result.append(order)
-            else:
-                pass
+        for book in books:
+            result += book.crossing(min(a, b), max(a, b))
+        result.sort(key=lambda order: order.id)
         return result
 
     def cancel_all_orders(self, market: Market):
-        remaining_orders = []
-        for order in self.open_orders:
-            if order.market == market:
+        book = self.books.pop(market, None)
+        if book is not None:
+            for order in book:
                 # cancel this order
-                self.logger.info("Order canceled: " + str(order))
-            else:
-                remaining_orders.append(order)
-        self.open_orders = remaining_orders
+                self.logger.info("Order canceled: %s", order)
@@ -0,0 +1,356 @@
+import numpy
+
+from Grid import Grid
+from Market import Market
+from Order import Order
+from PriceTape import PriceTape
+from Wallet import Wallet
+
+
+class VectorizedGridBacktest:
+    """
+        Closed-form backtest of GridStrategy on a price tape.
+
+        Once a grid order has been filled, GridStrategy always keeps a buy order one grid line below and a sell order
+        one grid line above the last filled line. The filled line therefore only moves when the price path reaches an
+        adjacent line, and the line after every path point follows from the previous one by clamping it to the grid
+        lines around that point. That is computed for whole blocks of candles with NumPy, only the position sizes are
+        updated fill by fill.
+
+        Candles that are not covered by that rule are replayed event by event with the same rules as
+        BacktestingPriceProvider and SimulatedBroker: the candles until the first fill, where the initial orders are
+        not on adjacent grid lines, and candles opening more than one grid line away from the previous close.
+        The result is the same fill list and equity curve as running GridStrategy on SimulatedBroker.
+    """
+
+    # number of candles computed per block, a candle that needs an event by event replay restarts the current block.
+    # Blocks start small after such a candle and grow while there are none.
+    MIN_BLOCK_SIZE = 64
+    MAX_BLOCK_SIZE = 4096
+
+    def __init__(self, market: Market, wallet: Wallet, grid: Grid) -> None:
+        self.market = market
+        self.wallet = wallet
+        self.grid = grid
+        self.current_price = 0
+        self.fills = None
+        self.equity = None
+
+    def run(self, tape: PriceTape) -> None:
+        """
+            Runs the backtest and updates the wallet. Afterwards fills holds the filled orders as column arrays
+            (date, side, type, limit_price, price, qty, closes, profit) and equity the equity after every
+            limit order fill (time, equity).
+        """
+        self._tape = tape
+        self._lines = list(self.grid.grid_lines)
+        self._levels = self.grid.levels
+        self._events = []
+        self._event_id = 0
+
+        if len(tape) == 0:
+            self._initial_qty = (None, None, None)
+            self._create_results()
+            return
+
+        market_price = float(tape.prices[0, 0])
+        self._initialise_orders(market_price)
+
+        prices = tape.prices.ravel()
+        num_candles = len(tape)
+        candle = 0
+        block_size = VectorizedGridBacktest.MIN_BLOCK_SIZE
+        while candle < num_candles:
+            if self._filled_line is None:
+                # initial orders, replay from the first candle that reaches one of them
+                candle = self._first_candle_reaching_orders(candle)
+                if candle is None:
+                    break
+                self._replay_candle(candle)
+                candle += 1
+            else:
+                end = min(candle + block_size, num_candles)
+                gap_candle = self._run_block(prices, candle, end)
+                if gap_candle is None:
+                    candle = end
+                    block_size = min(2 * block_size, VectorizedGridBacktest.MAX_BLOCK_SIZE)
+                else:
+                    self._replay_candle(gap_candle)
+                    candle = gap_candle + 1
+                    block_size = VectorizedGridBacktest.MIN_BLOCK_SIZE
+
+        # last simulated price event, a fill on the last movement of the last candle or the start of that movement
+        self.current_price = float(tape.prices[-1, 2])
+        if self._events and self._events[-1][1] == num_candles - 1 and self._events[-1][2] == PriceTape.POINTS_PER_CANDLE - 1:
+            self.current_price = self._events[-1][6]
+
+        self._create_results()
+
+    def _initialise_orders(self, market_price: float) -> None:
+        """Same orders as GridStrategy.initialiseOrders"""
+        base = self.wallet.getBalance(self.market.base_currency)
+        quote = self.wallet.getBalance(self.market.quote_currency)
+        size_per_grid = (base * market_price + quote) / len(self._lines)
+
+        self._market_qty = None
+        value_base_to_buy = self.grid.num_gridlines_above(market_price) * size_per_grid - base * market_price
+        if value_base_to_buy > 0:
+            self._market_qty = value_base_to_buy / market_price
+
+        self._buy = None
+        self._buy_qty = None
+        if market_price > self.grid.lower_price:
+            self._buy = self.grid.price_below(market_price)
+            self._buy_qty = size_per_grid / self._buy
+
+        self._sell = None
+        self._sell_qty = None
+        if market_price < self.grid.upper_price:
+            self._sell = self.grid.price_above(market_price)
+            buy_price = self.grid.price_below(market_price) if market_price > self.grid.lower_price else self.grid.lower_price
+            self._sell_qty = size_per_grid / buy_price
+
+        self._initial_qty = (self._market_qty, self._buy_qty, self._sell_qty)
+
+        # index of the last filled line in the ascending levels, None until the first limit order fill
+        self._filled_line = None
+
+    def _first_candle_reaching_orders(self, start: int) -> int:
+        if self._market_qty is not None:
+            return start
+        prices = self._tape.prices[start:]
+        reached = numpy.zeros(len(prices), dtype=bool)
+        if self._buy is not None:
+            reached |= (prices <= self._buy).any(axis=1)
+        if self._sell is not None:
+            reached |= (prices >= self._sell).any(axis=1)
+        candles = numpy.flatnonzero(reached)
+        return start + int(candles[0]) if len(candles) > 0 else None
+
+    # event by event replay
+
+    def _set_orders(self, line_idx: int) -> None:
+        """Orders of GridStrategy.onOrderFilled after a fill on grid_lines[line_idx]"""
+        self._buy = self._lines[line_idx + 1] if line_idx + 1 < len(self._lines) else None
+        self._sell = self._lines[line_idx - 1] if line_idx - 1 >= 0 else None
+        self._filled_line = len(self._lines) - 1 - line_idx
+
+    def _emit(self, candle: int, point: int, price: float) -> None:
+        """Price event, fills all crossed orders in order of creation"""
+        filled = []
+        if self._market_qty is not None:
+            filled.append((Order.Side.BUY, Order.Type.MARKET, 0))
+        if self._buy is not None and price <= self._buy:
+            filled.append((Order.Side.BUY, Order.Type.LIMIT, self._buy))
+        if self._sell is not None and price >= self._sell:
+            filled.append((Order.Side.SELL, Order.Type.LIMIT, self._sell))
+        if not filled:
+            return
+
+        for side, type, limit_price in filled:
+            line_idx = self.grid.get_grid_index(limit_price) if type == Order.Type.LIMIT else -1
+            self._events.append((self._event_id, candle, point, side, type, limit_price, price, line_idx))
+        self._event_id += 1
+
+        if self._market_qty is not None:
+            self._market_qty = None
+        for side, type, limit_price in filled:
+            if type == Order.Type.LIMIT:
+                self._set_orders(self.grid.get_grid_index(limit_price))
+
+    def _next_fill_price(self, price: float, target: float) -> float:
+        """Same as OrderBook.next_fill_price"""
+        candidates = []
+        if target < price:
+            if self._buy is not None and self._buy >= target:
+                candidates.append(self._buy)
+            if self._sell is not None and self._sell <= price:
+                candidates.append(self._sell)
+            return max(candidates) if candidates else None
+        else:
+            if self._sell is not None and self._sell <= target:
+                candidates.append(self._sell)
+            if self._buy is not None and self._buy >= price:
+                candidates.append(self._buy)
+            return min(candidates) if candidates else None
+
+    def _replay_candle(self, candle: int) -> None:
+        """Same price events as BacktestingPriceProvider.simulate_price_movement for all movements of a candle"""
+        points = self._tape.prices[candle].tolist()
+        for i in range(PriceTape.POINTS_PER_CANDLE - 1):
+            a, b = points[i], points[i + 1]
+            self._emit(candle, i, a)
+            price = self._next_fill_price(a, b)
+            while price is not None:
+                self._emit(candle, i + 1, price)
+                price = self._next_fill_price(price, b)
+
+    # vectorized blocks
+
+    def _run_block(self, prices: numpy.ndarray, start: int, end: int) -> int:
+        """
+            Computes the fills of the candles [start, end) starting at the current filled line. Stops before the first
+            candle that opens more than one grid line away and returns its index, None if there is no such candle.
+        """
+        points = prices[start * PriceTape.POINTS_PER_CANDLE:end * PriceTape.POINTS_PER_CANDLE]
+        num_levels = len(self._levels)
+
+        # grid lines at or below (lo) and at or above (hi) every point, clamped to the grid
+        lo = numpy.clip(numpy.searchsorted(self._levels, points, side="right") - 1, 0, num_levels - 1)
+        hi = numpy.clip(numpy.searchsorted(self._levels, points, side="left"), 0, num_levels - 1)
+
+        # the filled line is clamped to [lo, hi] at every point. Since hi - lo is 0 or 1, it is lo + offset where the
+        # offset only changes when lo changes or the point is on a grid line: it becomes 1 when lo decreased, else 0.
+        previous_lo = numpy.empty_like(lo)
+        previous_lo[0] = lo[0]
+        previous_lo[1:] = lo[:-1]
+        reset = (lo != previous_lo) | (lo == hi)
+        offset = numpy.where(lo == hi, 0, (lo < previous_lo).astype(lo.dtype))
+        reset[0] = True
+        offset[0] = min(max(self._filled_line, lo[0]), hi[0]) - lo[0]
+        last_reset = numpy.maximum.accumulate(numpy.where(reset, numpy.arange(len(points)), 0))
+        filled_lines = lo + offset[last_reset]
+
+        previous_lines = numpy.empty_like(filled_lines)
+        previous_lines[0] = self._filled_line
+        previous_lines[1:] = filled_lines[:-1]
+        moves = filled_lines - previous_lines
+
+        # candles opening more than one line away from the previous close are replayed event by event
+        gap_candle = None
+        gaps = numpy.flatnonzero(numpy.abs(moves[::PriceTape.POINTS_PER_CANDLE]) > 1)
+        if len(gaps) > 0:
+            gap_candle = start + int(gaps[0])
+            num_points = int(gaps[0]) * PriceTape.POINTS_PER_CANDLE
+            moves = moves[:num_points]
+            previous_lines = previous_lines[:num_points]
+            filled_lines = filled_lines[:num_points]
+            points = points[:num_points]
+
+        # one fill per crossed line, in order
+        counts = numpy.abs(moves)
+        point_idx = numpy.repeat(numpy.arange(len(moves)), counts)
+        first_fill = numpy.cumsum(counts) - counts
+        steps = numpy.arange(len(point_idx)) - numpy.repeat(first_fill, counts) + 1
+        direction = numpy.sign(moves)[point_idx]
+        fill_levels = previous_lines[point_idx] + direction * steps
+
+        limit_prices = self._levels[fill_levels]
+        # a fill at the open of a candle is filled at the open price, all others at the limit price
+        fill_prices = numpy.where(point_idx % PriceTape.POINTS_PER_CANDLE == 0, points[point_idx], limit_prices)
+        candles = start + point_idx // PriceTape.POINTS_PER_CANDLE
+        candle_points = point_idx % PriceTape.POINTS_PER_CANDLE
+        line_idx = num_levels - 1 - fill_levels
+
+        for candle, point, is_sell, limit_price, price, idx in zip(candles.tolist(), candle_points.tolist(), (direction > 0).tolist(), limit_prices.tolist(), fill_prices.tolist(), line_idx.tolist()):
+            side = Order.Side.SELL if is_sell else Order.Side.BUY
+            self._events.append((self._event_id, candle, point, side, Order.Type.LIMIT, limit_price, price, idx))
+            self._event_id += 1
+
+        if len(filled_lines) > 0:
+            self._set_orders(num_levels - 1 - int(filled_lines[-1]))
+        return gap_candle
+
+    # position sizes and wallet
+
+    def _create_results(self) -> None:
+        """Applies the fills in order to the wallet, with the position sizes of GridStrategy"""
+        base_currency = self.market.base_currency
+        quote_currency = self.market.quote_currency
+        base = self.wallet.getBalance(base_currency)
+        quote = self.wallet.getBalance(quote_currency)
+        num_lines = len(self._lines)
+        lines = self._lines
+        timestamps = self._tape.timestamps.tolist()
+
+        market_qty, buy_qty, sell_qty = self._initial_qty
+        # fill index of the buy order that is closed by the resting sell order, -2 for the initial buy order
+        sell_closes = -2 if buy_qty is not None else -1
+        initial_buy_open = True
+        initial_buy_fill = -1
+
+        dates, sides, types, limit_prices, prices, qtys, closes = [], [], [], [], [], [], []
+        equity_times, equity_values = [], []
+
+        i = 0
+        num_events = len(self._events)
+        while i < num_events:
+            # all fills of one price event are applied before any notification
+            group_end = i + 1
+            while group_end < num_events and self._events[group_end][0] == self._events[i][0]:
+                group_end += 1
+
+            notifications = []
+            for event_id, candle, point, side, type, limit_price, price, line_idx in self._events[i:group_end]:
+                if type == Order.Type.MARKET:
+                    qty = market_qty
+                    closed = -1
+                elif side == Order.Side.BUY:
+                    qty = buy_qty
+                    closed = -1
+                    if initial_buy_open:
+                        initial_buy_fill = len(qtys)
+                else:
+                    qty = sell_qty
+                    closed = sell_closes
+
+                if side == Order.Side.BUY:
+                    base += qty
+                    quote -= qty * price
+                else:
+                    base -= qty
+                    quote += qty * price
+
+                if type == Order.Type.LIMIT:
+                    notifications.append((len(qtys), candle, side, limit_price, price, line_idx))
+
+                dates.append(timestamps[candle])
+                sides.append(side.value)
+                types.append(type.value)
+                limit_prices.append(limit_price)
+                prices.append(price)
+                qtys.append(qty)
+                closes.append(closed)
+
+            for fill, candle, side, limit_price, price, line_idx in notifications:
+                # new orders of GridStrategy.onOrderFilled
+                size_per_grid = (base * limit_price + quote) / num_lines
+                buy_qty = size_per_grid / lines[line_idx + 1] if line_idx + 1 < num_lines else None
+                sell_qty = size_per_grid / lines[line_idx] if line_idx - 1 >= 0 else None
+                sell_closes = fill if side == Order.Side.BUY else -1
+                initial_buy_open = False
+
+                # equity after the fill, at the price of the price event
+                equity_times.append(timestamps[candle])
+                equity_values.append(base * price + quote)
+
+            i = group_end
+
+        # book all fills at once, the running balances above are only used for the position sizes
+        signed_qtys = [qty if side == Order.Side.BUY.value else -qty for side, qty in zip(sides, qtys)]
+        self.wallet.apply_fills(base_currency, quote_currency, numpy.array(signed_qtys, dtype=numpy.float64), numpy.array(prices, dtype=numpy.float64))
+
+        self.fills = {
+            "date": numpy.array(dates, dtype=numpy.int64),
+            "side": numpy.array(sides, dtype=numpy.int8),
+            "type": numpy.array(types, dtype=numpy.int8),
+            "limit_price": numpy.array(limit_prices, dtype=numpy.float64),
+            "price": numpy.array(prices, dtype=numpy.float64),
+            "qty": numpy.array(qtys, dtype=numpy.float64),
+            "closes": numpy.array(closes, dtype=numpy.int64),
+        }
+
+        # profit of every sell order that closed a filled buy order, like BacktestReport. The initial buy order
+        # might never have been filled, a sell order closing it is no round trip then.
+        closes = self.fills["closes"]
+        closes[closes == -2] = initial_buy_fill if initial_buy_fill >= 0 else -1
+        profit = numpy.zeros(len(qtys))
+        value = self.fills["qty"] * self.fills["price"]
+        closing = closes >= 0
+        profit[closing] = value[closing] - value[closes[closing]]
+        self.fills["profit"] = profit
+
+        self.equity = {
+            "time": numpy.array(equity_times, dtype=numpy.int64),
+            "equity": numpy.array(equity_values, dtype=numpy.float64),
+        }
@@ -1,23 +1,121 @@
 import logging
 import string
 
+import numpy
+
 
 class Wallet:
 
     def __init__(self) -> None:
         self.tokens = {}
-    
+
     def getBalance(self, token: string) -> float:
         result = 0
         if token in self.tokens:
             result = self.tokens[token]
         return result
-    
+
     def setBalance(self, token: string, amount: float) -> None:
         self.tokens[token] = amount
-    
+
     def get_tokens(self) -> list[string]:
         return list(self.tokens)
 
+    def apply_fill(self, base: string, quote: string, qty: float, price: float) -> None:
+        """Books a fill of qty base at price, qty is positive for buys and negative for sells"""
+        tokens = self.tokens
+        tokens[base] = tokens.get(base, 0) + qty
+        tokens[quote] = tokens.get(quote, 0) - qty * price
+
+    def apply_fills(self, base: string, quote: string, qty: numpy.ndarray, price: numpy.ndarray) -> None:
+        """Books fills in order, same as apply_fill for every fill"""
+        for q, p in zip(numpy.asarray(qty, dtype=numpy.float64).tolist(), numpy.asarray(price, dtype=numpy.float64).tolist()):
+            self.apply_fill(base, quote, q, p)
+
+    def __str__(self) -> str:
+        return "Wallet " + str(self.tokens)
+
+
+_INT64_MAX = 2 ** 63 - 1
+
+
+class FixedPointWallet(Wallet):
+    """
+        Wallet with exact balances.
+
+        Every currency gets an integer id on first use, balances are integer numbers of minor units (10^-decimals of
+        the currency) in a list indexed by currency id. A fill is rounded to minor units once when it is booked, sums
+        of fills are exact, so balances do not drift over many trades. apply_fills books any number of fills with
+        one vectorized update. getBalance and setBalance convert from and to float amounts.
+        The balances are Python ints, apply_fill stays a plain integer update. Values only pass through int64 in
+        apply_fills and balances(), which raise OverflowError if they do not fit (about 9.2e10 of a currency with
+        8 decimals).
+    """
+
+    def __init__(self, decimals: dict[str, int] = None, default_decimals: int = 8) -> None:
+        """decimals optionally maps currencies to their number of decimals, all others have default_decimals"""
+        self.decimals = dict(decimals or {})
+        self.default_decimals = default_decimals
+        self.currency_ids: dict[str, int] = {}
+        self.scales: list[int] = []
+        self.units: list[int] = []
+        # currency ids and scales by (base, quote)
+        self._pairs: dict[tuple, tuple] = {}
+
+    def currency_id(self, token: string) -> int:
+        """Returns the id of a currency, the index of its balance in units"""
+        result = self.currency_ids.get(token)
+        if result is None:
+            result = len(self.units)
+            self.currency_ids[token] = result
+            self.scales.append(10 ** self.decimals.get(token, self.default_decimals))
+            self.units.append(0)
+        return result
+
+    @property
+    def tokens(self) -> dict:
+        return {token: self.getBalance(token) for token in self.currency_ids}
+
+    def balances(self) -> numpy.ndarray:
+        """Returns the balances in minor units as int64 array indexed by currency id"""
+        if any(not -_INT64_MAX <= units <= _INT64_MAX for units in self.units):
+            raise OverflowError("A balance does not fit in int64 minor units")
+        return numpy.array(self.units, dtype=numpy.int64)
+
+    def getBalance(self, token: string) -> float:
+        currency = self.currency_ids.get(token)
+        if currency is None:
+            return 0
+        return self.units[currency] / self.scales[currency]
+
+    def setBalance(self, token: string, amount: float) -> None:
+        currency = self.currency_id(token)
+        self.units[currency] = round(amount * self.scales[currency])
+
+    def get_tokens(self) -> list[string]:
+        return list(self.currency_ids)
+
+    def apply_fill(self, base: string, quote: string, qty: float, price: float) -> None:
+        pair = self._pairs.get((base, quote))
+        if pair is None:
+            b, q = self.currency_id(base), self.currency_id(quote)
+            pair = self._pairs[(base, quote)] = (b, self.scales[b], q, self.scales[q])
+        b, base_scale, q, quote_scale = pair
+        units = self.units
+        units[b] += round(qty * base_scale)
+        units[q] -= round(qty * price * quote_scale)
+
+    def apply_fills(self, base: string, quote: string, qty: numpy.ndarray, price: numpy.ndarray) -> None:
+        b, q = self.currency_id(base), self.currency_id(quote)
+        qty = numpy.asarray(qty, dtype=numpy.float64)
+        # the same rounding as apply_fill, every fill is rounded on its own
+        qty_units = numpy.rint(qty * self.scales[b])
+        cost_units = numpy.rint(qty * numpy.asarray(price, dtype=numpy.float64) * self.scales[q])
+        # the int64 sums can not wrap if the sums of the absolute values fit
+        if numpy.abs(qty_units).sum() > _INT64_MAX or numpy.abs(cost_units).sum() > _INT64_MAX:
+            raise OverflowError("Fills do not fit in int64 minor units")
+        self.units[b] += int(qty_units.astype(numpy.int64).sum())
+        self.units[q] -= int(cost_units.astype(numpy.int64).sum())
+
     def __str__(self) -> str:
-        return "Wallet " + str(self.tokens)
\ No newline at end of file
+        return "FixedPointWallet " + str(self.tokens)
@@ -1,117 +1,375 @@
+"""
+    Command line interface of the trading bot.
+
+        python main.py backtest --config backtest.json
+        python main.py sweep --upper 50000 45000 --lower 20000 --step 200 500
+        python main.py montecarlo --paths 10000 --method bootstrap --output montecarlo.csv
+        python main.py top --results results.db --metric sharpe_ratio --start 2022-01-01 --end 2022-07-01
+        python main.py download --start 2022-01-01 --end 2022-05-21
+        python main.py plot
+        python main.py backtest --end 2022-05-01 --checkpoint run.checkpoint
+        python main.py backtest --resume run.checkpoint --end 2022-05-21
+
+    Parameters are read from an optional json config file, command line arguments take precedence. Modules are only
+    imported by the subcommand that needs them, a headless backtest on cached candles does not import ccxt, pandas
+    or finplot.
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+import json
 import logging
-import ccxt
-import finplot
+import sys
+
+DEFAULTS = {
+    "exchange": "ftx",
+    "market": "BTC/USD",
+    "timeframe": "1h",
+    "start": "2022-01-01",
+    "end": "2022-05-21",
+    "balances": {"USD": 1000},
+    "upper": 50000,
+    "lower": 20000,
+    "step": 200,
+    "candles": "candles",
+    "offline": False,
+    # filled_orders.bin, a resumed backtest continues in a copy next to the journal of the checkpointed run
+    "journal": None,
+    "report": "report",
+    "plot": False,
+    "profile": None,
+    "intrabar": None,
+    "checkpoint": None,
+    "resting_orders": None,
+    "fixed_point": False,
+    "resume": None,
+    "workers": None,
+    "vectorized": False,
+    "output": "sweep.csv",
+    "results": None,
+    "metric": "sharpe_ratio",
+    "top": 20,
+    "paths": 1000,
+    "method": "bootstrap",
+    "block_size": 24,
+    "seed": None,
+    "ruin_drawdown": 0.5,
+    "regimes": [
+        {"drift": 0.0, "volatility": 0.6, "duration": 720},
+        {"drift": -0.5, "volatility": 1.2, "duration": 240},
+    ],
+}
+
+
+def parse_market(name: str):
+    from Market import Market
+    parts = name.split("/")
+    return Market(parts[0], parts[1] if len(parts) > 1 else None)
+
+
+def parse_date(value: str) -> datetime:
+    result = datetime.fromisoformat(value)
+    if result.tzinfo is None:
+        result = result.replace(tzinfo=timezone.utc)
+    return result
+
+
+def as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def time_range(settings: dict) -> tuple[int, int]:
+    """Returns start and end of the settings in ms"""
+    return int(parse_date(settings["start"]).timestamp() * 1000), int(parse_date(settings["end"]).timestamp() * 1000)
+
+
+def create_exchange(settings: dict, store=None, market=None, timeframe: str = None):
+    """
+        Returns the ccxt exchange of the settings, None when running offline. With a candle store, None is returned
+        as well when the store already holds the candles of market and timeframe for the range of the settings, ccxt
+        is only imported if candles have to be downloaded.
+    """
+    if settings["offline"]:
+        return None
+    if store is not None and not store.missing_ranges(settings["exchange"], market, timeframe, *time_range(settings)):
+        return None
+    import ccxt
+    return getattr(ccxt, settings["exchange"])()
+
+
+def load_candles(settings: dict) -> dict:
+    """Returns the candles of the settings from the candle store, missing candles are downloaded unless offline"""
+    from CandleStore import CandleStore
+    store = CandleStore(settings["candles"])
+    market = parse_market(settings["market"])
+    candles = store.get_candles(create_exchange(settings, store, market, settings["timeframe"]), market, settings["timeframe"], *time_range(settings), settings["exchange"])
+    if len(candles["date"]) == 0:
+        raise ValueError("No candles for " + settings["market"] + " in the candle store, run the download command first")
+    return candles
+
+
+def create_price_provider(settings: dict, market, broker):
+    from BacktestingPriceProvider import BacktestingPriceProvider
+
+    start, end = parse_date(settings["start"]), parse_date(settings["end"])
+    if settings["intrabar"] is not None:
+        # simulate the price movement from lower timeframe candles, streamed from the candle store
+        from CandleStore import CandleStore
+        store = CandleStore(settings["candles"])
+        exchange = create_exchange(settings, store, market, settings["intrabar"])
+        return BacktestingPriceProvider(exchange, market, broker, settings["timeframe"], start, end, store, settings["exchange"], intrabar_timeframe=settings["intrabar"])
+    return BacktestingPriceProvider(None, market, broker, settings["timeframe"], start, end, candles=load_candles(settings))
+
+
+def backtest(settings: dict) -> None:
+    from BacktestReport import BacktestReport
+    from CandleStore import timeframe_to_ms
+    from Equity import Equity
+    from GridStrategy import GridStrategy
+    from OrderJournal import OrderJournal
+    from SimulatedBroker import SimulatedBroker
+    from Wallet import FixedPointWallet, Wallet
+
+    if settings["profile"] is not None and settings["checkpoint"] is not None:
+        raise ValueError("An instrumented backtest can not be checkpointed")
+
+    if settings["resume"] is not None:
+        # continue a previous backtest on the candles after its checkpoint, with its wallet, orders and strategy
+        from Checkpoint import Checkpoint
+        checkpoint = Checkpoint.load(settings["resume"])
+        settings = dict(settings, start=checkpoint.timestamp.isoformat())
+        market = parse_market(settings["market"])
+        price_provider = create_price_provider(settings, market, None)
+        # the filled orders of the checkpointed run are copied to the journal of this run, by default to a new
+        # journal next to the one of the checkpointed run, which is never modified
+        state = checkpoint.restore(price_provider, settings["journal"])
+        wallet, broker, strategy, equity = state["wallet"], state["broker"], state["strategy"], state["equity"]
+        journal = broker.journal
+    else:
+        market = parse_market(settings["market"])
+
+        # initialise a backtesting wallet
+        wallet = FixedPointWallet() if settings["fixed_point"] else Wallet()
+        for token, amount in settings["balances"].items():
+            wallet.setBalance(token, amount)
+
+        # stream filled orders to disk, only the most recent ones are kept in memory
+        journal = OrderJournal(settings["journal"] if settings["journal"] is not None else "filled_orders.bin")
+        broker = SimulatedBroker(wallet, journal, max_filled_orders=1000)
+        price_provider = create_price_provider(settings, market, broker)
+
+        strategy = GridStrategy(market, wallet, broker, price_provider, settings["resting_orders"])
+        strategy.initialise(settings["upper"], settings["lower"], settings["step"])
+
+        broker.addListener(strategy)
+        price_provider.addListener(broker, market)
+
+        # collect equity statistics over time, sampled on every fill and every candle close
+        periods_per_year = 365 * 24 * 3600 * 1000 / timeframe_to_ms(settings["timeframe"])
+        equity = Equity(market, wallet, price_provider, periods_per_year=periods_per_year)
+        broker.addListener(equity)
+        price_provider.addCandleListener(equity)
+
+    instrumentation = None
+    if settings["profile"] is not None:
+        from Instrumentation import Instrumentation
+        instrumentation = Instrumentation()
+        instrumentation.install(price_provider, broker)
+
+    # run the backtest
+    price_provider.run()
+    journal.close()
+    logging.info(str.format("Filled orders written to {}", journal.path))
+
+    if instrumentation is not None:
+        instrumentation.dump(settings["profile"])
+
+    if settings["checkpoint"] is not None:
+        # all candles up to the end date were replayed, a resumed backtest continues after it
+        from Checkpoint import Checkpoint
+        resume_time = parse_date(settings["end"]) + timedelta(seconds=1)
+        Checkpoint.capture(price_provider, broker, strategy, equity, resume_time).save(settings["checkpoint"])
+
+    # write ledger, equity curve and statistics
+    report = BacktestReport.from_backtest(journal, equity)
+    report.write(settings["report"])
+    logging.info(str.format("Backtest statistics: {}", report.stats))
+    logging.info(str.format("Wallet value: {} {}", wallet.getBalance(market.quote_currency) + wallet.getBalance(market.base_currency) * price_provider.getCurrentPrice(market), market.quote_currency))
+
+    if settings["results"] is not None:
+        from ResultsStore import ResultsStore, create_run
+        with ResultsStore(settings["results"]) as store:
+            run = create_run(market.get_market(), settings["timeframe"], int(parse_date(settings["start"]).timestamp() * 1000), int(parse_date(settings["end"]).timestamp() * 1000),
+                             strategy.grid.upper_price, strategy.grid.lower_price, strategy.grid.price_step, dict(report.stats, final_equity=report.stats["end_equity"]),
+                             settings, report.ledger, report.equity)
+            logging.info(str.format("Results stored as run {} in {}", store.add_run(run), settings["results"]))
+
+    if settings["plot"]:
+        from ReportPlot import plot_report
+        # memory mapped candles of the store, the plot only reads the resolution it shows
+        plot_report(report, load_candles(dict(settings, offline=True)), market.get_market(), strategy.grid.grid_lines)
+
+
+def sweep(settings: dict) -> None:
+    from GridSweep import GridSweep
+
+    market = parse_market(settings["market"])
+    grid_sweep = GridSweep(market, settings["timeframe"], load_candles(settings), settings["balances"], settings["workers"], settings["vectorized"])
+    if settings["results"] is not None:
+        # results are written to the results store by one writer thread while the sweep runs
+        from ResultsStore import ResultsWriter
+        with ResultsWriter(settings["results"]) as results_writer:
+            results = grid_sweep.run(as_list(settings["upper"]), as_list(settings["lower"]), as_list(settings["step"]), results_writer)
+    else:
+        results = grid_sweep.run(as_list(settings["upper"]), as_list(settings["lower"]), as_list(settings["step"]))
+    results.to_csv(settings["output"], index=False)
+    logging.info(str.format("Best parameter sets:\n{}", results.sort_values("final_equity", ascending=False).head(10)))
+
 
-from datetime import datetime, timezone
-from matplotlib.pyplot import legend
+def montecarlo(settings: dict) -> None:
+    from MonteCarlo import BootstrapPaths, MonteCarlo, Regime, RegimeSwitchingGBM
 
-import pandas
-from pyparsing import col
-from BacktestingPriceProvider import BacktestingPriceProvider
-from Equity import Equity
-from GridStrategy import GridStrategy
-from Market import Market
-from Order import Order
-from PriceProvider import PriceProvider
+    market = parse_market(settings["market"])
+    candles = load_candles(settings)
+    if settings["method"] == "bootstrap":
+        generator = BootstrapPaths(candles, settings["timeframe"], settings["block_size"], seed=settings["seed"])
+    elif settings["method"] == "gbm":
+        # paths as long as the history, starting at its first open
+        regimes = [Regime(r["drift"], r["volatility"], r["duration"]) for r in settings["regimes"]]
+        generator = RegimeSwitchingGBM(regimes, settings["timeframe"], len(candles["date"]), float(candles["open"][0]), settings["seed"], start_time=int(candles["date"][0]))
+    else:
+        raise ValueError("Unknown path generation method: " + settings["method"])
 
-from SimulatedBroker import SimulatedBroker
-from Strategy import Strategy
-from Wallet import Wallet
+    monte_carlo = MonteCarlo(generator, market, settings["balances"], settings["workers"], settings["vectorized"])
+    results = monte_carlo.run(settings["upper"], settings["lower"], settings["step"], settings["paths"])
+    results.to_csv(settings["output"], index=False)
+    logging.info(str.format("Monte Carlo results of {} paths: {}", len(results), monte_carlo.summary(results, settings["ruin_drawdown"])))
 
 
-logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
+def top(settings: dict) -> None:
+    import pandas
+    from ResultsStore import ResultsStore
 
-# The market for the bot
-market = Market("BTC", "USD")
+    if settings["results"] is None:
+        raise ValueError("No results store given, use --results")
+    start = int(parse_date(settings["start"]).timestamp() * 1000)
+    end = int(parse_date(settings["end"]).timestamp() * 1000)
+    with ResultsStore(settings["results"]) as store:
+        runs = store.top_runs(settings["metric"], settings["top"], start, end, settings["market"])
+    with pandas.option_context("display.width", 200, "display.max_columns", 12):
+        logging.info(str.format("Top {} runs by {} from {} to {}:\n{}", len(runs), settings["metric"], settings["start"], settings["end"], runs.drop(columns=["parameters"])))
 
-# initialise a backtesting wallet
-wallet: Wallet = Wallet()
-wallet.setBalance("USD", 1000)
 
-broker: SimulatedBroker = SimulatedBroker(wallet)
+def download(settings: dict) -> None:
+    candles = load_candles(dict(settings, offline=False))
+    logging.info(str.format("{} candles stored in {}", len(candles["date"]), settings["candles"]))
 
-exchange = ccxt.ftx()
-#price_provider = PriceProvider(exchange)
-price_provider = BacktestingPriceProvider(exchange, market, broker, "1h", datetime(2022, 1, 1, tzinfo=timezone.utc), datetime(2022, 5, 21, tzinfo=timezone.utc))
 
-strategy: Strategy = GridStrategy(market, wallet, broker, price_provider)
-strategy.initialise(50000, 20000, 200)
+def plot(settings: dict) -> None:
+    from BacktestReport import BacktestReport
+    from Grid import Grid
+    from ReportPlot import plot_report
 
-broker.addListener(strategy)
-price_provider.addListener(broker, market)
+    report = BacktestReport.load(settings["report"])
+    candles = load_candles(dict(settings, offline=True))
 
-# collect equity statistics over time
-equity = Equity(market, wallet, price_provider)
-broker.addListener(equity)
+    grid = Grid(settings["upper"], settings["lower"], settings["step"])
+    plot_report(report, candles, settings["market"], grid.grid_lines)
 
-# run the backtest
-price_provider.run()
 
-logging.info(str.format("Wallet value: {} {}", wallet.getBalance(market.quote_currency) + wallet.getBalance(market.base_currency) * price_provider.getCurrentPrice(market), market.quote_currency))
+COMMANDS = {"backtest": backtest, "sweep": sweep, "montecarlo": montecarlo, "top": top, "download": download, "plot": plot}
 
-# open a window to visualise the simulation result
-# TODO add trades to candlestick chart, add portfolio/time value as additional graph
-ax, ax2, ax3 = finplot.create_plot(market.get_market(), rows = 3)
-finplot.candlestick_ochl(price_provider.historic_candles[['open', 'close', 'high', 'low']])
 
-# add grid lines to view
-first_date = price_provider.historic_candles.index[0]
-last_date = price_provider.historic_candles.index[-1]
-for gridline in strategy.grid.grid_lines:
-    line = finplot.add_line((first_date, gridline), (last_date, gridline), color='#080808', interactive=False)
+def create_parser() -> argparse.ArgumentParser:
+    # all defaults are None, so only arguments given on the command line override the config file
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", help="json file with parameters, keys are the long argument names")
+    common.add_argument("--exchange", help="ccxt exchange id")
+    common.add_argument("--market", help="market, e.g. BTC/USD")
+    common.add_argument("--timeframe", help="candle timeframe, e.g. 1h")
+    common.add_argument("--start", help="start date (ISO format, UTC)")
+    common.add_argument("--end", help="end date (ISO format, UTC)")
+    common.add_argument("--candles", help="candle store directory")
+    common.add_argument("--offline", action="store_true", default=None, help="only use stored candles")
+    common.add_argument("--balance", action="append", dest="balances", metavar="TOKEN=AMOUNT", help="initial wallet balance, can be repeated")
 
-# add fills to view
-rows = []
-for order in broker.filled_orders:
-    rows.append({"date": order.get_filled_timestamp(), "price": order.limit_price, "type": "buy" if order.side == Order.Side.BUY else "sell"})
+    parser = argparse.ArgumentParser(description="Grid trading bot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
 
-order_df = pandas.DataFrame(rows, columns=["date", "price", "type"])
-buy_orders = order_df[order_df["type"] == "buy"]
-buy_orders.reset_index(inplace=True)
+    parser_backtest = subparsers.add_parser("backtest", parents=[common], help="backtest a grid strategy")
+    parser_backtest.add_argument("--upper", type=float, help="upper grid price")
+    parser_backtest.add_argument("--lower", type=float, help="lower grid price")
+    parser_backtest.add_argument("--step", type=float, help="grid price step")
+    parser_backtest.add_argument("--resting-orders", type=int, help="keep this many orders on each side of the price, only the difference is updated on a fill")
+    parser_backtest.add_argument("--fixed-point", action="store_true", default=None, help="exact wallet balances in integer minor units")
+    parser_backtest.add_argument("--journal", help="filled order journal file, filled_orders.bin by default, with --resume a copy of the checkpointed journal with the suffix .resumed1, .resumed2, ...")
+    parser_backtest.add_argument("--report", help="report directory")
+    parser_backtest.add_argument("--plot", action="store_true", default=None, help="show the result in a finplot window")
+    parser_backtest.add_argument("--intrabar", help="simulate the price movement from candles of this lower timeframe, e.g. 1m")
+    parser_backtest.add_argument("--profile", help="json file for listener call statistics, the run is not instrumented without it")
+    parser_backtest.add_argument("--checkpoint", help="file for a checkpoint of the simulation at the end date")
+    parser_backtest.add_argument("--resume", help="continue the backtest of a checkpoint file on the candles after it")
+    parser_backtest.add_argument("--results", help="results database, the run is added to it")
 
-sell_orders = order_df[order_df["type"] == "sell"]
-sell_orders.reset_index(inplace=True)
+    parser_sweep = subparsers.add_parser("sweep", parents=[common], help="backtest all combinations of grid parameters")
+    parser_sweep.add_argument("--upper", type=float, nargs="+", help="upper grid prices")
+    parser_sweep.add_argument("--lower", type=float, nargs="+", help="lower grid prices")
+    parser_sweep.add_argument("--step", type=float, nargs="+", help="grid price steps")
+    parser_sweep.add_argument("--workers", type=int, help="number of worker processes")
+    parser_sweep.add_argument("--vectorized", action="store_true", default=None, help="use the vectorized backtest")
+    parser_sweep.add_argument("--output", help="csv file for the results")
+    parser_sweep.add_argument("--results", help="results database, the metrics of every parameter set are added to it")
 
-ds_buy = finplot._create_datasrc(ax, buy_orders["date"], buy_orders["price"])
-ds_buy.standalone = True
-finplot.plot(ds_buy, style='>', width=2, color="#007700", legend="buy order filled")
+    parser_montecarlo = subparsers.add_parser("montecarlo", parents=[common], help="backtest a grid strategy on synthetic price paths")
+    parser_montecarlo.add_argument("--upper", type=float, help="upper grid price")
+    parser_montecarlo.add_argument("--lower", type=float, help="lower grid price")
+    parser_montecarlo.add_argument("--step", type=float, help="grid price step")
+    parser_montecarlo.add_argument("--paths", type=int, help="number of paths")
+    parser_montecarlo.add_argument("--method", choices=["bootstrap", "gbm"], help="block bootstrap of the candles or GBM with the regimes of the config file")
+    parser_montecarlo.add_argument("--block-size", type=int, help="number of consecutive candles per bootstrap block")
+    parser_montecarlo.add_argument("--seed", type=int, help="random seed, the same seed generates the same paths")
+    parser_montecarlo.add_argument("--ruin-drawdown", type=float, help="drawdown that counts as ruin, e.g. 0.5")
+    parser_montecarlo.add_argument("--workers", type=int, help="number of worker processes")
+    parser_montecarlo.add_argument("--vectorized", action="store_true", default=None, help="use the vectorized backtest")
+    parser_montecarlo.add_argument("--output", help="csv file for the results")
 
-ds_sell = finplot._create_datasrc(ax, sell_orders["date"], sell_orders["price"])
-ds_sell.standalone = True
-finplot.plot(ds_sell, style='<', width=2, color="#770000", legend="sell order filled")
+    parser_top = subparsers.add_parser("top", parents=[common], help="show the best runs of the market and period in a results database")
+    parser_top.add_argument("--results", help="results database")
+    parser_top.add_argument("--metric", help="metric to sort by, e.g. sharpe_ratio or final_equity")
+    parser_top.add_argument("--top", type=int, help="number of runs")
 
-# create equity dataframe
-equity_df = pandas.DataFrame(equity.equity, columns=["time", "equity"])
-equity_df['time'] = pandas.to_datetime(equity_df['time'], unit='ms', utc=True, infer_datetime_format=True)
+    subparsers.add_parser("download", parents=[common], help="download candles into the candle store")
 
-# if there are multiple sell orders per candle, we get multiple equity values per time slot. Drop these duplicates and keep the max equity value.
-equity_df = equity_df.loc[equity_df.groupby(['time'])['equity'].idxmax()]
-equity_df.set_index("time", inplace=True)
+    parser_plot = subparsers.add_parser("plot", parents=[common], help="show a written report in a finplot window")
+    parser_plot.add_argument("--report", help="report directory")
+    parser_plot.add_argument("--upper", type=float, help="upper grid price")
+    parser_plot.add_argument("--lower", type=float, help="lower grid price")
+    parser_plot.add_argument("--step", type=float, help="grid price step")
 
-equity_df.equity.plot(ax = ax2, legend="equity")
+    return parser
 
-# plot profit
-rows = []
-profit_total = 0
-for order in broker.filled_orders:
-    if order.closes is not None and order.side == Order.Side.SELL:
-        buy_value = order.closes.qty * order.closes.fill_price()
-        sell_value = order.qty * order.fill_price()
-        rows.append({"time": order.get_filled_timestamp(), "profit": sell_value - buy_value})
-        profit_total += sell_value - buy_value
 
-print(profit_total)
+def get_settings(args: argparse.Namespace) -> dict:
+    """Merges the defaults, the config file and the command line arguments"""
+    settings = dict(DEFAULTS)
+    if args.config is not None:
+        with open(args.config) as f:
+            settings.update(json.load(f))
 
-profit_df = pandas.DataFrame(rows, columns=["time", "profit"])
-profit_df["date"] = pandas.to_datetime(profit_df['time'], unit='ms', utc=True, infer_datetime_format=True)
+    for key, value in vars(args).items():
+        if value is None or key in ("config", "command"):
+            continue
+        if key == "balances":
+            value = {token: float(amount) for token, amount in (balance.split("=", 1) for balance in value)}
+        settings[key] = value
+    return settings
 
-# sum up all profits at same time slot
-profit_df = profit_df.groupby("time", as_index=False).sum()
 
-# compute cumulative sum over time
-profit_df["cumulative_profit"] = profit_df["profit"].cumsum()
-profit_df.set_index("time", verify_integrity=True, inplace=True)
+def main(argv: list[str] = None) -> int:
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
+    args = create_parser().parse_args(argv)
+    COMMANDS[args.command](get_settings(args))
+    return 0
 
-profit_df.cumulative_profit.plot(ax=ax3, legend="cumulative profit")
 
-finplot.show()
+if __name__ == "__main__":
+    sys.exit(main())
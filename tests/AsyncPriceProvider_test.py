@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from AsyncPriceProvider import AsyncPriceProvider, StalePriceError
+from Market import Market
+from PriceProvider import PriceListener
+
+
+class FakeAsyncExchange:
+    """Async exchange that returns tickers with a fixed price per symbol"""
+
+    def __init__(self, prices: dict) -> None:
+        self.prices = prices
+        self.fetch_tickers_calls = []
+
+    async def fetch_tickers(self, symbols: list[str]) -> dict:
+        self.fetch_tickers_calls.append(list(symbols))
+        await asyncio.sleep(0)
+        return {symbol: {"symbol": symbol, "last": self.prices[symbol], "timestamp": 1000} for symbol in symbols if symbol in self.prices}
+
+
+class RecordingListener(PriceListener):
+
+    def __init__(self) -> None:
+        self.prices = []
+
+    def onPriceChanged(self, pair: Market, price: float, timestamp=None):
+        self.prices.append((pair.get_market(), price, timestamp.timestamp()))
+
+
+class Test_AsyncPriceProvider(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.exchange = FakeAsyncExchange({"BTC/USD": 30000, "ETH/USD": 2000, "SOL/USD": 40})
+        self.provider = AsyncPriceProvider(self.exchange, interval=0.001, max_age=5, batch_size=2, clock=lambda: self.now)
+        return super().setUp()
+
+    def test_batched_poll(self):
+        listener = RecordingListener()
+        btc = Market("BTC", "USD")
+        self.provider.addListener(listener, btc)
+        self.provider.addListener(listener, Market("ETH", "USD"))
+        self.provider.subscribe(Market("SOL", "USD"))
+
+        asyncio.run(self.provider.poll())
+
+        self.assertEqual(self.exchange.fetch_tickers_calls, [["BTC/USD", "ETH/USD"], ["SOL/USD"]])
+        self.assertEqual(listener.prices, [("BTC/USD", 30000, 1), ("ETH/USD", 2000, 1)])
+        self.assertEqual(self.provider.getCurrentPrice(btc), 30000)
+        self.assertEqual(self.provider.getCurrentPrice(Market("SOL", "USD")), 40)
+
+        # cached prices are served without network access until they are too old
+        self.now = 5
+        self.assertEqual(self.provider.getCurrentPrice(btc), 30000)
+        self.assertEqual(len(self.exchange.fetch_tickers_calls), 2)
+        self.now = 5.1
+        self.assertRaises(StalePriceError, self.provider.getCurrentPrice, btc)
+
+    def test_unknown_market_is_subscribed(self):
+        ada = Market("ADA", "USD")
+        self.assertRaises(StalePriceError, self.provider.getCurrentPrice, ada)
+        self.exchange.prices["ADA/USD"] = 0.5
+        asyncio.run(self.provider.run(iterations=2))
+        self.assertEqual(len(self.exchange.fetch_tickers_calls), 2)
+        self.assertEqual(self.provider.getCurrentPrice(ada), 0.5)
+
+    def test_invalid_settings(self):
+        self.assertRaises(ValueError, AsyncPriceProvider, self.exchange, max_age=0)
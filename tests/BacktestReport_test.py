@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+import json
+import os
+import tempfile
+import unittest
+
+import numpy
+
+from BacktestReport import BacktestReport
+from BacktestingPriceProvider import BacktestingPriceProvider
+from Equity import Equity
+from GridStrategy import GridStrategy
+from Market import Market
+from Order import Order
+from OrderJournal import RECORD_DTYPE
+from OrderStore import OrderStore
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_BacktestReport(unittest.TestCase):
+
+    def run_backtest(self):
+        market = Market("BTC", "USD")
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        store = OrderStore()
+        broker = SimulatedBroker(wallet, store)
+        price_provider = BacktestingPriceProvider(FakeExchange(0, 300 * HOUR), market, broker, "1h", datetime.fromtimestamp(0, timezone.utc), datetime.fromtimestamp(300 * 3600, timezone.utc))
+        equity = Equity(market, wallet, price_provider)
+        strategy = GridStrategy(market, wallet, broker, price_provider)
+        strategy.initialise(1200, 800, 20)
+        broker.addListener(strategy)
+        price_provider.addListener(broker, market)
+        broker.addListener(equity)
+        price_provider.addCandleListener(equity)
+        price_provider.run()
+        return broker, store, equity
+
+    def test_matched_profit(self):
+        broker, store, equity = self.run_backtest()
+        report = BacktestReport.from_backtest(store, equity)
+
+        # profit of every sell order whose closed buy order was filled
+        filled_ids = set(order.id for order in broker.filled_orders)
+        expected = 0
+        round_trips = 0
+        for order in broker.filled_orders:
+            if order.side == Order.Side.SELL and order.closes is not None and order.closes.id in filled_ids:
+                expected += order.qty * order.fill_price() - order.closes.qty * order.closes.fill_price()
+                round_trips += 1
+
+        self.assertGreater(round_trips, 0)
+        self.assertEqual(report.stats["round_trips"], round_trips)
+        self.assertAlmostEqual(report.stats["profit"], expected)
+        self.assertAlmostEqual(report.ledger["cumulative_profit"][-1], expected)
+        self.assertEqual(report.stats["fills"], len(broker.filled_orders))
+        self.assertEqual(report.stats["max_drawdown"], equity.max_drawdown)
+        self.assertEqual(report.stats["end_equity"], equity.candle_samples()[-1, 1])
+        self.assertTrue((numpy.diff(report.ledger["filled"]) >= 0).all())
+
+        matched = report.ledger["matched"]
+        sells = numpy.flatnonzero(matched >= 0)
+        self.assertTrue((report.ledger["id"][matched[sells]] == report.ledger["closes"][sells]).all())
+
+    def test_unfilled_closed_order(self):
+        fills = numpy.zeros(2, dtype=RECORD_DTYPE)
+        fills["id"] = [2, 3]
+        fills["side"] = [Order.Side.SELL.value, Order.Side.BUY.value]
+        fills["qty"] = 1
+        fills["fill_price"] = [110, 100]
+        fills["closes"] = [1, -1]
+        fills["filled"] = [0, HOUR]
+        report = BacktestReport(fills)
+        # order 1 was never filled, so the sell is not a round trip
+        self.assertEqual(report.stats["round_trips"], 0)
+        self.assertEqual(report.stats["profit"], 0)
+        self.assertIsNone(report.stats["end_equity"])
+
+    def test_write(self):
+        broker, store, equity = self.run_backtest()
+        report = BacktestReport.from_backtest(store, equity)
+        with tempfile.TemporaryDirectory() as directory:
+            report.write(directory)
+            self.assertEqual(sorted(os.listdir(directory)), ["equity.csv", "ledger.csv", "report.npz", "stats.json"])
+            with open(os.path.join(directory, "stats.json")) as f:
+                self.assertEqual(json.load(f)["fills"], report.stats["fills"])
+            with numpy.load(os.path.join(directory, "report.npz")) as data:
+                self.assertEqual(data["ledger_profit"].tolist(), report.ledger["profit"].tolist())
@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+import tempfile
+import unittest
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from Broker import BrokerListener
+from CandleStore import CandleStore
+from GridStrategy import GridStrategy
+from Market import Market
+from Order import Order
+from OrderFill import OrderFill
+from PriceProvider import CandleListener, PriceListener
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+MINUTE = 60000
+
+
+class PriceRecorder(PriceListener):
+
+    def __init__(self) -> None:
+        self.prices = []
+
+    def onPriceChanged(self, pair: Market, price: float, timestamp=None):
+        self.prices.append(price)
+
+
+class CandleRecorder(CandleListener):
+
+    def __init__(self) -> None:
+        self.candles = []
+
+    def onCandle(self, pair: Market, timestamp, open: float, high: float, low: float, close: float):
+        self.candles.append((timestamp.timestamp() * 1000, open, high, low, close))
+
+
+class LadderStrategy(BrokerListener):
+    """Places a new buy order 10 below every filled buy order"""
+
+    def __init__(self, broker: SimulatedBroker, market: Market) -> None:
+        self.broker = broker
+        self.market = market
+
+    def onOrderFilled(self, order: Order, fill: OrderFill) -> None:
+        self.broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, order.limit_price - 10)
+
+
+class Test_BacktestingPriceProvider(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        self.broker = SimulatedBroker(Wallet())
+        self.provider = BacktestingPriceProvider(FakeExchange(0, 10 * HOUR), self.market, self.broker, "1h", datetime(1970, 1, 1, tzinfo=timezone.utc), datetime(1970, 1, 2, tzinfo=timezone.utc))
+        self.provider.addListener(self.broker, self.market)
+        self.recorder = PriceRecorder()
+        self.provider.addListener(self.recorder, self.market)
+        return super().setUp()
+
+    def test_simulate_price_movement(self):
+        for price in [95, 90, 92, 85, 40]:
+            self.broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, price)
+        self.broker.createOrder(self.market, 1, Order.Side.SELL, Order.Type.LIMIT, 120)
+
+        self.provider.simulate_price_movement(100, 80, None)
+
+        # one price event at the start and one per crossed limit price, in order
+        self.assertEqual(self.recorder.prices, [100, 95, 92, 90, 85])
+        self.assertEqual([order.limit_price for order in self.broker.filled_orders], [95, 92, 90, 85])
+        self.assertEqual(len(self.broker.open_orders), 2)
+
+    def test_simulate_price_movement_new_orders(self):
+        self.broker.addListener(LadderStrategy(self.broker, self.market))
+        self.broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, 95)
+
+        self.provider.simulate_price_movement(100, 50, None)
+
+        # orders created during the walk are filled as well
+        self.assertEqual(self.recorder.prices, [100, 95, 85, 75, 65, 55])
+        self.assertEqual(self.broker.open_orders[0].limit_price, 45)
+
+    def minute_candles(self, num_candles: int) -> dict:
+        rng = numpy.random.default_rng(3)
+        close = 1000 + numpy.cumsum(rng.normal(0, 2, num_candles))
+        open = numpy.concatenate([[1000], close[:-1]])
+        return {
+            "date": numpy.arange(num_candles, dtype=numpy.int64) * MINUTE,
+            "open": open,
+            "high": numpy.maximum(open, close) + rng.uniform(0, 2, num_candles),
+            "low": numpy.minimum(open, close) - rng.uniform(0, 2, num_candles),
+            "close": close,
+            "volume": numpy.ones(num_candles),
+        }
+
+    def run_grid(self, **kwargs) -> tuple:
+        market = Market("BTC", "USD")
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        broker = SimulatedBroker(wallet)
+        start = datetime.fromtimestamp(0, timezone.utc)
+        timeframe = kwargs.pop("timeframe", "1h")
+        provider = BacktestingPriceProvider(None, market, broker, timeframe, start, datetime.fromtimestamp(10 * 3600, timezone.utc), **kwargs)
+        recorder = CandleRecorder()
+        provider.addCandleListener(recorder)
+        strategy = GridStrategy(market, wallet, broker, provider)
+        strategy.initialise(1100, 900, 2.5)
+        broker.addListener(strategy)
+        provider.addListener(broker, market)
+        provider.run()
+        fills = [(o.get_filled_timestamp(), o.side, o.fill_price(), o.qty) for o in broker.filled_orders]
+        return fills, wallet.tokens, provider, recorder.candles
+
+    def test_intrabar(self):
+        candles = self.minute_candles(600)
+        fills, tokens, provider, hourly = self.run_grid(intrabar_timeframe="1m", intrabar_candles=candles, chunk_size=7)
+
+        # same fills as a backtest on the minute candles
+        expected_fills, expected_tokens, expected_provider, _ = self.run_grid(timeframe="1m", candles=candles)
+        self.assertGreater(len(fills), 10)
+        self.assertEqual(fills, expected_fills)
+        self.assertEqual(tokens, expected_tokens)
+        self.assertEqual(provider.getCurrentPrice(None), expected_provider.getCurrentPrice(None))
+
+        # candle listeners see the hourly candles built from the minute candles
+        self.assertEqual(len(hourly), 10)
+        for i, (time, open, high, low, close) in enumerate(hourly):
+            minutes = slice(i * 60, (i + 1) * 60)
+            self.assertEqual(time, i * HOUR)
+            self.assertEqual(open, candles["open"][i * 60])
+            self.assertEqual(high, candles["high"][minutes].max())
+            self.assertEqual(low, candles["low"][minutes].min())
+            self.assertEqual(close, candles["close"][(i + 1) * 60 - 1])
+        # the hourly candles are only streamed to the listeners
+        self.assertIsNone(provider.candles)
+
+    def test_intrabar_weekly(self):
+        candles = self.minute_candles(21 * 24)
+        candles["date"] = candles["date"] * 60
+        _, _, _, weekly = self.run_grid(timeframe="1w", intrabar_timeframe="1h", intrabar_candles=candles)
+
+        # weekly candles start on Mondays, the epoch was a Thursday
+        days = [time // (24 * HOUR) for time, *_ in weekly]
+        self.assertEqual(days, [-3, 4, 11, 18])
+        self.assertEqual(weekly[1][1], candles["open"][4 * 24])
+        self.assertEqual(weekly[0][4], candles["close"][4 * 24 - 1])
+
+    def test_intrabar_from_candle_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = CandleStore(directory)
+            store.get_candles(FakeExchange(0, 600 * MINUTE), Market("BTC", "USD"), "1m", 0, 600 * MINUTE)
+            fills, tokens, _, hourly = self.run_grid(candle_store=store, exchange_id="fake", intrabar_timeframe="1m", chunk_size=50)
+            candles = store.load("fake", Market("BTC", "USD"), "1m")
+            expected_fills, expected_tokens, _, _ = self.run_grid(intrabar_timeframe="1m", intrabar_candles=candles)
+            self.assertEqual(fills, expected_fills)
+            self.assertEqual(tokens, expected_tokens)
+            self.assertEqual(len(hourly), 11)
@@ -0,0 +1,53 @@
+import time
+import unittest
+
+from CandleDownloader import CandleDownloader
+from Market import Market
+from RateLimiter import RateLimiter
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_CandleDownloader(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        return super().setUp()
+
+    def test_download(self):
+        exchange = FakeExchange(0, 5000 * HOUR, page_size=100)
+        downloader = CandleDownloader(exchange, max_workers=4, page_size=300)
+
+        candles = downloader.download(self.market, "1h", 10 * HOUR, 2010 * HOUR)
+        self.assertEqual(candles["date"].tolist(), [i * HOUR for i in range(10, 2011)])
+        self.assertEqual(candles["close"][5], exchange.candle(15 * HOUR)[4])
+        # 7 windows of 300 candles, every window needs 3 pages of the exchange
+        self.assertEqual(len(downloader.windows("1h", 10 * HOUR, 2010 * HOUR)), 7)
+        self.assertEqual(exchange.fetch_ohlcv_calls, 21)
+
+    def test_retry(self):
+        exchange = FakeExchange(0, 1000 * HOUR, failures=3)
+        downloader = CandleDownloader(exchange, max_workers=2, page_size=200, retries=3, retry_delay=0)
+        candles = downloader.download(self.market, "1h", 0, 999 * HOUR)
+        self.assertEqual(len(candles["date"]), 1000)
+
+        exchange = FakeExchange(0, 1000 * HOUR, failures=3)
+        downloader = CandleDownloader(exchange, max_workers=1, page_size=200, retries=2, retry_delay=0)
+        self.assertRaises(ConnectionError, downloader.download, self.market, "1h", 0, 999 * HOUR)
+
+    def test_rate_limit(self):
+        exchange = FakeExchange(0, 1000 * HOUR)
+        limiter = RateLimiter(200, capacity=1)
+        downloader = CandleDownloader(exchange, limiter, max_workers=4, page_size=100)
+        started = time.monotonic()
+        candles = downloader.download(self.market, "1h", 0, 1000 * HOUR)
+        # 11 requests at 200 per second, the first one is free
+        self.assertGreaterEqual(time.monotonic() - started, 10 / 200)
+        self.assertEqual(len(candles["date"]), 1001)
+
+    def test_empty_range(self):
+        exchange = FakeExchange(100 * HOUR, 200 * HOUR)
+        candles = CandleDownloader(exchange).download(self.market, "1h", 0, 50 * HOUR)
+        self.assertEqual(len(candles["date"]), 0)
+        self.assertEqual(len(candles["volume"]), 0)
@@ -0,0 +1,87 @@
+import tempfile
+import unittest
+
+import numpy
+
+from CandleStore import CandleStore, timeframe_to_ms
+from Market import Market
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_CandleStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = CandleStore(self.directory.name)
+        self.market = Market("BTC", "USD")
+        self.exchange = FakeExchange(0, 1000 * HOUR, page_size=100)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def test_timeframe_to_ms(self):
+        self.assertEqual(timeframe_to_ms("1m"), 60000)
+        self.assertEqual(timeframe_to_ms("4h"), 4 * HOUR)
+        self.assertRaises(ValueError, timeframe_to_ms, "1x")
+
+    def test_get_candles(self):
+        candles = self.store.get_candles(self.exchange, self.market, "1h", 10 * HOUR, 300 * HOUR)
+        self.assertEqual(len(candles["date"]), 291)
+        self.assertEqual(candles["date"][0], 10 * HOUR)
+        self.assertEqual(candles["date"][-1], 300 * HOUR)
+        self.assertEqual(candles["open"][0], self.exchange.candle(10 * HOUR)[1])
+        self.assertEqual(self.store.covered_ranges("fake", self.market, "1h"), [[10 * HOUR, 300 * HOUR]])
+
+    def test_cached_range_is_offline(self):
+        self.store.get_candles(self.exchange, self.market, "1h", 10 * HOUR, 300 * HOUR)
+
+        # cached range is served without an exchange
+        candles = self.store.get_candles(None, self.market, "1h", 50 * HOUR, 100 * HOUR, "fake")
+        self.assertEqual(len(candles["date"]), 51)
+        # without an exchange, the exchange id of the stored candles must be given
+        self.assertRaises(ValueError, self.store.get_candles, None, self.market, "1h", 50 * HOUR, 100 * HOUR)
+
+    def test_only_gaps_are_downloaded(self):
+        self.store.get_candles(self.exchange, self.market, "1h", 100 * HOUR, 200 * HOUR)
+        self.store.get_candles(self.exchange, self.market, "1h", 300 * HOUR, 400 * HOUR)
+
+        self.assertEqual(self.store.missing_ranges("fake", self.market, "1h", 0, 500 * HOUR),
+                         [[0, 100 * HOUR - 1], [200 * HOUR + 1, 300 * HOUR - 1], [400 * HOUR + 1, 500 * HOUR]])
+
+        self.exchange.fetch_ohlcv_calls = 0
+        candles = self.store.get_candles(self.exchange, self.market, "1h", 150 * HOUR, 350 * HOUR)
+        self.assertEqual(self.exchange.fetch_ohlcv_calls, 1)
+        self.assertEqual(len(candles["date"]), 201)
+        self.assertEqual(self.store.covered_ranges("fake", self.market, "1h"), [[100 * HOUR, 400 * HOUR]])
+
+    def test_iter_chunks(self):
+        self.store.get_candles(self.exchange, self.market, "1h", 0, 300 * HOUR)
+        chunks = list(self.store.iter_chunks("fake", self.market, "1h", 10 * HOUR, 40 * HOUR, 8))
+        self.assertEqual([len(chunk["date"]) for chunk in chunks], [8, 8, 8, 7])
+        dates = [date for chunk in chunks for date in chunk["date"].tolist()]
+        self.assertEqual(dates, [i * HOUR for i in range(10, 41)])
+        self.assertEqual(list(self.store.iter_chunks("fake", self.market, "1d", 0, HOUR, 8)), [])
+
+    def test_load_views(self):
+        self.store.get_candles(self.exchange, self.market, "1h", 0, 300 * HOUR)
+        candles = self.store.load("fake", self.market, "1h", 10 * HOUR + 1, 40 * HOUR)
+        self.assertEqual(candles["date"].tolist(), [i * HOUR for i in range(11, 41)])
+
+        # read-only views into the memory mapped column files, no copies
+        everything = self.store.load("fake", self.market, "1h")
+        for column, values in candles.items():
+            self.assertIsInstance(values, numpy.memmap)
+            self.assertFalse(values.flags.writeable)
+            self.assertEqual(values.dtype, numpy.int64 if column == "date" else numpy.float64)
+        self.assertTrue(numpy.array_equal(candles["close"], everything["close"][11:41]))
+        self.assertEqual(len(self.store.load("fake", self.market, "1h", 500 * HOUR, 600 * HOUR)["date"]), 0)
+        self.assertEqual(len(self.store.load("fake", self.market, "1h", 40 * HOUR, 10 * HOUR)["date"]), 0)
+
+        # candles loaded before an update keep their data
+        self.store.get_candles(self.exchange, self.market, "1h", 0, 400 * HOUR)
+        self.assertEqual(len(everything["date"]), 301)
+        self.assertEqual(len(self.store.load("fake", self.market, "1h")["date"]), 401)
@@ -0,0 +1,207 @@
+import math
+import unittest
+
+from Broker import BrokerListener
+from CcxtBroker import CcxtBroker
+from Market import Market
+from Order import Order
+from OrderFill import OrderFill
+from RateLimiter import RateLimiter
+from Wallet import Wallet
+from tests.FakeExchange import FakeTradingExchange
+
+
+class FillRecorder(BrokerListener):
+
+    def __init__(self) -> None:
+        self.fills = []
+
+    def onOrderFilled(self, order: Order, fill: OrderFill) -> None:
+        self.fills.append(order)
+
+
+class Test_CcxtBroker(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        self.wallet = Wallet()
+        self.wallet.setBalance("USD", 10000)
+        self.exchange = FakeTradingExchange()
+        self.exchange.set_price("BTC/USD", 1000)
+        self.broker = CcxtBroker(self.exchange, self.wallet, batch_size=10)
+        self.recorder = FillRecorder()
+        self.broker.addListener(self.recorder)
+        return super().setUp()
+
+    def create_buy_orders(self, num_orders: int) -> list[Order]:
+        return [self.broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, 999 - i) for i in range(num_orders)]
+
+    def test_batches(self):
+        orders = self.create_buy_orders(25)
+        self.broker.cancelOrder(orders[0].id)
+        self.assertEqual(self.exchange.calls["create_orders"], 0)
+
+        # orders canceled before they were sent are never sent
+        self.broker.flush()
+        self.assertEqual(self.exchange.calls["create_orders"], 3)
+        self.assertEqual(len(self.exchange.open("BTC/USD")), 24)
+        self.assertEqual(self.broker.open_orders, orders[1:])
+
+        for order in orders[1:13]:
+            self.broker.cancelOrder(order.id)
+        self.broker.flush()
+        self.assertEqual(self.exchange.calls["cancel_orders"], 2)
+        self.assertEqual(len(self.exchange.open("BTC/USD")), 12)
+
+        self.broker.cancel_all_orders(self.market)
+        self.broker.flush()
+        self.assertEqual(self.exchange.calls["cancel_all_orders"], 1)
+        self.assertEqual(len(self.exchange.open("BTC/USD")), 0)
+        self.assertEqual(self.broker.open_orders, [])
+        self.assertEqual(self.exchange.calls["create_order"] + self.exchange.calls["cancel_order"], 0)
+
+    def test_without_batch_support(self):
+        self.exchange.has = {}
+        orders = self.create_buy_orders(5)
+        self.broker.flush()
+        self.broker.cancel_all_orders(self.market)
+        self.broker.flush()
+        self.assertEqual(self.exchange.calls["create_order"], 5)
+        self.assertEqual(self.exchange.calls["cancel_order"], 5)
+        self.assertEqual(self.broker.open_orders, [])
+
+    def test_fills(self):
+        orders = self.create_buy_orders(20)
+        self.broker.flush()
+
+        # one poll for all fills: one open order and one trade request per market
+        self.exchange.set_price("BTC/USD", 990.5)
+        requests = self.broker.requests
+        self.broker.poll()
+        self.assertEqual(self.broker.requests - requests, 2)
+        self.assertEqual(self.recorder.fills, orders[:9])
+        self.assertEqual(self.broker.open_orders, orders[9:])
+        self.assertEqual(self.wallet.getBalance("BTC"), 9)
+        self.assertEqual(self.wallet.getBalance("USD"), 10000 - sum(999 - i for i in range(9)))
+
+        # nothing new
+        self.broker.poll()
+        self.assertEqual(len(self.recorder.fills), 9)
+
+        # orders canceled outside of the bot
+        self.exchange.cancel_all_orders("BTC/USD")
+        self.broker.poll()
+        self.assertEqual(self.broker.open_orders, [])
+
+    def test_partial_fills(self):
+        # every fill is split into trades of 0.1, more than one page of trades per poll
+        self.exchange.max_fill_qty = 0.1
+        self.broker.trade_limit = 7
+        orders = self.create_buy_orders(5)
+        self.broker.flush()
+        self.exchange.set_price("BTC/USD", 990)
+        self.broker.poll()
+        self.assertEqual(self.recorder.fills, orders)
+        self.assertTrue(math.isclose(self.wallet.getBalance("BTC"), 5))
+        self.assertTrue(all(len(order.fills) == 10 for order in orders))
+
+    def test_delayed_trades(self):
+        for batch in [True, False]:
+            self.exchange.has = {"createOrders": batch, "cancelOrders": batch, "cancelAllOrders": batch, "fetchClosedOrders": batch}
+            self.broker.max_reconcile_polls = 3
+            orders = self.create_buy_orders(5)
+            self.broker.flush()
+            fills = len(self.recorder.fills)
+            btc = self.wallet.getBalance("BTC")
+
+            # the orders are closed before their trades are visible
+            self.exchange.delay_trades = True
+            self.exchange.set_price("BTC/USD", 990)
+            self.broker.poll()
+            self.broker.poll()
+            self.assertEqual(self.broker.open_orders, [])
+            self.assertEqual(len(self.recorder.fills), fills)
+
+            self.exchange.delay_trades = False
+            self.exchange.release_trades()
+            self.broker.poll()
+            self.assertEqual(self.recorder.fills[fills:], orders)
+            self.assertEqual(self.wallet.getBalance("BTC"), btc + 5)
+            self.assertEqual(self.broker._closed, {})
+            self.exchange.set_price("BTC/USD", 1000)
+
+    def test_canceled_orders_are_reconciled(self):
+        self.create_buy_orders(5)
+        self.broker.flush()
+        self.exchange.cancel_all_orders("BTC/USD")
+        self.broker.poll()
+        # confirmed unfilled by fetch_closed_orders
+        self.assertEqual(self.broker._closed, {})
+        self.assertEqual(self.exchange.calls["fetch_closed_orders"], 1)
+
+        # without fetch_closed_orders, closed orders are given up after max_reconcile_polls
+        self.exchange.has["fetchClosedOrders"] = False
+        self.broker.max_reconcile_polls = 2
+        self.create_buy_orders(5)
+        self.broker.flush()
+        self.exchange.cancel_all_orders("BTC/USD")
+        self.broker.poll()
+        self.assertEqual(len(self.broker._closed), 5)
+        with self.assertLogs("CcxtBroker", "WARNING"):
+            self.broker.poll()
+        self.assertEqual(self.broker._closed, {})
+        self.assertEqual(self.wallet.getBalance("USD"), 10000)
+
+    def test_load(self):
+        # a grid of resting orders around a moving price, every fill replaces the order on the other side
+        class Regrid(BrokerListener):
+            def __init__(self, broker: CcxtBroker, market: Market) -> None:
+                self.broker = broker
+                self.market = market
+
+            def onOrderFilled(self, order: Order, fill: OrderFill) -> None:
+                if order.side == Order.Side.BUY:
+                    self.broker.createOrder(self.market, order.qty, Order.Side.SELL, Order.Type.LIMIT, order.limit_price + 1)
+                else:
+                    self.broker.createOrder(self.market, order.qty, Order.Side.BUY, Order.Type.LIMIT, order.limit_price - 1)
+        self.broker.addListener(Regrid(self.broker, self.market))
+
+        self.create_buy_orders(50)
+        for i in range(200):
+            self.broker.flush()
+            self.exchange.set_price("BTC/USD", 975 + 25 * math.sin(i / 5))
+            self.broker.poll()
+
+        # the wallet follows the trades of the exchange, the open orders the open orders of the exchange
+        trades = self.exchange.trades
+        self.assertGreater(len(trades), 200)
+        self.assertEqual(len(self.recorder.fills), len(trades))
+        expected_btc = sum(t["amount"] if t["side"] == "buy" else -t["amount"] for t in trades)
+        self.assertTrue(math.isclose(self.wallet.getBalance("BTC"), expected_btc))
+        self.broker.flush()
+        self.assertEqual(len(self.broker.open_orders), len(self.exchange.open("BTC/USD")))
+        # orders are only ever sent in batches
+        self.assertEqual(self.exchange.calls["create_order"], 0)
+        self.assertLessEqual(self.exchange.calls["create_orders"], 201)
+
+    def test_rate_limit(self):
+        class Clock:
+            now = 0.0
+        clock = Clock()
+
+        def sleep(seconds: float) -> None:
+            clock.now += seconds
+        limiter = RateLimiter(10, clock=lambda: clock.now, sleep=sleep)
+        broker = CcxtBroker(self.exchange, self.wallet, limiter, batch_size=10)
+        # the exchange of the caller is left alone unless asked for
+        self.assertTrue(self.exchange.enableRateLimit)
+        CcxtBroker(self.exchange, self.wallet, limiter, disable_exchange_rate_limit=True)
+        self.assertFalse(self.exchange.enableRateLimit)
+
+        for i in range(30):
+            broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, 900)
+        broker.flush()
+        broker.poll()
+        # 3 batches and 2 poll requests at 10 requests per second, the first one is free
+        self.assertEqual(broker.requests, 5)
+        self.assertAlmostEqual(clock.now, 0.4)
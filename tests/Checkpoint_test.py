@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+import os
+import tempfile
+import unittest
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from CandleDownloader import CandleDownloader
+from Checkpoint import Checkpoint, Checkpointer
+from Equity import Equity
+from GridStrategy import GridStrategy
+from Market import Market
+from OrderJournal import OrderJournal
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+def utc(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, timezone.utc)
+
+
+class Test_Checkpoint(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.candles = CandleDownloader(FakeExchange(0, 300 * HOUR)).download(Market("BTC", "USD"), "1h", 0, 300 * HOUR)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def candles_from(self, start: int) -> dict:
+        keep = self.candles["date"] >= start
+        return {column: values[keep] for column, values in self.candles.items()}
+
+    def run_backtest(self, checkpoint_times: list) -> tuple:
+        """Uninterrupted run with checkpoints, returns the broker, equity, journal and checkpointer"""
+        market = Market("BTC", "USD")
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        journal = OrderJournal(os.path.join(self.directory.name, "journal.bin"), buffer_size=8)
+        broker = SimulatedBroker(wallet, journal, max_filled_orders=50)
+        provider = BacktestingPriceProvider(None, market, broker, "1h", utc(0), utc(300 * HOUR), candles=self.candles)
+        strategy = GridStrategy(market, wallet, broker, provider)
+        strategy.initialise(1200, 800, 20)
+        broker.addListener(strategy)
+        provider.addListener(broker, market)
+        equity = Equity(market, wallet, provider, capacity=4)
+        broker.addListener(equity)
+        provider.addCandleListener(equity)
+        checkpointer = Checkpointer(provider, broker, strategy, equity, checkpoint_times)
+        provider.addCandleListener(checkpointer)
+        provider.run()
+        journal.close()
+        return broker, equity, journal, checkpointer
+
+    def resume(self, checkpoint: Checkpoint, journal_path: str) -> dict:
+        provider = BacktestingPriceProvider(None, Market("BTC", "USD"), None, "1h", checkpoint.timestamp, utc(300 * HOUR), candles=self.candles_from(int(checkpoint.timestamp.timestamp() * 1000)))
+        state = checkpoint.restore(provider, journal_path)
+        provider.run()
+        state["broker"].journal.close()
+        state["provider"] = provider
+        return state
+
+    def test_resume_is_identical(self):
+        # uninterrupted run, with a checkpoint after the candle at 120 h
+        broker, equity, journal, checkpointer = self.run_backtest([utc(120 * HOUR)])
+        wallet = broker.wallet
+
+        path = os.path.join(self.directory.name, "checkpoint.pickle")
+        checkpointer.checkpoints[0].save(path)
+        expected_records = journal.read().copy()
+        expected_wallet = dict(wallet.tokens)
+        expected_filled = [(o.id, o.fill_price(), None if o.closes is None else o.closes.id) for o in broker.filled_orders]
+        expected_open = [(o.id, o.limit_price) for o in broker.open_orders]
+        expected_next_id = SimulatedBroker.next_id
+
+        # resume from the checkpoint on the remaining candles
+        checkpoint = Checkpoint.load(path)
+        self.assertEqual(checkpoint.timestamp, utc(121 * HOUR))
+        state = self.resume(checkpoint, os.path.join(self.directory.name, "resumed.bin"))
+        provider = state["provider"]
+        market = provider.market
+
+        broker = state["broker"]
+        self.assertIs(provider.broker, broker)
+        self.assertIs(state["strategy"].pair, market)
+        self.assertIs(state["strategy"].price_provider, provider)
+        self.assertEqual(provider.candle_listeners, [state["equity"]])
+        self.assertEqual(state["wallet"].tokens, expected_wallet)
+        self.assertEqual([(o.id, o.fill_price(), None if o.closes is None else o.closes.id) for o in broker.filled_orders], expected_filled)
+        self.assertEqual([(o.id, o.limit_price) for o in broker.open_orders], expected_open)
+        self.assertEqual(SimulatedBroker.next_id, expected_next_id)
+        # orders of GridStrategy have no creation timestamp, they are created at the wall clock time
+        fields = [field for field in expected_records.dtype.names if field != "created"]
+        self.assertTrue(numpy.array_equal(broker.journal.read()[fields], expected_records[fields]))
+        self.assertTrue(numpy.array_equal(state["equity"].candle_samples(), equity.candle_samples()))
+        self.assertTrue(numpy.array_equal(state["equity"].fill_samples(), equity.fill_samples()))
+        self.assertEqual(state["equity"].stats(), equity.stats())
+
+    def test_source_journal_is_unchanged(self):
+        # two checkpoints of one run, resumed one after the other
+        broker, equity, journal, checkpointer = self.run_backtest([utc(100 * HOUR), utc(200 * HOUR)])
+        with open(journal.path, "rb") as f:
+            original = f.read()
+        expected = journal.read().copy()
+        fields = [field for field in expected.dtype.names if field != "created"]
+
+        for i, checkpoint in enumerate(checkpointer.checkpoints):
+            path = os.path.join(self.directory.name, "resumed" + str(i) + ".bin")
+            state = self.resume(checkpoint, path)
+            records = state["broker"].journal.read()
+            self.assertEqual(state["broker"].journal.path, path)
+            self.assertTrue(numpy.array_equal(records[fields], expected[fields]))
+            self.assertNotIn(0, records["id"].tolist())
+
+        with open(journal.path, "rb") as f:
+            self.assertEqual(f.read(), original)
+
+        # without a path, the copy is made next to the source journal on the first write
+        state = self.resume(checkpointer.checkpoints[0], None)
+        self.assertEqual(state["broker"].journal.path, journal.path + ".resumed1")
+        with open(journal.path, "rb") as f:
+            self.assertEqual(f.read(), original)
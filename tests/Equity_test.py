@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+import math
+import unittest
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from Equity import Equity
+from GridStrategy import GridStrategy
+from Market import Market
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_Equity(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        self.wallet = Wallet()
+        self.wallet.setBalance("USD", 1000)
+        broker = SimulatedBroker(self.wallet)
+        exchange = FakeExchange(0, 300 * HOUR)
+        self.price_provider = BacktestingPriceProvider(exchange, self.market, broker, "1h", datetime.fromtimestamp(0, timezone.utc), datetime.fromtimestamp(300 * 3600, timezone.utc))
+        self.equity = Equity(self.market, self.wallet, self.price_provider, capacity=4, periods_per_year=24 * 365)
+
+        strategy = GridStrategy(self.market, self.wallet, broker, self.price_provider)
+        strategy.initialise(1200, 800, 20)
+        broker.addListener(strategy)
+        self.price_provider.addListener(broker, self.market)
+        broker.addListener(self.equity)
+        self.price_provider.addCandleListener(self.equity)
+        self.price_provider.run()
+        return super().setUp()
+
+    def test_candle_samples(self):
+        candles = self.price_provider.historic_candles
+        samples = self.equity.candle_samples()
+        self.assertEqual(len(samples), len(candles))
+        self.assertEqual(samples[-1, 0], 300 * HOUR)
+        self.assertEqual(samples[-1, 1], self.wallet.getBalance("USD") + self.wallet.getBalance("BTC") * candles["close"].iloc[-1])
+        self.assertEqual(len(self.equity.fill_samples()), len(self.equity.equity))
+
+    def test_stats(self):
+        samples = self.equity.candle_samples()
+        equity = samples[:, 1]
+        returns = equity[1:] / equity[:-1] - 1
+        periods = 24 * 365
+
+        peaks = numpy.maximum.accumulate(equity)
+        stats = self.equity.stats()
+
+        self.assertGreater(stats["fills"], 0)
+        self.assertAlmostEqual(stats["volatility"], numpy.std(returns, ddof=1) * math.sqrt(periods))
+        self.assertAlmostEqual(stats["sharpe_ratio"], numpy.mean(returns) * periods / (numpy.std(returns, ddof=1) * math.sqrt(periods)))
+        downside = math.sqrt(numpy.mean(numpy.minimum(returns, 0) ** 2) * periods)
+        self.assertAlmostEqual(stats["sortino_ratio"], numpy.mean(returns) * periods / downside)
+        self.assertAlmostEqual(stats["exposure"], numpy.mean(samples[:, 2]))
+        # the drawdown also includes the fill samples
+        self.assertGreaterEqual(stats["max_drawdown"], numpy.max((peaks - equity) / peaks))
+        self.assertEqual(stats["equity"], equity[-1])
+
+    def test_drawdown(self):
+        wallet = Wallet()
+        wallet.setBalance("BTC", 1)
+        equity = Equity(self.market, wallet, self.price_provider)
+        for i, close in enumerate([100, 120, 90, 110, 60, 130]):
+            equity.onCandle(self.market, i * HOUR, close, close, close, close)
+        self.assertEqual(equity.max_drawdown, 0.5)
+        self.assertEqual(equity.drawdown, 0)
+        self.assertEqual(equity.exposure(), 1)
+        self.assertEqual(equity.candle_samples()[:, 0].tolist(), [i * HOUR for i in range(6)])
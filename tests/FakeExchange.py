@@ -0,0 +1,139 @@
+from collections import Counter
+import math
+import threading
+
+from CandleStore import timeframe_to_ms
+
+
+class FakeExchange:
+    """In-process stand-in for a ccxt exchange, serves deterministic synthetic candles"""
+
+    def __init__(self, first_candle: int, last_candle: int, page_size: int = 500, failures: int = 0) -> None:
+        """The first failures calls of fetch_ohlcv raise an exception"""
+        self.id = "fake"
+        self.rateLimit = 0
+        self.first_candle = first_candle
+        self.last_candle = last_candle
+        self.page_size = page_size
+        self.failures = failures
+        self.fetch_ohlcv_calls = 0
+        self._lock = threading.Lock()
+
+    def candle(self, timestamp: int) -> list:
+        price = 1000 + 100 * math.sin(timestamp / 3600000 / 10)
+        return [timestamp, price, price + 15, price - 15, price + 5, 1.0]
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = "1h", since: int = None, limit: int = None) -> list:
+        with self._lock:
+            self.fetch_ohlcv_calls += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("fake network error")
+        timeframe_ms = timeframe_to_ms(timeframe)
+        limit = self.page_size if limit is None else min(limit, self.page_size)
+
+        # first candle opening at or after since
+        timestamp = max(self.first_candle, -(-int(since) // timeframe_ms) * timeframe_ms)
+        result = []
+        while timestamp <= self.last_candle and len(result) < limit:
+            result.append(self.candle(timestamp))
+            timestamp += timeframe_ms
+        return result
+
+
+class FakeTradingExchange:
+    """
+        In-process stand-in for the trading methods of a ccxt exchange. Limit orders are filled at their limit price
+        when set_price crosses them, market orders are filled immediately at the current price.
+    """
+
+    def __init__(self, batch: bool = True, max_fill_qty: float = None) -> None:
+        """Without batch, the exchange has no createOrders, cancelOrders, cancelAllOrders and fetchClosedOrders. Fills
+        are split into trades of at most max_fill_qty"""
+        self.id = "fake"
+        self.rateLimit = 0
+        self.enableRateLimit = True
+        self.has = {"createOrders": batch, "cancelOrders": batch, "cancelAllOrders": batch, "fetchClosedOrders": batch}
+        self.max_fill_qty = max_fill_qty
+        self.prices: dict[str, float] = {}
+        self.orders: dict[str, dict] = {}
+        self.trades: list[dict] = []
+        # with delay_trades, new trades are only returned by fetch_my_trades after release_trades
+        self.delay_trades = False
+        self.delayed_trades: list[dict] = []
+        self.calls = Counter()
+        self.time = 0
+        self._next_id = 1
+
+    def _fill(self, order: dict, price: float) -> None:
+        while order["remaining"] > 0:
+            qty = order["remaining"] if self.max_fill_qty is None or order["remaining"] < self.max_fill_qty * 1.5 else self.max_fill_qty
+            self.time += 1
+            trades = self.delayed_trades if self.delay_trades else self.trades
+            trades.append({"id": str(len(self.trades) + len(self.delayed_trades) + 1), "order": order["id"], "symbol": order["symbol"], "timestamp": self.time,
+                                "side": order["side"], "amount": qty, "price": price, "fee": {"cost": 0.0, "currency": "USD"}})
+            order["remaining"] -= qty
+        order["status"] = "closed"
+
+    def _create(self, symbol: str, type: str, side: str, amount: float, price: float = None) -> dict:
+        order = {"id": "x" + str(self._next_id), "symbol": symbol, "type": type, "side": side, "amount": amount,
+                 "price": price, "remaining": amount, "status": "open"}
+        self._next_id += 1
+        self.orders[order["id"]] = order
+        if type == "market":
+            self._fill(order, self.prices[symbol])
+        return dict(order)
+
+    def create_order(self, symbol: str, type: str, side: str, amount: float, price: float = None, params: dict = {}) -> dict:
+        self.calls["create_order"] += 1
+        return self._create(symbol, type, side, amount, price)
+
+    def create_orders(self, orders: list[dict], params: dict = {}) -> list[dict]:
+        self.calls["create_orders"] += 1
+        return [self._create(o["symbol"], o["type"], o["side"], o["amount"], o.get("price")) for o in orders]
+
+    def _cancel(self, id: str) -> dict:
+        order = self.orders.get(id)
+        if order is None or order["status"] != "open":
+            raise ValueError("order not found " + id)
+        order["status"] = "canceled"
+        return dict(order)
+
+    def cancel_order(self, id: str, symbol: str = None, params: dict = {}) -> dict:
+        self.calls["cancel_order"] += 1
+        return self._cancel(id)
+
+    def cancel_orders(self, ids: list[str], symbol: str = None, params: dict = {}) -> list[dict]:
+        self.calls["cancel_orders"] += 1
+        return [self._cancel(id) for id in ids]
+
+    def cancel_all_orders(self, symbol: str = None, params: dict = {}) -> list[dict]:
+        self.calls["cancel_all_orders"] += 1
+        return [self._cancel(o["id"]) for o in self.open(symbol)]
+
+    def open(self, symbol: str) -> list[dict]:
+        return [o for o in self.orders.values() if o["status"] == "open" and o["symbol"] == symbol]
+
+    def set_price(self, symbol: str, price: float) -> None:
+        self.time += 1000
+        self.prices[symbol] = price
+        for order in self.open(symbol):
+            if (order["side"] == "buy" and price <= order["price"]) or (order["side"] == "sell" and price >= order["price"]):
+                self._fill(order, order["price"])
+
+    def fetch_open_orders(self, symbol: str = None, since: int = None, limit: int = None, params: dict = {}) -> list[dict]:
+        self.calls["fetch_open_orders"] += 1
+        return [dict(o) for o in self.open(symbol)]
+
+    def release_trades(self) -> None:
+        self.trades += self.delayed_trades
+        self.delayed_trades = []
+
+    def fetch_closed_orders(self, symbol: str = None, since: int = None, limit: int = None, params: dict = {}) -> list[dict]:
+        self.calls["fetch_closed_orders"] += 1
+        return [dict(o, filled=o["amount"] - o["remaining"]) for o in self.orders.values() if o["status"] != "open" and o["symbol"] == symbol]
+
+    def fetch_my_trades(self, symbol: str = None, since: int = None, limit: int = None, params: dict = {}) -> list[dict]:
+        self.calls["fetch_my_trades"] += 1
+        trades = [t for t in self.trades if t["symbol"] == symbol and (since is None or t["timestamp"] >= since)]
+        return trades[:limit]
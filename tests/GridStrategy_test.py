@@ -1,9 +1,87 @@
+from datetime import datetime, timezone
 import unittest
 
+from BacktestingPriceProvider import BacktestingPriceProvider
+from CandleDownloader import CandleDownloader
 from GridStrategy import GridStrategy
+from Market import Market
+from Order import Order
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class CountingBroker(SimulatedBroker):
+    """Counts the order operations of the strategy"""
+
+    def __init__(self, wallet: Wallet) -> None:
+        super().__init__(wallet)
+        self.created = 0
+        self.canceled = 0
+
+    def createOrder(self, *args, **kwargs) -> Order:
+        self.created += 1
+        return super().createOrder(*args, **kwargs)
+
+    def cancelOrder(self, order_id: int):
+        self.canceled += 1
+        super().cancelOrder(order_id)
+
+    def cancel_all_orders(self, market: Market):
+        self.canceled += len(self.books.get(market, []))
+        super().cancel_all_orders(market)
 
 
 class GridStrategy_Test(unittest.TestCase):
     
     def setUp(self) -> None:
+        self.candles = CandleDownloader(FakeExchange(0, 500 * HOUR)).download(Market("BTC", "USD"), "1h", 0, 500 * HOUR)
         return super().setUp()
+
+    def run_strategy(self, resting_orders: int = None) -> tuple:
+        market = Market("BTC", "USD")
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        broker = CountingBroker(wallet)
+        provider = BacktestingPriceProvider(None, market, broker, "1h", datetime.fromtimestamp(0, timezone.utc), datetime.fromtimestamp(500 * 3600, timezone.utc), candles=self.candles)
+        strategy = GridStrategy(market, wallet, broker, provider, resting_orders)
+        strategy.initialise(1150, 850, 10)
+        broker.addListener(strategy)
+        provider.addListener(broker, market)
+        provider.run()
+        return strategy, broker
+
+    def test_single_resting_order_is_unchanged(self):
+        # one resting order per side places the same orders as canceling all orders on every fill
+        expected_strategy, expected_broker = self.run_strategy()
+        strategy, broker = self.run_strategy(1)
+
+        def fills(broker):
+            return [(o.side, o.limit_price, o.qty, o.fill_price(), None if o.closes is None else o.closes.limit_price) for o in broker.filled_orders]
+        self.assertGreater(len(broker.filled_orders), 10)
+        self.assertEqual(fills(broker), fills(expected_broker))
+        self.assertEqual(strategy.wallet.tokens, expected_strategy.wallet.tokens)
+        # orders that are already resting are kept
+        self.assertLessEqual(broker.created, expected_broker.created)
+        self.assertLessEqual(broker.canceled, expected_broker.canceled)
+
+    def test_resting_orders(self):
+        strategy, broker = self.run_strategy(5)
+        fills = [o for o in broker.filled_orders if o.type == Order.Type.LIMIT]
+        self.assertGreater(len(fills), 10)
+
+        # 5 orders on each side of the last fill
+        idx = strategy.grid.get_grid_index(fills[-1].limit_price)
+        lines = strategy.grid.grid_lines
+        open_orders = broker.open_orders
+        self.assertEqual(sorted(o.limit_price for o in open_orders if o.side == Order.Side.BUY), sorted(lines[idx + 1:idx + 6]))
+        self.assertEqual(sorted(o.limit_price for o in open_orders if o.side == Order.Side.SELL), sorted(lines[idx - 5:idx]))
+        self.assertEqual(sorted(o.id for o in strategy.orders.values()), [o.id for o in open_orders])
+
+        # a fill next to the last one moves the window by one line: at most one cancel and two new orders
+        self.assertLessEqual(broker.canceled, len(fills))
+        self.assertLessEqual(broker.created, 2 * len(fills) + 11)
+
+        self.assertRaises(ValueError, GridStrategy, strategy.pair, strategy.wallet, broker, None, 0)
@@ -0,0 +1,76 @@
+import unittest
+
+import numpy
+
+from CandleStore import COLUMNS
+from GridSweep import GridSweep, max_drawdown, run_grid_backtest
+from Market import Market
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_GridSweep(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        rows = FakeExchange(0, 500 * HOUR, page_size=1000).fetch_ohlcv("BTC/USD", "1h", since=0)
+        data = numpy.array(rows)
+        self.candles = {column: data[:, i] for i, column in enumerate(COLUMNS)}
+        self.candles["date"] = self.candles["date"].astype(numpy.int64)
+        return super().setUp()
+
+    def test_profit_without_initial_buy(self):
+        # the price rises first, the initial sell order is filled and the initial buy order is canceled unfilled
+        closes = numpy.concatenate([numpy.linspace(1010, 1130, 30), numpy.linspace(1130, 870, 60), numpy.linspace(870, 1080, 50)])
+        opens = numpy.concatenate([[1010], closes[:-1]])
+        candles = {"date": numpy.arange(len(closes), dtype=numpy.int64) * HOUR, "open": opens, "high": numpy.maximum(opens, closes) + 5,
+                   "low": numpy.minimum(opens, closes) - 5, "close": closes, "volume": numpy.ones(len(closes))}
+        results = {}
+        for vectorized in [False, True]:
+            sweep = GridSweep(self.market, "1h", candles, {"USD": 1000}, max_workers=1, vectorized=vectorized)
+            results[vectorized] = sweep.run([1200, 1150], [800], [20, 50]).sort_values(["upper_price", "price_step"]).reset_index(drop=True)
+        numpy.testing.assert_allclose(results[True]["profit"], results[False]["profit"])
+        numpy.testing.assert_array_equal(results[True]["fills"], results[False]["fills"])
+
+        # only round trips count, each earns at most one grid step on the position size per grid line
+        results = results[False]
+        size_per_grid = 1100 / ((results["upper_price"] - 800) / results["price_step"] + 1)
+        self.assertTrue((results["profit"] > 0).all())
+        self.assertTrue((results["profit"] < results["fills"] * size_per_grid * results["price_step"] / 800).all())
+
+    def test_max_drawdown(self):
+        self.assertEqual(max_drawdown(numpy.array([100.0, 120, 90, 110, 60, 130])), 0.5)
+        self.assertEqual(max_drawdown(numpy.array([100.0, 110])), 0)
+        # no division by a zero peak
+        self.assertEqual(max_drawdown(numpy.array([0.0, 0, 50, 25])), 0.5)
+        self.assertEqual(max_drawdown(numpy.zeros(3)), 0)
+
+    def test_parameter_sets(self):
+        params = GridSweep.parameter_sets([1000, 1200], [900, 1100], [20])
+        self.assertEqual(params, [(1000, 900, 20), (1200, 900, 20), (1200, 1100, 20)])
+
+    def test_run(self):
+        sweep = GridSweep(self.market, "1h", self.candles, {"USD": 1000}, max_workers=2)
+        results = sweep.run([1200, 1150], [800], [20, 50])
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue((results["fills"] > 0).all())
+
+        # results of the pool match a backtest in this process
+        expected = run_grid_backtest(self.market, "1h", self.candles, {"USD": 1000}, 1150, 800, 50)
+        row = results[(results["upper_price"] == 1150) & (results["price_step"] == 50)].iloc[0]
+        self.assertAlmostEqual(row["final_equity"], expected["final_equity"])
+        self.assertEqual(row["fills"], expected["fills"])
+        self.assertAlmostEqual(row["max_drawdown"], expected["max_drawdown"])
+
+    def test_vectorized(self):
+        for params in [(1200, 800, 20), (1150, 800, 50)]:
+            expected = run_grid_backtest(self.market, "1h", self.candles, {"USD": 1000}, *params)
+            result = run_grid_backtest(self.market, "1h", self.candles, {"USD": 1000}, *params, vectorized=True)
+            self.assertEqual(result["fills"], expected["fills"])
+            self.assertAlmostEqual(result["final_equity"], expected["final_equity"])
+            self.assertAlmostEqual(result["profit"], expected["profit"])
+            self.assertAlmostEqual(result["max_drawdown"], expected["max_drawdown"])
+            self.assertAlmostEqual(result["sharpe_ratio"], expected["sharpe_ratio"])
+            self.assertNotEqual(result["sharpe_ratio"], 0)
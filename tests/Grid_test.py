@@ -68,4 +68,50 @@ class GridStrategy_Test(unittest.TestCase):
         self.assertEqual(grid.price_above(1000), 1000)
         self.assertEqual(grid.price_above(100), 1000)
         
-        self.assertRaises(ValueError, grid.price_above, 2100)
\ No newline at end of file
+        self.assertRaises(ValueError, grid.price_above, 2100)
+
+    def test_get_grid_index(self):
+        # grid lines are not multiples of the price step: [1150, 1130, ..., 830, 810]
+        grid = Grid(1150, 800, 20)
+        self.assertEqual(grid.get_grid_index(1150), 0)
+        self.assertEqual(grid.get_grid_index(990), 8)
+        self.assertEqual(grid.get_grid_index(810), 17)
+        self.assertEqual(grid.get_grid_index(100), 17)
+        self.assertEqual(grid.price_below(1000), 990)
+        self.assertEqual(grid.price_above(1000), 1010)
+
+    def test_no_drift(self):
+        # repeated subtraction of 0.1 drifts, every level is computed from its index
+        grid = Grid(10000, 0, 0.1)
+        self.assertEqual(len(grid.grid_lines), 100001)
+        self.assertEqual(grid.grid_lines[50000], 10000 - 50000 * 0.1)
+        self.assertEqual(grid.get_grid_index(5000), 50000)
+        self.assertEqual(grid.num_gridlines_below(5000.05), 50001)
+        self.assertEqual(list(grid.levels), sorted(grid.grid_lines))
+
+    def test_geometric(self):
+        # every level 10 % above the next lower one: 1331, 1210, 1100, 1000
+        grid = Grid.geometric(1331, 1000, 0.1)
+        self.assertEqual(len(grid.grid_lines), 4)
+        for i, expected in enumerate([1331, 1210, 1100, 1000]):
+            self.assertAlmostEqual(grid.grid_lines[i], expected)
+        self.assertAlmostEqual(grid.price_below(1200), 1100)
+        self.assertAlmostEqual(grid.price_above(1200), 1210)
+        self.assertEqual(grid.get_grid_index(1160), 1)
+        self.assertEqual(grid.get_grid_index(1140), 2)
+        self.assertEqual(grid.num_gridlines_above(1200), 2)
+        self.assertRaises(ValueError, Grid.geometric, 1000, 2000, 0.1)
+
+    def test_from_levels(self):
+        grid = Grid.from_levels([1000, 2500, 1200, 1000, 4000])
+        self.assertEqual(grid.grid_lines, [4000, 2500, 1200, 1000])
+        self.assertEqual(grid.upper_price, 4000)
+        self.assertEqual(grid.lower_price, 1000)
+        self.assertEqual(grid.price_below(2499), 1200)
+        self.assertEqual(grid.price_above(2499), 2500)
+        self.assertEqual(grid.num_gridlines_below(2500), 3)
+        self.assertEqual(grid.num_gridlines_above(1100), 3)
+        self.assertEqual(grid.get_grid_index(3000), 1)
+        self.assertEqual(grid.get_grid_index(3500), 0)
+        self.assertRaises(ValueError, grid.price_below, 999)
+        self.assertRaises(ValueError, Grid.from_levels, [])
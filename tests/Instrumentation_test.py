@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from Equity import Equity
+from GridStrategy import GridStrategy
+from Instrumentation import _NUM_BUCKETS, Instrumentation, InstrumentedListener, _Timer
+from Market import Market
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_Instrumentation(unittest.TestCase):
+
+    def run_backtest(self, instrumentation: Instrumentation = None):
+        market = Market("BTC", "USD")
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        broker = SimulatedBroker(wallet)
+        price_provider = BacktestingPriceProvider(FakeExchange(0, 100 * HOUR), market, broker, "1h", datetime.fromtimestamp(0, timezone.utc), datetime.fromtimestamp(100 * 3600, timezone.utc))
+        equity = Equity(market, wallet, price_provider)
+        strategy = GridStrategy(market, wallet, broker, price_provider)
+        strategy.initialise(1200, 800, 20)
+        broker.addListener(strategy)
+        price_provider.addListener(broker, market)
+        broker.addListener(equity)
+        price_provider.addCandleListener(equity)
+        if instrumentation is not None:
+            instrumentation.install(price_provider, broker)
+        price_provider.run()
+        return broker, equity, price_provider
+
+    def test_same_result(self):
+        instrumentation = Instrumentation()
+        broker, equity, price_provider = self.run_backtest(instrumentation)
+        expected_broker, expected_equity, _ = self.run_backtest()
+
+        self.assertEqual([order.fill_price() for order in broker.filled_orders], [order.fill_price() for order in expected_broker.filled_orders])
+        self.assertEqual(equity.stats(), expected_equity.stats())
+        self.assertIsInstance(price_provider.listeners[price_provider.market][0], InstrumentedListener)
+
+        stats = instrumentation.to_dict()
+        listeners = stats["listeners"]
+        fills = len(broker.filled_orders) - 1  # the initial market order is not notified
+        self.assertEqual(listeners["GridStrategy.onOrderFilled"]["calls"], fills)
+        self.assertEqual(listeners["Equity.onOrderFilled"]["calls"], fills)
+        self.assertEqual(listeners["Equity.onCandle"]["calls"], 101)
+        self.assertEqual(listeners["SimulatedBroker.onPriceChanged"]["calls"], stats["price_events"])
+        self.assertGreaterEqual(stats["price_events"], 3 * 101)
+        self.assertLessEqual(listeners["SimulatedBroker.onPriceChanged"]["p50_us"], listeners["SimulatedBroker.onPriceChanged"]["p99_us"])
+
+        candles = stats["candles"]
+        self.assertEqual(len(candles), 101)
+        self.assertEqual(sum(c["price_events"] for c in candles), stats["price_events"])
+        self.assertEqual(candles[-1]["time"], 100 * HOUR)
+        self.assertEqual(stats["max_open_orders"], 2)
+
+    def test_dump(self):
+        instrumentation = Instrumentation()
+        self.run_backtest(instrumentation)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.json")
+            instrumentation.dump(path)
+            with open(path) as f:
+                self.assertIn("SimulatedBroker.onPriceChanged", json.load(f)["listeners"])
+
+    def test_percentiles(self):
+        durations = [int(d) for d in numpy.random.default_rng(1).lognormal(10, 1, 10000)]
+        clock = iter(value for d in durations for value in (0, d))
+        timer = _Timer()
+        with unittest.mock.patch("time.perf_counter_ns", lambda: next(clock)):
+            timed = timer.wrap(lambda: None)
+            for _ in durations:
+                timed()
+
+        # the histogram has a fixed size, percentiles are within half a bucket of the exact value
+        self.assertEqual(len(timer.counts), _NUM_BUCKETS)
+        stats = timer.stats(1.0)
+        self.assertEqual(stats["calls"], len(durations))
+        self.assertEqual(stats["max_us"], max(durations) / 1e3)
+        for q in [50, 99]:
+            self.assertAlmostEqual(stats["p" + str(q) + "_us"] * 1e3 / numpy.percentile(durations, q), 1, delta=0.07)
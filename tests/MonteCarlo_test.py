@@ -0,0 +1,83 @@
+import unittest
+
+import numpy
+
+from CandleDownloader import CandleDownloader
+from GridSweep import run_grid_backtest
+from Market import Market
+from MonteCarlo import BootstrapPaths, MonteCarlo, PathGenerator, Regime, RegimeSwitchingGBM
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_MonteCarlo(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        self.candles = CandleDownloader(FakeExchange(0, 500 * HOUR)).download(self.market, "1h", 0, 500 * HOUR)
+        return super().setUp()
+
+    def assertValidCandles(self, candles: dict, num_candles: int, start_price: float) -> None:
+        self.assertEqual(len(candles["date"]), num_candles)
+        self.assertTrue(numpy.all(numpy.diff(candles["date"]) == HOUR))
+        self.assertAlmostEqual(candles["open"][0], start_price)
+        self.assertTrue(numpy.all(candles["high"] >= numpy.maximum(candles["open"], candles["close"]) * (1 - 1e-12)))
+        self.assertTrue(numpy.all(candles["low"] <= numpy.minimum(candles["open"], candles["close"]) * (1 + 1e-12)))
+
+    def test_path_generator_is_abstract(self):
+        self.assertRaises(TypeError, PathGenerator, "1h", 100, 1000)
+
+    def test_bootstrap(self):
+        generator = BootstrapPaths(self.candles, "1h", block_size=24, num_candles=1000, seed=1)
+        path = generator.candles(0)
+        self.assertValidCandles(path, 1000, self.candles["open"][0])
+
+        # paths only depend on the seed and their index
+        self.assertTrue(numpy.array_equal(BootstrapPaths(self.candles, "1h", 24, 1000, seed=1).candles(0)["close"], path["close"]))
+        self.assertFalse(numpy.array_equal(generator.candles(1)["close"], path["close"]))
+        self.assertEqual(len(list(generator.paths(3))), 3)
+
+        # one block of the whole history is the history
+        history = BootstrapPaths(self.candles, "1h", block_size=len(self.candles["date"]), seed=1).candles(0)
+        for column in ["open", "high", "low", "close"]:
+            self.assertTrue(numpy.allclose(history[column], self.candles[column]))
+
+        self.assertRaises(ValueError, BootstrapPaths, self.candles, "1h", 1000)
+
+    def test_gbm(self):
+        calm, volatile = Regime(0, 0.2, 50), Regime(0, 2.0, 50)
+        generator = RegimeSwitchingGBM([calm, volatile], "1h", 5000, 1000, seed=2)
+        rng = generator.random(0)
+        regimes = generator.regime_sequence(rng)
+        self.assertEqual(set(regimes.tolist()), {0, 1})
+        # mean duration of the regimes
+        self.assertAlmostEqual(5000 / (numpy.count_nonzero(numpy.diff(regimes)) + 1), 50, delta=10)
+
+        path = generator.candles(0)
+        self.assertValidCandles(path, 5000, 1000)
+        self.assertTrue(numpy.array_equal(path["open"][1:], path["close"][:-1]))
+
+        # the volatility of the candles follows the regime
+        regimes = generator.regime_sequence(generator.random(0))
+        returns = numpy.log(path["close"] / path["open"])
+        self.assertGreater(returns[regimes == 1].std(), 5 * returns[regimes == 0].std())
+
+    def test_run(self):
+        generator = BootstrapPaths(self.candles, "1h", seed=3)
+        monte_carlo = MonteCarlo(generator, self.market, {"USD": 1000}, max_workers=2, vectorized=True)
+        results = monte_carlo.run(1200, 800, 20, 8)
+        self.assertEqual(results["path"].tolist(), list(range(8)))
+
+        # results of the pool match a backtest of the same path in this process
+        expected = run_grid_backtest(self.market, "1h", generator.candles(5), {"USD": 1000}, 1200, 800, 20)
+        self.assertEqual(results["fills"][5], expected["fills"])
+        self.assertAlmostEqual(results["final_equity"][5], expected["final_equity"])
+
+        summary = monte_carlo.summary(results, ruin_drawdown=0.1)
+        self.assertEqual(summary["paths"], 8)
+        self.assertEqual(summary["initial_equity"], 1000)
+        self.assertAlmostEqual(summary["final_equity_p50"], results["final_equity"].median())
+        self.assertLessEqual(summary["final_equity_p5"], summary["final_equity_p95"])
+        self.assertEqual(summary["probability_of_ruin"], (results["max_drawdown"] >= 0.1).mean())
+        self.assertEqual(summary["probability_of_loss"], (results["final_equity"] < 1000).mean())
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+import unittest
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from CandleStore import COLUMNS
+from GridStrategy import GridStrategy
+from Market import Market
+from MultiMarketBacktestingPriceProvider import MultiMarketBacktestingPriceProvider
+from PriceProvider import CandleListener
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+DATE = datetime.fromtimestamp(0, timezone.utc)
+
+
+def fake_candles(first_candle: int, last_candle: int, scale: float = 1) -> dict:
+    data = numpy.array(FakeExchange(first_candle, last_candle, page_size=10000).fetch_ohlcv("", "1h", since=first_candle))
+    candles = {column: data[:, i] for i, column in enumerate(COLUMNS)}
+    candles["date"] = candles["date"].astype(numpy.int64)
+    for column in ["open", "high", "low", "close"]:
+        candles[column] = candles[column] * scale
+    return candles
+
+
+class CandleRecorder(CandleListener):
+
+    def __init__(self) -> None:
+        self.candles = []
+
+    def onCandle(self, pair: Market, timestamp, open: float, high: float, low: float, close: float):
+        self.candles.append((timestamp.timestamp() * 1000, pair.get_market()))
+
+
+class Test_MultiMarketBacktestingPriceProvider(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.btc = Market("BTC", "USD")
+        self.eth = Market("ETH", "EUR")
+        self.candles = {self.btc: fake_candles(0, 200 * HOUR), self.eth: fake_candles(50 * HOUR, 250 * HOUR, 0.1)}
+        return super().setUp()
+
+    def run_single(self, market: Market, upper: float, lower: float, step: float) -> list:
+        wallet = Wallet()
+        wallet.setBalance(market.quote_currency, 1000)
+        broker = SimulatedBroker(wallet)
+        price_provider = BacktestingPriceProvider(None, market, broker, "1h", DATE, DATE, candles=self.candles[market])
+        strategy = GridStrategy(market, wallet, broker, price_provider)
+        strategy.initialise(upper, lower, step)
+        broker.addListener(strategy)
+        price_provider.addListener(broker, market)
+        price_provider.run()
+        return [(o.get_filled_timestamp(), o.side, o.fill_price(), o.qty) for o in broker.filled_orders], wallet
+
+    def test_shared_broker(self):
+        # markets with separate currencies share the wallet without affecting each other
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        wallet.setBalance("EUR", 1000)
+        broker = SimulatedBroker(wallet)
+        price_provider = MultiMarketBacktestingPriceProvider(None, [self.btc, self.eth], broker, "1h", DATE, DATE, candles=self.candles)
+        recorder = CandleRecorder()
+        price_provider.addCandleListener(recorder)
+        for market, grid in [(self.btc, (1200, 800, 20)), (self.eth, (120, 80, 2))]:
+            strategy = GridStrategy(market, wallet, broker, price_provider)
+            strategy.initialise(*grid)
+            broker.addListener(strategy)
+            price_provider.addListener(broker, market)
+        price_provider.run()
+
+        btc_fills, btc_wallet = self.run_single(self.btc, 1200, 800, 20)
+        eth_fills, eth_wallet = self.run_single(self.eth, 120, 80, 2)
+        fills = [(o.get_filled_timestamp(), o.side, o.fill_price(), o.qty) for o in broker.filled_orders]
+        self.assertEqual([f for o, f in zip(broker.filled_orders, fills) if o.market is self.btc], btc_fills)
+        self.assertEqual([f for o, f in zip(broker.filled_orders, fills) if o.market is self.eth], eth_fills)
+        self.assertEqual(wallet.getBalance("BTC"), btc_wallet.getBalance("BTC"))
+        self.assertEqual(wallet.getBalance("ETH"), eth_wallet.getBalance("ETH"))
+        self.assertEqual(wallet.getBalance("EUR"), eth_wallet.getBalance("EUR"))
+        self.assertEqual(sorted(set(o.market.get_market() for o in broker.filled_orders)), ["BTC/USD", "ETH/EUR"])
+
+        # candles are replayed in time order, ties in market order
+        self.assertEqual(len(recorder.candles), 201 + 201)
+        self.assertEqual(recorder.candles, sorted(recorder.candles, key=lambda c: (c[0], c[1] != "BTC/USD")))
+        self.assertEqual(price_provider.getCurrentPrice(self.eth) < 200, True)
+
+    def test_requires_candles(self):
+        self.assertRaises(ValueError, MultiMarketBacktestingPriceProvider, None, [self.btc], SimulatedBroker(Wallet()), "1h", DATE, DATE)
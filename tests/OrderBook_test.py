@@ -0,0 +1,88 @@
+import unittest
+
+from Market import Market
+from Order import Order
+from OrderBook import OrderBook
+
+
+class Test_OrderBook(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        self.book = OrderBook()
+        self.next_id = 1
+        return super().setUp()
+
+    def add(self, side: Order.Side, limit_price: float, type: Order.Type = Order.Type.LIMIT) -> Order:
+        order = Order(self.market, 1, side, type, limit_price)
+        order.id = self.next_id
+        self.next_id += 1
+        self.book.add(order)
+        return order
+
+    def test_best_prices(self):
+        self.assertIsNone(self.book.best_buy_price())
+        self.assertIsNone(self.book.best_sell_price())
+
+        self.add(Order.Side.BUY, 90)
+        self.add(Order.Side.BUY, 95)
+        self.add(Order.Side.SELL, 110)
+        self.add(Order.Side.SELL, 105)
+        self.assertEqual(self.book.best_buy_price(), 95)
+        self.assertEqual(self.book.best_sell_price(), 105)
+
+    def test_pop_crossing(self):
+        buy_90 = self.add(Order.Side.BUY, 90)
+        buy_95 = self.add(Order.Side.BUY, 95)
+        sell_105 = self.add(Order.Side.SELL, 105)
+        market = self.add(Order.Side.BUY, 0, Order.Type.MARKET)
+
+        # market orders are always crossed
+        self.assertEqual(self.book.pop_crossing(100), [market])
+
+        # buy orders crossed at or below their limit price, sorted by id
+        self.assertEqual(self.book.pop_crossing(96), [])
+        self.assertEqual(self.book.pop_crossing(90), [buy_90, buy_95])
+        self.assertEqual(self.book.pop_crossing(105), [sell_105])
+        self.assertEqual(len(self.book), 0)
+
+    def test_crossing(self):
+        buy_90 = self.add(Order.Side.BUY, 90)
+        sell_105 = self.add(Order.Side.SELL, 105)
+        self.add(Order.Side.SELL, 110)
+
+        self.assertEqual(self.book.crossing(95, 100), [])
+        self.assertEqual(self.book.crossing(90, 105), [buy_90, sell_105])
+        self.assertEqual(len(self.book), 3)
+
+    def test_remove(self):
+        buy = self.add(Order.Side.BUY, 90)
+        self.add(Order.Side.BUY, 90)
+        sell = self.add(Order.Side.SELL, 105)
+
+        self.assertEqual(self.book.remove(buy.id), buy)
+        self.assertIsNone(self.book.remove(buy.id))
+        self.assertEqual(self.book.remove(sell.id), sell)
+        self.assertEqual([order.id for order in self.book.pop_crossing(50)], [2])
+
+    def test_next_fill_price(self):
+        self.assertIsNone(self.book.next_fill_price(100, 50))
+
+        self.add(Order.Side.BUY, 90)
+        self.add(Order.Side.BUY, 80)
+        self.add(Order.Side.SELL, 110)
+
+        # falling price fills the highest buy order within reach first
+        self.assertEqual(self.book.next_fill_price(100, 85), 90)
+        self.assertIsNone(self.book.next_fill_price(100, 95))
+
+        # rising price fills the lowest sell order within reach first
+        self.assertEqual(self.book.next_fill_price(100, 120), 110)
+        self.assertIsNone(self.book.next_fill_price(100, 105))
+
+        # orders that are already crossed at the current price are filled first
+        self.add(Order.Side.BUY, 105)
+        self.assertEqual(self.book.next_fill_price(100, 105), 105)
+
+        self.add(Order.Side.BUY, 0, Order.Type.MARKET)
+        self.assertEqual(self.book.next_fill_price(100, 100), 105)
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+import os
+import tempfile
+import unittest
+
+from Market import Market
+from Order import Order
+from OrderJournal import RECORD_DTYPE, OrderJournal
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+
+
+class Test_OrderJournal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal.bin")
+        self.market = Market("BTC", "USD")
+        self.wallet = Wallet()
+        self.wallet.setBalance("USD", 1000)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def test_broker_writes_filled_orders(self):
+        journal = OrderJournal(self.path, buffer_size=2)
+        broker = SimulatedBroker(self.wallet, journal, max_filled_orders=2)
+
+        timestamp = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        buy = broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, 100)
+        sell = broker.createOrder(self.market, 1, Order.Side.SELL, Order.Type.LIMIT, 120, closes=buy)
+        broker.createOrder(self.market, 0.5)
+        broker.onPriceChanged(self.market, 110, timestamp)
+        broker.onPriceChanged(self.market, 100, timestamp)
+        broker.onPriceChanged(self.market, 120, timestamp)
+
+        # only the most recent orders are kept in memory
+        self.assertEqual(list(broker.filled_orders), [buy, sell])
+
+        records = journal.read()
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records["id"].tolist()[1:], [buy.id, sell.id])
+        self.assertEqual(records["type"].tolist(), [Order.Type.MARKET.value, Order.Type.LIMIT.value, Order.Type.LIMIT.value])
+        self.assertEqual(records["fill_price"].tolist(), [110, 100, 120])
+        self.assertEqual(records["filled"].tolist(), [1640995200000] * 3)
+        self.assertEqual(records["closes"].tolist(), [-1, -1, buy.id])
+        self.assertEqual(records["closes_value"][2], 100)
+
+        journal.close()
+        reopened = OrderJournal(self.path, "r")
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual(reopened.read().tobytes(), records.tobytes())
+        self.assertEqual([m.get_market() for m in reopened.markets()], ["BTC/USD"])
+
+    def test_append_mode(self):
+        with OrderJournal(self.path) as journal:
+            broker = SimulatedBroker(self.wallet, journal)
+            broker.createOrder(self.market, 1)
+            broker.onPriceChanged(self.market, 100)
+
+        with OrderJournal(self.path, "a") as journal:
+            broker = SimulatedBroker(self.wallet, journal)
+            broker.createOrder(self.market, 1, Order.Side.SELL)
+            broker.onPriceChanged(self.market, 100)
+            self.assertEqual(journal.read()["side"].tolist(), [Order.Side.BUY.value, Order.Side.SELL.value])
+
+        self.assertEqual(os.path.getsize(self.path), 2 * RECORD_DTYPE.itemsize)
+
+    def test_empty(self):
+        journal = OrderJournal(self.path)
+        self.assertEqual(len(journal.read()), 0)
+        self.assertRaises(ValueError, OrderJournal, self.path, "x")
@@ -0,0 +1,40 @@
+import unittest
+
+from Market import Market
+from Order import Order
+from OrderJournal import RECORD_DTYPE
+from OrderStore import OrderStore
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+
+
+class Test_OrderStore(unittest.TestCase):
+
+    def test_broker_store(self):
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        store = OrderStore(capacity=1)
+        broker = SimulatedBroker(wallet, store, max_filled_orders=0)
+        market = Market("BTC", "USD")
+        eth_market = Market("ETH", "USD")
+
+        buy = broker.createOrder(market, 1, Order.Side.BUY, Order.Type.LIMIT, 100)
+        sell = broker.createOrder(market, 1, Order.Side.SELL, Order.Type.LIMIT, 110, closes=buy)
+        broker.createOrder(eth_market, 2)
+        broker.onPriceChanged(market, 100)
+        broker.onPriceChanged(market, 110)
+        broker.onPriceChanged(eth_market, 10)
+
+        self.assertEqual(len(broker.filled_orders), 0)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.column("id").tolist(), [buy.id, sell.id, sell.id + 1])
+        self.assertEqual(store.column("fill_price").tolist(), [100, 110, 10])
+        self.assertEqual(store.column("market").tolist(), [0, 0, 1])
+        self.assertEqual([m.get_market() for m in store.markets()], ["BTC/USD", "ETH/USD"])
+        self.assertEqual(store.row(sell.id), 1)
+        self.assertIsNone(store.row(-5))
+
+        records = store.read()
+        self.assertEqual(records.dtype, RECORD_DTYPE)
+        self.assertEqual(records["closes"].tolist(), [-1, buy.id, -1])
+        self.assertEqual(records["closes_value"][1], 100)
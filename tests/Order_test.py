@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+import unittest
+
+from Market import Market
+from Order import Order
+from OrderFill import OrderFill
+
+
+class Test_Order(unittest.TestCase):
+
+    def test_add_fill(self):
+        order = Order(Market("BTC", "USD"), 2, Order.Side.BUY, Order.Type.LIMIT, 100)
+        self.assertFalse(order.is_filled())
+        self.assertEqual(order.qty_filled(), 0)
+
+        order.add_fill(OrderFill(0.5, 100, 0.1, datetime(2022, 1, 2, tzinfo=timezone.utc)))
+        self.assertFalse(order.is_filled())
+
+        order.add_fill(OrderFill(1.5, 96, 0.2, datetime(2022, 1, 1, tzinfo=timezone.utc)))
+        self.assertTrue(order.is_filled())
+        self.assertEqual(order.qty_filled(), 2)
+        self.assertAlmostEqual(order.fill_price(), 97)
+        self.assertAlmostEqual(order.fee(), 0.3)
+        self.assertEqual(order.get_filled_timestamp(), datetime(2022, 1, 2, tzinfo=timezone.utc))
+        self.assertEqual(len(order.fills), 2)
+
+    def test_slots(self):
+        order = Order(Market("BTC", "USD"), 1)
+        self.assertRaises(AttributeError, setattr, order, "unknown", 1)
+        self.assertRaises(AttributeError, setattr, OrderFill(1, 1, 0, None), "unknown", 1)
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy
+
+from CandleDownloader import CandleDownloader
+from Market import Market
+from Order import Order
+from PlotPyramid import CANDLE_AGGREGATIONS, Pyramid, ReportPyramid
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_PlotPyramid(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.candles = CandleDownloader(FakeExchange(0, 5000 * HOUR)).download(Market("BTC", "USD"), "1h", 0, 5000 * HOUR)
+        return super().setUp()
+
+    def test_candle_levels(self):
+        pyramid = Pyramid(self.candles, CANDLE_AGGREGATIONS, 4 * HOUR, factor=4, min_rows=100, time_column="date")
+        self.assertEqual([len(level["date"]) for level in pyramid.levels], [5001, 1251, 313, 79])
+        self.assertIs(pyramid.levels[0], self.candles)
+
+        # every bucket aggregates the candles of its time range
+        level = pyramid.levels[2]
+        for i in [0, 5, 312]:
+            start = level["date"][i]
+            rows = (self.candles["date"] >= start) & (self.candles["date"] < start + 16 * HOUR)
+            self.assertEqual(level["open"][i], self.candles["open"][rows][0])
+            self.assertEqual(level["high"][i], self.candles["high"][rows].max())
+            self.assertEqual(level["low"][i], self.candles["low"][rows].min())
+            self.assertEqual(level["close"][i], self.candles["close"][rows][-1])
+            self.assertAlmostEqual(level["volume"][i], self.candles["volume"][rows].sum())
+        # extremes are preserved on every level
+        for level in pyramid.levels:
+            self.assertEqual(level["high"].max(), self.candles["high"].max())
+            self.assertEqual(level["low"].min(), self.candles["low"].min())
+
+    def test_query(self):
+        pyramid = Pyramid(self.candles, CANDLE_AGGREGATIONS, 4 * HOUR, factor=4, min_rows=100, time_column="date")
+        self.assertEqual(pyramid.level_for(0, 5000 * HOUR, 1000), 2)
+        self.assertEqual(pyramid.level_for(0, 500 * HOUR, 1000), 0)
+        self.assertEqual(pyramid.level_for(0, 5000 * HOUR, 10), 3)
+
+        # the bucket containing start and all buckets starting up to end, as views
+        rows = pyramid.query(1, 10 * HOUR, 20 * HOUR)
+        self.assertEqual(rows["date"].tolist(), [8 * HOUR, 12 * HOUR, 16 * HOUR, 20 * HOUR])
+        self.assertTrue(numpy.shares_memory(rows["high"], pyramid.levels[1]["high"]))
+        self.assertTrue(numpy.shares_memory(pyramid.query(0, 0, HOUR)["close"], self.candles["close"]))
+        self.assertEqual(len(pyramid.query(0, 6000 * HOUR, 7000 * HOUR)["date"]), 1)
+
+    def test_report_view(self):
+        # fills alternate between buys and sells every 10 candles, equity sampled at every candle
+        fill_candles = numpy.arange(0, 5000, 10)
+        ledger = {
+            "filled": self.candles["date"][fill_candles],
+            "side": numpy.where(fill_candles % 20 == 0, Order.Side.BUY.value, Order.Side.SELL.value).astype(numpy.uint8),
+            "limit_price": self.candles["close"][fill_candles],
+            "cumulative_profit": numpy.arange(len(fill_candles), dtype=numpy.float64),
+        }
+        equity = {"time": self.candles["date"], "equity": 1000 + numpy.sin(numpy.arange(5001) / 7)}
+        pyramid = ReportPyramid(self.candles, equity, ledger, max_rows=300)
+
+        view = pyramid.view(pyramid.start, pyramid.end)
+        self.assertGreater(view["level"], 0)
+        self.assertLessEqual(len(view["candles"]["date"]), 2 * 300 + 2)
+        # the rows of the candles, the equity and the fills line up
+        self.assertTrue(numpy.array_equal(view["equity"]["time"], view["candles"]["date"]))
+        self.assertTrue(numpy.isin(view["fills"]["time"], view["candles"]["date"]).all())
+        # min/max envelope and fill counts of the whole series
+        self.assertEqual(view["equity"]["max"].max(), equity["equity"].max())
+        self.assertEqual(view["equity"]["min"].min(), equity["equity"].min())
+        self.assertEqual(view["fills"]["buys"].sum(), 250)
+        self.assertEqual(view["fills"]["sells"].sum(), 250)
+        self.assertEqual(view["fills"]["cumulative_profit"][-1], 499)
+
+        # the same range at the same level is served by the last view
+        self.assertIsNone(pyramid.view(pyramid.start, pyramid.end))
+
+        # zoomed in: full resolution for the visible range and half of it on either side
+        view = pyramid.view(1000 * HOUR, 1200 * HOUR)
+        self.assertEqual(view["level"], 0)
+        self.assertEqual(view["candles"]["date"][0], 900 * HOUR)
+        self.assertEqual(view["candles"]["date"][-1], 1300 * HOUR)
+        self.assertEqual(view["fills"]["buys"].sum() + view["fills"]["sells"].sum(), 41)
+        self.assertIsNone(pyramid.view(1050 * HOUR, 1250 * HOUR))
+        self.assertIsNotNone(pyramid.view(1200 * HOUR, 1400 * HOUR))
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+import unittest
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from Market import Market
+from Order import Order
+from PriceTape import PriceTape
+from SimulatedBroker import SimulatedBroker
+from Wallet import Wallet
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_PriceTape(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.market = Market("BTC", "USD")
+        return super().setUp()
+
+    def test_path(self):
+        # green candle plays open->low->high->close, red candle open->high->low->close
+        tape = PriceTape(numpy.array([0, HOUR]), numpy.array([100.0, 100.0]), numpy.array([120.0, 120.0]), numpy.array([90.0, 90.0]), numpy.array([110.0, 95.0]))
+        self.assertEqual(len(tape), 2)
+        self.assertEqual(tape.prices[0].tolist(), [100, 90, 120, 110])
+        self.assertEqual(tape.prices[1].tolist(), [100, 120, 90, 95])
+        self.assertEqual(tape.datetimes()[1], datetime(1970, 1, 1, 1, tzinfo=timezone.utc))
+
+    def test_replay(self):
+        wallet = Wallet()
+        broker = SimulatedBroker(wallet)
+        provider = BacktestingPriceProvider(FakeExchange(0, 10 * HOUR), self.market, broker, "1h", datetime(1970, 1, 1, tzinfo=timezone.utc), datetime(1970, 1, 2, tzinfo=timezone.utc))
+        provider.addListener(broker, self.market)
+
+        buy = broker.createOrder(self.market, 1, Order.Side.BUY, Order.Type.LIMIT, 95)
+        sell = broker.createOrder(self.market, 1, Order.Side.SELL, Order.Type.LIMIT, 115)
+
+        tape = PriceTape(numpy.array([0, HOUR]), numpy.array([100.0, 110.0]), numpy.array([105.0, 120.0]), numpy.array([90.0, 100.0]), numpy.array([100.0, 118.0]))
+        provider.replay(tape)
+
+        # buy is filled at its limit price in the first candle, sell in the second one
+        self.assertEqual(broker.filled_orders, [buy, sell])
+        self.assertEqual(buy.fill_price(), 95)
+        self.assertEqual(buy.get_filled_timestamp(), datetime(1970, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(sell.fill_price(), 115)
+        self.assertEqual(sell.get_filled_timestamp(), datetime(1970, 1, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(provider.getCurrentPrice(self.market), 120)
@@ -0,0 +1,50 @@
+import unittest
+
+from RateLimiter import RateLimiter
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Test_RateLimiter(unittest.TestCase):
+
+    def test_burst_and_rate(self):
+        clock = FakeClock()
+        limiter = RateLimiter(10, capacity=3, clock=clock, sleep=clock.sleep)
+
+        # a full bucket allows a burst without waiting
+        for i in range(3):
+            limiter.acquire()
+        self.assertEqual(clock.sleeps, [])
+        self.assertFalse(limiter.try_acquire())
+
+        # then one request per 1/rate seconds
+        for i in range(10):
+            limiter.acquire()
+        self.assertAlmostEqual(clock.now, 1.0)
+
+    def test_refill_is_capped(self):
+        clock = FakeClock()
+        limiter = RateLimiter(1, capacity=2, clock=clock, sleep=clock.sleep)
+        clock.now = 100
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+
+    def test_for_exchange(self):
+        class Exchange:
+            rateLimit = 50
+        self.assertEqual(RateLimiter.for_exchange(Exchange()).rate, 20)
+        self.assertIsNone(RateLimiter.for_exchange(object()))
+        self.assertRaises(ValueError, RateLimiter, 0)
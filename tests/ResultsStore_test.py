@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy
+
+from OrderJournal import RECORD_DTYPE
+from ResultsStore import ResultsStore, ResultsWriter, create_run
+
+DAY = 24 * 3600000
+
+
+class Test_ResultsStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "results.db")
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def create_run(self, i: int, start_time: int = 0, end_time: int = 180 * DAY, **kwargs) -> dict:
+        stats = {"final_equity": 1000 + i, "sharpe_ratio": i % 50, "max_drawdown": 0.1}
+        return create_run("BTC/USD", "1h", start_time, end_time, 1200 + i, 800, 20, stats, {"i": i}, **kwargs)
+
+    def test_runs(self):
+        fills = numpy.zeros(3, dtype=RECORD_DTYPE)
+        fills["id"] = [1, 2, 3]
+        fills["fill_price"] = [1000.5, 990.25, 1010]
+        fills["closes"] = [-1, -1, 2]
+        equity = {"time": numpy.array([0, 3600000]), "equity": numpy.array([1000.0, 1001.5])}
+
+        with ResultsStore(self.path) as store:
+            run_id = store.add_run(self.create_run(7, fills=fills, equity=equity))
+            self.assertTrue(numpy.array_equal(store.fills(run_id), fills))
+            self.assertTrue(numpy.array_equal(store.equity(run_id)["equity"], equity["equity"]))
+            self.assertEqual(len(store.fills(run_id + 1)), 0)
+
+            runs = store.query("SELECT * FROM runs")
+            self.assertEqual(runs["upper_price"][0], 1207)
+            self.assertEqual(runs["parameters"][0], '{"i": 7}')
+            # metrics without a value
+            self.assertIsNone(runs["sortino_ratio"][0])
+
+    def test_top_runs(self):
+        with ResultsStore(self.path) as store:
+            store.add_runs([self.create_run(i) for i in range(100)] + [self.create_run(i, 200 * DAY, 300 * DAY) for i in range(100, 110)])
+
+            top = store.top_runs("sharpe_ratio", 5, 0, 181 * DAY)
+            self.assertEqual(top["sharpe_ratio"].tolist(), [49, 49, 48, 48, 47])
+            self.assertTrue((top["end_time"] <= 181 * DAY).all())
+
+            # only the runs of the second period
+            top = store.top_runs("final_equity", 20, 190 * DAY)
+            self.assertEqual(top["final_equity"].tolist(), [1000 + i for i in range(109, 99, -1)])
+            self.assertEqual(len(store.top_runs("final_equity", market="ETH/USD")), 0)
+            self.assertRaises(ValueError, store.top_runs, "final_equity; DROP TABLE runs")
+
+    def test_writer(self):
+        # several producer threads, one writer
+        with ResultsWriter(self.path, batch_size=64) as writer:
+            def produce(first: int) -> None:
+                for i in range(first, first + 250):
+                    writer.submit(self.create_run(i, equity={"time": numpy.arange(10), "equity": numpy.full(10, float(i))}))
+            threads = [threading.Thread(target=produce, args=(i * 250,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(writer.written, 1000)
+
+        with ResultsStore(self.path) as store:
+            self.assertEqual(store.query("SELECT COUNT(*) AS runs FROM runs")["runs"][0], 1000)
+            self.assertEqual(store.query("SELECT COUNT(*) AS samples FROM equity")["samples"][0], 10000)
+            self.assertEqual(store.query("PRAGMA journal_mode")["journal_mode"][0], "wal")
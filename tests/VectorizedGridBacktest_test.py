@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+import unittest
+
+import numpy
+
+from BacktestingPriceProvider import BacktestingPriceProvider
+from Equity import Equity
+from Grid import Grid
+from GridStrategy import GridStrategy
+from Market import Market
+from Order import Order
+from PriceTape import PriceTape
+from SimulatedBroker import SimulatedBroker
+from VectorizedGridBacktest import VectorizedGridBacktest
+from Wallet import Wallet
+
+HOUR = 3600000
+
+
+class Test_VectorizedGridBacktest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # random walk candles, opens are not always at the previous close
+        rng = numpy.random.default_rng(1)
+        num_candles = 2000
+        close = 1000 * numpy.exp(numpy.cumsum(rng.normal(0, 0.01, num_candles)))
+        open = numpy.concatenate([[1000], close[:-1]]) * (1 + rng.normal(0, 0.003, num_candles))
+        self.candles = {
+            "date": numpy.arange(num_candles, dtype=numpy.int64) * HOUR,
+            "open": open,
+            "high": numpy.maximum(open, close) * (1 + numpy.abs(rng.normal(0, 0.005, num_candles))),
+            "low": numpy.minimum(open, close) * (1 - numpy.abs(rng.normal(0, 0.005, num_candles))),
+            "close": close,
+            "volume": numpy.ones(num_candles),
+        }
+        return super().setUp()
+
+    def run_event_driven(self, upper_price: float, lower_price: float, price_step: float):
+        market = Market("BTC", "USD")
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        broker = SimulatedBroker(wallet)
+        date = datetime.fromtimestamp(0, timezone.utc)
+        price_provider = BacktestingPriceProvider(None, market, broker, "1h", date, date, candles=self.candles)
+        equity = Equity(market, wallet, price_provider)
+        strategy = GridStrategy(market, wallet, broker, price_provider)
+        strategy.initialise(upper_price, lower_price, price_step)
+        broker.addListener(strategy)
+        price_provider.addListener(broker, market)
+        broker.addListener(equity)
+        price_provider.run()
+        return wallet, broker, equity, price_provider
+
+    def run_vectorized(self, upper_price: float, lower_price: float, price_step: float):
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        backtest = VectorizedGridBacktest(Market("BTC", "USD"), wallet, Grid(upper_price, lower_price, price_step))
+        c = self.candles
+        backtest.run(PriceTape(c["date"], c["open"], c["high"], c["low"], c["close"]))
+        return wallet, backtest
+
+    def test_same_result_as_event_driven(self):
+        for upper_price, lower_price, price_step in [(1500, 600, 10), (1200, 900, 1.5), (1300, 1000, 20)]:
+            wallet, broker, equity, price_provider = self.run_event_driven(upper_price, lower_price, price_step)
+            vectorized_wallet, backtest = self.run_vectorized(upper_price, lower_price, price_step)
+
+            fills = backtest.fills
+            self.assertEqual(len(fills["qty"]), len(broker.filled_orders))
+            for i, order in enumerate(broker.filled_orders):
+                self.assertEqual(fills["side"][i], order.side.value)
+                self.assertEqual(fills["type"][i], order.type.value)
+                self.assertEqual(fills["limit_price"][i], order.limit_price)
+                self.assertEqual(fills["price"][i], order.fill_price())
+                self.assertEqual(fills["qty"][i], order.qty)
+                self.assertEqual(fills["date"][i], order.get_filled_timestamp().timestamp() * 1000)
+                if order.closes is not None and order.closes.is_filled():
+                    self.assertEqual(broker.filled_orders[fills["closes"][i]], order.closes)
+
+            self.assertEqual(backtest.equity["equity"].tolist(), [e["equity"] for e in equity.equity])
+            self.assertEqual(vectorized_wallet.tokens, wallet.tokens)
+            self.assertEqual(backtest.current_price, price_provider.getCurrentPrice(None))
+
+    def test_no_fills(self):
+        wallet, backtest = self.run_vectorized(5000, 4000, 100)
+        # all funds are used for the initial market order, no limit order is reached
+        self.assertEqual(backtest.fills["type"].tolist(), [Order.Type.MARKET.value])
+        self.assertEqual(len(backtest.equity["equity"]), 0)
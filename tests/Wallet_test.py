@@ -0,0 +1,73 @@
+import unittest
+
+import numpy
+
+from Market import Market
+from Order import Order
+from SimulatedBroker import SimulatedBroker
+from Wallet import FixedPointWallet, Wallet
+
+
+class Test_Wallet(unittest.TestCase):
+
+    def test_apply_fill(self):
+        wallet = Wallet()
+        wallet.setBalance("USD", 1000)
+        wallet.apply_fill("BTC", "USD", 0.5, 1000)
+        wallet.apply_fill("BTC", "USD", -0.25, 1200)
+        self.assertEqual(wallet.tokens, {"USD": 800, "BTC": 0.25})
+
+        other = Wallet()
+        other.setBalance("USD", 1000)
+        other.apply_fills("BTC", "USD", numpy.array([0.5, -0.25]), numpy.array([1000, 1200]))
+        self.assertEqual(other.tokens, wallet.tokens)
+
+    def test_fixed_point_is_exact(self):
+        wallet = FixedPointWallet({"USD": 2})
+        wallet.setBalance("USD", 1000)
+        float_wallet = Wallet()
+        float_wallet.setBalance("USD", 1000)
+
+        # a thousand round trips of the same grid trade end at the initial balance
+        for i in range(1000):
+            for w in (wallet, float_wallet):
+                w.apply_fill("BTC", "USD", 0.1, 1000.1)
+                w.apply_fill("BTC", "USD", -0.1, 1000.3)
+        self.assertEqual(wallet.getBalance("BTC"), 0)
+        self.assertEqual(wallet.getBalance("USD"), 1020)
+        self.assertNotEqual(float_wallet.getBalance("USD"), 1020)
+
+        self.assertEqual(wallet.currency_id("USD"), 0)
+        self.assertEqual(wallet.currency_id("BTC"), 1)
+        self.assertEqual(wallet.balances().tolist(), [102000, 0])
+        self.assertEqual(wallet.getBalance("ETH"), 0)
+
+    def test_apply_fills(self):
+        rng = numpy.random.default_rng(1)
+        qty = rng.uniform(-1, 1, 1000)
+        price = rng.uniform(900, 1100, 1000)
+
+        one_by_one = FixedPointWallet()
+        for q, p in zip(qty.tolist(), price.tolist()):
+            one_by_one.apply_fill("BTC", "USD", q, p)
+        at_once = FixedPointWallet()
+        at_once.apply_fills("BTC", "USD", qty, price)
+        self.assertEqual(at_once.units, one_by_one.units)
+        self.assertEqual(at_once.balances().dtype, numpy.int64)
+
+        # balances are Python ints, they only have to fit in int64 when they are converted
+        at_once.setBalance("USD", 1e11)
+        self.assertEqual(at_once.getBalance("USD"), 1e11)
+        self.assertRaises(OverflowError, at_once.balances)
+        self.assertRaises(OverflowError, at_once.apply_fills, "BTC", "USD", numpy.array([1e11, 1e11]), numpy.array([1.0, 1.0]))
+
+    def test_broker(self):
+        wallet = FixedPointWallet()
+        wallet.setBalance("USD", 1000)
+        broker = SimulatedBroker(wallet)
+        market = Market("BTC", "USD")
+        broker.createOrder(market, 0.3, Order.Side.BUY, Order.Type.LIMIT, 1000)
+        broker.createOrder(market, 0.1, Order.Side.SELL, Order.Type.LIMIT, 1100)
+        broker.onPriceChanged(market, 1000)
+        broker.onPriceChanged(market, 1100)
+        self.assertEqual(wallet.tokens, {"USD": 810, "BTC": 0.2})
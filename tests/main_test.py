@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from CandleStore import CandleStore
+import main
+from Market import Market
+from tests.FakeExchange import FakeExchange
+
+HOUR = 3600000
+
+
+class Test_main(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.candles = os.path.join(self.directory.name, "candles")
+        CandleStore(self.candles).get_candles(FakeExchange(0, 300 * HOUR), Market("BTC", "USD"), "1h", 0, 300 * HOUR)
+
+        self.args = ["--offline", "--exchange", "fake", "--candles", self.candles, "--start", "1970-01-01", "--end", "1970-01-13T12:00"]
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def test_backtest_with_config(self):
+        config = self.path("config.json")
+        with open(config, "w") as f:
+            json.dump({"upper": 1200, "lower": 800, "step": 50, "balances": {"USD": 500}}, f)
+
+        main.main(["backtest", "--config", config, "--step", "20", "--journal", self.path("journal.bin"), "--report", self.path("report")] + self.args)
+
+        with open(self.path("report/stats.json")) as f:
+            stats = json.load(f)
+        self.assertGreater(stats["fills"], 0)
+        self.assertEqual(stats["candles"], 301)
+        # the step of the command line overrides the config file, the balance is taken from the config file
+        self.assertLess(stats["start_equity"], 600)
+        self.assertEqual(os.path.getsize(self.path("journal.bin")) > 0, True)
+
+    def test_resume(self):
+        args = ["backtest", "--upper", "1200", "--lower", "800", "--step", "20"] + self.args
+        main.main(args + ["--journal", self.path("full.bin"), "--report", self.path("full")])
+
+        main.main(args + ["--end", "1970-01-06T23:00", "--journal", self.path("part.bin"), "--report", self.path("part"), "--checkpoint", self.path("checkpoint")])
+        part_size = os.path.getsize(self.path("part.bin"))
+        main.main(["backtest", "--resume", self.path("checkpoint"), "--journal", self.path("resumed.bin"), "--report", self.path("resumed")] + self.args)
+
+        with open(self.path("full/stats.json")) as f:
+            expected = json.load(f)
+        with open(self.path("resumed/stats.json")) as f:
+            self.assertEqual(json.load(f), expected)
+        self.assertEqual(os.path.getsize(self.path("resumed.bin")), os.path.getsize(self.path("full.bin")))
+        self.assertEqual(os.path.getsize(self.path("part.bin")), part_size)
+
+        # resuming into the journal of the checkpointed run is refused
+        self.assertRaises(ValueError, main.main, ["backtest", "--resume", self.path("checkpoint"), "--journal", self.path("part.bin"), "--report", self.path("resumed")] + self.args)
+
+    def test_resume_with_defaults(self):
+        # the documented workflow, with the default journal and report in the working directory
+        args = ["backtest", "--upper", "1200", "--lower", "800", "--step", "20"] + self.args
+        main.main(args + ["--journal", self.path("full.bin"), "--report", self.path("full")])
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            main.main(args + ["--end", "1970-01-06T23:00", "--checkpoint", "run.checkpoint"])
+            part_size = os.path.getsize("filled_orders.bin")
+            main.main(["backtest", "--resume", "run.checkpoint"] + self.args)
+        finally:
+            os.chdir(cwd)
+
+        # the resumed run continues in a copy of the journal of the checkpointed run
+        self.assertEqual(os.path.getsize(self.path("filled_orders.bin")), part_size)
+        self.assertEqual(os.path.getsize(self.path("filled_orders.bin.resumed1")), os.path.getsize(self.path("full.bin")))
+        with open(self.path("full/stats.json")) as f:
+            expected = json.load(f)
+        with open(self.path("report/stats.json")) as f:
+            self.assertEqual(json.load(f), expected)
+
+    def test_sweep(self):
+        main.main(["sweep", "--upper", "1200", "1150", "--lower", "800", "--step", "20", "50", "--workers", "1", "--vectorized", "--output", self.path("sweep.csv")] + self.args)
+        with open(self.path("sweep.csv")) as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+    def test_montecarlo(self):
+        for method in ["bootstrap", "gbm"]:
+            main.main(["montecarlo", "--upper", "1200", "--lower", "800", "--step", "20", "--paths", "3", "--method", method, "--seed", "1", "--workers", "1", "--vectorized", "--output", self.path(method + ".csv")] + self.args)
+            with open(self.path(method + ".csv")) as f:
+                self.assertEqual(len(f.readlines()), 4)
+
+    def test_results(self):
+        main.main(["backtest", "--upper", "1200", "--lower", "800", "--step", "20", "--journal", self.path("journal.bin"), "--report", self.path("report"), "--results", self.path("results.db")] + self.args)
+        main.main(["sweep", "--upper", "1200", "1150", "--lower", "800", "--step", "20", "50", "--workers", "1", "--vectorized", "--output", self.path("sweep.csv"), "--results", self.path("results.db")] + self.args)
+        main.main(["top", "--results", self.path("results.db"), "--metric", "final_equity"] + self.args)
+
+        from ResultsStore import ResultsStore
+        with ResultsStore(self.path("results.db")) as store:
+            runs = store.top_runs("sharpe_ratio")
+            self.assertEqual(len(runs), 5)
+            with open(self.path("report/stats.json")) as f:
+                stats = json.load(f)
+            backtest = runs[runs["id"] == 1].iloc[0]
+            self.assertEqual(backtest["sharpe_ratio"], stats["sharpe_ratio"])
+            self.assertEqual(len(store.fills(1)), stats["fills"])
+            # sweep runs are stored with their metrics only
+            self.assertEqual(len(store.fills(2)), 0)
+            self.assertEqual(len(store.equity(2)["time"]), 0)
+
+    def test_missing_candles(self):
+        args = ["backtest", "--offline", "--candles", self.path("empty"), "--journal", self.path("journal.bin")]
+        self.assertRaises(ValueError, main.main, args)
+
+    def test_lazy_imports(self):
+        # a headless backtest on stored candles does not import pandas or ccxt
+        code = "import sys, main; main.main(sys.argv[1:]); print(sorted(m for m in ('pandas', 'ccxt', 'finplot') if m in sys.modules))"
+        args = ["backtest", "--upper", "1200", "--lower", "800", "--step", "20", "--journal", self.path("journal.bin"), "--report", self.path("report")] + self.args
+        result = subprocess.run([sys.executable, "-c", code] + args, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+        # without --offline, the exchange is only created when candles are missing from the store
+        online = [arg for arg in self.args if arg != "--offline"]
+        for timeframe_args in [[], ["--timeframe", "4h", "--intrabar", "1h"]]:
+            result = subprocess.run([sys.executable, "-c", code] + args[:-len(self.args)] + online + timeframe_args, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout.strip(), "[]")